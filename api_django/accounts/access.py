@@ -0,0 +1,224 @@
+"""
+Resolución de permisos y módulos accesibles de los usuarios.
+
+Los permisos dependen solo del rol, el cargo y los flags can_* del usuario,
+así que se calculan una vez por combinación y se comparten como objetos
+inmutables. El estado de activación de la empresa se lee de la instancia
+si ya está cargada (la autenticación la trae con select_related); solo
+cuando se conoce únicamente su id se cachea por empresa. La caché se
+invalida al guardar o eliminar la Empresa, lo que solo llega a todos los
+procesos con un backend de caché compartido (CACHES con Redis/Memcached);
+con la LocMemCache por defecto cada proceso puede tardar hasta
+EMPRESA_ACTIVA_CACHE_TIMEOUT en ver el cambio.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Módulos por rol (los empleados dependen de su cargo)
+ROLE_MODULES = {
+    'superadmin': ('all',),  # Acceso completo a todos los módulos
+    'admin': (
+        'dashboard', 'ventas', 'compras', 'inventario', 'articulos',
+        'contactos', 'rrhh', 'proyectos', 'tpv', 'reportes',
+        'usuarios', 'configuracion',
+    ),
+    'manager': (
+        'dashboard', 'ventas', 'compras', 'inventario', 'articulos',
+        'contactos', 'rrhh', 'proyectos', 'tpv', 'reportes',
+    ),
+}
+
+# Módulos específicos según cargo para empleados
+CARGO_MODULES = {
+    'Vendedora': (
+        'dashboard', 'ventas', 'contactos', 'articulos',
+        'inventario', 'tpv', 'reportes',
+    ),
+    'Encargado de Almacén': (
+        'dashboard', 'inventario', 'articulos', 'compras',
+        'contactos', 'ventas',
+    ),
+    'Contable': (
+        'dashboard', 'reportes', 'ventas', 'compras', 'contactos',
+    ),
+    'Cajero': (
+        'dashboard', 'tpv', 'ventas', 'contactos',
+    ),
+    'Administrativo': (
+        'dashboard', 'contactos', 'articulos', 'reportes',
+    ),
+    'Técnico': (
+        'dashboard', 'proyectos', 'inventario', 'articulos',
+    ),
+    'Comercial': (
+        'dashboard', 'ventas', 'contactos', 'articulos', 'reportes',
+    ),
+    'Recepcionista': (
+        'dashboard', 'contactos',
+    ),
+}
+
+PERMISSION_FLAGS = (
+    'can_view_data', 'can_create_data', 'can_edit_data', 'can_delete_data',
+    'can_manage_users', 'can_view_reports', 'can_manage_settings',
+)
+
+# Atributo del HttpRequest donde se guardan los permisos resueltos
+REQUEST_PERMISSIONS_ATTR = '_resolved_permissions'
+
+
+class UserPermissions:
+    """Permisos resueltos para una combinación (rol, cargo, flags). Inmutable"""
+
+    __slots__ = (
+        'role', 'cargo', 'is_superadmin', 'is_empresa_admin', 'is_manager',
+        'accessible_modules',
+    ) + PERMISSION_FLAGS
+
+    def __init__(self, role, cargo, accessible_modules, **flags):
+        values = dict(
+            role=role,
+            cargo=cargo,
+            is_superadmin=role == 'superadmin',
+            is_empresa_admin=role == 'admin',
+            is_manager=role == 'manager',
+            accessible_modules=tuple(accessible_modules),
+            **flags
+        )
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UserPermissions es inmutable")
+
+    def __repr__(self):
+        return f"<UserPermissions role={self.role!r} cargo={self.cargo!r}>"
+
+    def has_module(self, module):
+        """Verifica si el usuario tiene acceso al módulo"""
+        return 'all' in self.accessible_modules or module in self.accessible_modules
+
+    def as_dict(self):
+        """Representación usada por la API (CustomUser.get_permissions)"""
+        data = {flag: getattr(self, flag) for flag in PERMISSION_FLAGS}
+        data['accessible_modules'] = list(self.accessible_modules)
+        return data
+
+
+def _accessible_modules(role, cargo, can_view_reports):
+    """Módulos accesibles según rol y cargo"""
+    if role in ROLE_MODULES:
+        return ROLE_MODULES[role]
+    if role == 'employee':
+        return CARGO_MODULES.get(cargo, ('dashboard',))
+    if role == 'readonly':
+        return ('dashboard',) if can_view_reports else ()
+    return ('dashboard',)  # Módulo mínimo por defecto
+
+
+@lru_cache(maxsize=256)
+def resolve_permissions(role, cargo, can_manage_users, can_view_reports, can_manage_settings):
+    """Calcula (una sola vez por combinación) los permisos de un rol/cargo/flags"""
+    flags = {
+        'can_view_data': True,
+        'can_create_data': False,
+        'can_edit_data': False,
+        'can_delete_data': False,
+        'can_manage_users': False,
+        'can_view_reports': can_view_reports,
+        'can_manage_settings': False,
+    }
+
+    if role == 'superadmin':
+        flags = {key: True for key in flags}
+    elif role == 'admin':
+        flags.update({
+            'can_create_data': True,
+            'can_edit_data': True,
+            'can_delete_data': True,
+        })
+    elif role == 'manager':
+        flags.update({
+            'can_create_data': True,
+            'can_edit_data': True,
+        })
+    elif role == 'employee':
+        flags.update({
+            'can_create_data': True,
+            'can_edit_data': True,
+        })
+
+    # Aplicar permisos específicos
+    flags['can_manage_users'] = can_manage_users
+    flags['can_manage_settings'] = can_manage_settings
+
+    return UserPermissions(
+        role=role,
+        cargo=cargo,
+        accessible_modules=_accessible_modules(role, cargo, can_view_reports),
+        **flags
+    )
+
+
+def get_user_permissions(user):
+    """Utility function para obtener los permisos resueltos de un usuario"""
+    return resolve_permissions(
+        user.role,
+        user.cargo,
+        bool(user.can_manage_users),
+        bool(user.can_view_reports),
+        bool(user.can_manage_settings),
+    )
+
+
+def get_request_permissions(request):
+    """
+    Utility function para obtener los permisos del usuario del request.
+    Se resuelven una sola vez y quedan asociados al HttpRequest.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+
+    http_request = getattr(request, '_request', request)
+    cached = getattr(http_request, REQUEST_PERMISSIONS_ATTR, None)
+    if cached is not None and cached[0] == user.pk:
+        return cached[1]
+
+    permissions = get_user_permissions(user)
+    setattr(http_request, REQUEST_PERMISSIONS_ATTR, (user.pk, permissions))
+    return permissions
+
+
+def _empresa_activa_key(empresa_id):
+    return f'accounts:empresa_activa:{empresa_id}'
+
+
+def is_empresa_activa(empresa_id, empresa=None):
+    """
+    Utility function para saber si una empresa está activa sin consultar la BD
+    en cada request. Si se pasa la instancia ya cargada se usa su valor; la
+    caché solo se usa cuando se conoce únicamente el id.
+    """
+    if not empresa_id:
+        return False
+    if empresa is not None:
+        return empresa.activa
+
+    key = _empresa_activa_key(empresa_id)
+    activa = cache.get(key)
+    if activa is not None:
+        return activa
+
+    from .models import Empresa
+    activa = bool(Empresa.objects.filter(pk=empresa_id).values_list('activa', flat=True).first())
+
+    cache.set(key, activa, getattr(settings, 'EMPRESA_ACTIVA_CACHE_TIMEOUT', 300))
+    return activa
+
+
+def invalidate_empresa_activa(empresa_id):
+    """Utility function para invalidar el estado de activación cacheado"""
+    cache.delete(_empresa_activa_key(empresa_id))
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Volcar los últimos accesos pendientes al parar el worker
+        from .last_access import register_shutdown_flush
+        register_shutdown_flush()
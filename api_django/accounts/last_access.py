@@ -0,0 +1,123 @@
+"""
+Registro diferido del último acceso de los usuarios.
+
+En lugar de lanzar un UPDATE sobre accounts_customuser en cada request,
+los accesos se acumulan en memoria del proceso (uno por usuario, se queda
+el más reciente) y se vuelcan en un único UPDATE masivo como mucho cada
+LAST_ACCESS_FLUSH_INTERVAL segundos.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Case, When, Value, DateTimeField
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Máximo de usuarios por sentencia UPDATE ... CASE
+FLUSH_BATCH_SIZE = 500
+
+
+class LastAccessTracker:
+    """
+    Acumula accesos por usuario y los escribe en bloque.
+
+    Cada usuario se escribe como mucho una vez por intervalo, ya que los
+    accesos repetidos dentro del mismo intervalo se fusionan en memoria.
+    """
+
+    def __init__(self, interval=None):
+        self._interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @property
+    def interval(self):
+        """Segundos mínimos entre volcados (configurable en settings)"""
+        if self._interval is not None:
+            return self._interval
+        return getattr(settings, 'LAST_ACCESS_FLUSH_INTERVAL', 60)
+
+    @property
+    def pending_count(self):
+        """Número de usuarios con acceso pendiente de escribir"""
+        with self._lock:
+            return len(self._pending)
+
+    def record(self, user, when=None):
+        """Registra un acceso del usuario y vuelca si ha vencido el intervalo"""
+        if not user or not getattr(user, 'is_authenticated', False) or not user.pk:
+            return
+
+        when = when or timezone.now()
+        with self._lock:
+            self._pending[user.pk] = when
+            due = time.monotonic() - self._last_flush >= self.interval
+
+        # Mantener coherente la instancia que usa el resto del request
+        user.ultimo_acceso = when
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Escribe todos los accesos pendientes. Retorna el número de usuarios"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return 0
+
+        from .models import CustomUser
+
+        items = list(pending.items())
+        for start in range(0, len(items), FLUSH_BATCH_SIZE):
+            batch = items[start:start + FLUSH_BATCH_SIZE]
+            try:
+                CustomUser.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                    ultimo_acceso=Case(
+                        *[When(pk=pk, then=Value(when)) for pk, when in batch],
+                        output_field=DateTimeField()
+                    )
+                )
+            except Exception as e:
+                logger.error(f"Error volcando último acceso de {len(batch)} usuarios: {e}")
+                self._requeue(batch)
+
+        return len(items)
+
+    def _requeue(self, batch):
+        """Devuelve a la cola los accesos que no se pudieron escribir"""
+        with self._lock:
+            for pk, when in batch:
+                current = self._pending.get(pk)
+                if current is None or current < when:
+                    self._pending[pk] = when
+
+
+# Instancia única por proceso
+last_access_tracker = LastAccessTracker()
+
+
+def record_access(user):
+    """Utility function para registrar el acceso del usuario actual"""
+    last_access_tracker.record(user)
+
+
+def flush_last_access():
+    """Utility function para volcar los accesos pendientes (p.ej. al parar el worker)"""
+    try:
+        return last_access_tracker.flush()
+    except Exception as e:
+        logger.error(f"Error en el volcado final de último acceso: {e}")
+        return 0
+
+
+def register_shutdown_flush():
+    """Registra el volcado final al terminar el proceso del worker"""
+    atexit.register(flush_last_access)
@@ -115,108 +115,19 @@ class CustomUser(AbstractUser):
         """Verifica si es gerente"""
         return self.role == 'manager'
     
+    @property
+    def resolved_permissions(self):
+        """Permisos precalculados (compartidos por rol, cargo y flags)"""
+        from .access import get_user_permissions
+        return get_user_permissions(self)
+    
     def get_permissions(self):
         """Retorna los permisos del usuario basándose en su rol"""
-        base_permissions = {
-            'can_view_data': True,
-            'can_create_data': False,
-            'can_edit_data': False,
-            'can_delete_data': False,
-            'can_manage_users': False,
-            'can_view_reports': self.can_view_reports,
-            'can_manage_settings': False,
-        }
-        
-        if self.is_superadmin:
-            base_permissions = {key: True for key in base_permissions.keys()}
-        
-        elif self.is_empresa_admin:
-            base_permissions.update({
-                'can_create_data': True,
-                'can_edit_data': True,
-                'can_delete_data': True,
-                'can_manage_users': True,
-                'can_manage_settings': True,
-            })
-        
-        elif self.is_manager:
-            base_permissions.update({
-                'can_create_data': True,
-                'can_edit_data': True,
-                'can_delete_data': False,
-            })
-        
-        elif self.role == 'employee':
-            base_permissions.update({
-                'can_create_data': True,
-                'can_edit_data': True,
-            })
-        
-        # Aplicar permisos específicos
-        base_permissions['can_manage_users'] = self.can_manage_users
-        base_permissions['can_manage_settings'] = self.can_manage_settings
-        
-        # Agregar módulos accesibles según cargo
-        base_permissions['accessible_modules'] = self.get_accessible_modules()
-        
-        return base_permissions
+        return self.resolved_permissions.as_dict()
     
     def get_accessible_modules(self):
         """Retorna los módulos accesibles según rol y cargo del usuario"""
-        # Módulos base por rol
-        if self.is_superadmin:
-            return ['all']  # Acceso completo a todos los módulos
-        
-        elif self.is_empresa_admin:
-            return [
-                'dashboard', 'ventas', 'compras', 'inventario', 'articulos',
-                'contactos', 'rrhh', 'proyectos', 'tpv', 'reportes',
-                'usuarios', 'configuracion'
-            ]
-        
-        elif self.is_manager:
-            return [
-                'dashboard', 'ventas', 'compras', 'inventario', 'articulos',
-                'contactos', 'rrhh', 'proyectos', 'tpv', 'reportes'
-            ]
-        
-        elif self.role == 'employee':
-            # Módulos específicos según cargo para empleados
-            cargo_modules = {
-                'Vendedora': [
-                    'dashboard', 'ventas', 'contactos', 'articulos', 
-                    'inventario', 'tpv', 'reportes'
-                ],
-                'Encargado de Almacén': [
-                    'dashboard', 'inventario', 'articulos', 'compras', 
-                    'contactos', 'ventas'
-                ],
-                'Contable': [
-                    'dashboard', 'reportes', 'ventas', 'compras', 'contactos'
-                ],
-                'Cajero': [
-                    'dashboard', 'tpv', 'ventas', 'contactos'
-                ],
-                'Administrativo': [
-                    'dashboard', 'contactos', 'articulos', 'reportes'
-                ],
-                'Técnico': [
-                    'dashboard', 'proyectos', 'inventario', 'articulos'
-                ],
-                'Comercial': [
-                    'dashboard', 'ventas', 'contactos', 'articulos', 'reportes'
-                ],
-                'Recepcionista': [
-                    'dashboard', 'contactos'
-                ]
-            }
-            
-            return cargo_modules.get(self.cargo, ['dashboard'])
-        
-        elif self.role == 'readonly':
-            return ['dashboard'] if self.can_view_reports else []
-        
-        return ['dashboard']  # Módulo mínimo por defecto
+        return list(self.resolved_permissions.accessible_modules)
 
     def save(self, *args, **kwargs):
         # Auto-asignar permisos basándose en el rol
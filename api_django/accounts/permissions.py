@@ -1,4 +1,11 @@
 from rest_framework import permissions
+from .access import get_request_permissions, is_empresa_activa
+
+
+def _loaded_empresa(user):
+    """Retorna la empresa del usuario solo si ya está cargada (sin query)"""
+    empresa_field = type(user).empresa
+    return user.empresa if empresa_field.is_cached(user) else None
 
 
 class IsSuperAdmin(permissions.BasePermission):
@@ -6,11 +13,8 @@ class IsSuperAdmin(permissions.BasePermission):
     Permiso para verificar si el usuario es un superadmin
     """
     def has_permission(self, request, view):
-        return (
-            request.user and
-            request.user.is_authenticated and
-            request.user.is_superadmin
-        )
+        perms = get_request_permissions(request)
+        return bool(perms and perms.is_superadmin)
 
 
 class IsEmpresaAdmin(permissions.BasePermission):
@@ -18,11 +22,8 @@ class IsEmpresaAdmin(permissions.BasePermission):
     Permiso para verificar si el usuario es admin de una empresa
     """
     def has_permission(self, request, view):
-        return (
-            request.user and
-            request.user.is_authenticated and
-            request.user.is_empresa_admin
-        )
+        perms = get_request_permissions(request)
+        return bool(perms and perms.is_empresa_admin)
 
 
 class IsOwnerOrEmpresaAdmin(permissions.BasePermission):
@@ -31,24 +32,28 @@ class IsOwnerOrEmpresaAdmin(permissions.BasePermission):
     o es admin de la empresa
     """
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated
-    
+        return bool(request.user and request.user.is_authenticated)
+
     def has_object_permission(self, request, view, obj):
+        perms = get_request_permissions(request)
+        if perms is None:
+            return False
+
         # Superadmins pueden acceder a todo
-        if request.user.is_superadmin:
+        if perms.is_superadmin:
             return True
-        
+
         # Si el objeto es un usuario
-        if hasattr(obj, 'empresa'):
+        if hasattr(obj, 'empresa_id'):
             # El usuario es propietario del objeto
             if obj == request.user:
                 return True
-            
+
             # O es admin de la misma empresa
-            if (request.user.is_empresa_admin and 
-                request.user.empresa == obj.empresa):
+            if (perms.is_empresa_admin and
+                request.user.empresa_id == obj.empresa_id):
                 return True
-        
+
         return False
 
 
@@ -58,18 +63,17 @@ class HasEmpresaPermission(permissions.BasePermission):
     (excepto superadmins)
     """
     def has_permission(self, request, view):
-        if not (request.user and request.user.is_authenticated):
+        perms = get_request_permissions(request)
+        if perms is None:
             return False
-        
+
         # Superadmins no necesitan empresa
-        if request.user.is_superadmin:
+        if perms.is_superadmin:
             return True
-        
+
         # Otros usuarios deben tener empresa asignada y activa
-        return (
-            request.user.empresa and
-            request.user.empresa.activa
-        )
+        user = request.user
+        return is_empresa_activa(user.empresa_id, _loaded_empresa(user))
 
 
 class CanManageUsers(permissions.BasePermission):
@@ -77,12 +81,11 @@ class CanManageUsers(permissions.BasePermission):
     Permiso para verificar si el usuario puede gestionar otros usuarios
     """
     def has_permission(self, request, view):
-        return (
-            request.user and
-            request.user.is_authenticated and
-            (request.user.is_superadmin or 
-             (request.user.is_empresa_admin and request.user.can_manage_users))
-        )
+        perms = get_request_permissions(request)
+        return bool(perms and (
+            perms.is_superadmin or
+            (perms.is_empresa_admin and perms.can_manage_users)
+        ))
 
 
 class CanViewReports(permissions.BasePermission):
@@ -90,12 +93,8 @@ class CanViewReports(permissions.BasePermission):
     Permiso para verificar si el usuario puede ver reportes
     """
     def has_permission(self, request, view):
-        return (
-            request.user and
-            request.user.is_authenticated and
-            (request.user.is_superadmin or 
-             request.user.can_view_reports)
-        )
+        perms = get_request_permissions(request)
+        return bool(perms and (perms.is_superadmin or perms.can_view_reports))
 
 
 class CanManageSettings(permissions.BasePermission):
@@ -103,12 +102,11 @@ class CanManageSettings(permissions.BasePermission):
     Permiso para verificar si el usuario puede gestionar configuraciones
     """
     def has_permission(self, request, view):
-        return (
-            request.user and
-            request.user.is_authenticated and
-            (request.user.is_superadmin or 
-             (request.user.is_empresa_admin and request.user.can_manage_settings))
-        )
+        perms = get_request_permissions(request)
+        return bool(perms and (
+            perms.is_superadmin or
+            (perms.is_empresa_admin and perms.can_manage_settings)
+        ))
 
 
 class IsSameEmpresa(permissions.BasePermission):
@@ -117,12 +115,16 @@ class IsSameEmpresa(permissions.BasePermission):
     que el objeto que está intentando acceder
     """
     def has_object_permission(self, request, view, obj):
+        perms = get_request_permissions(request)
+        if perms is None:
+            return False
+
         # Superadmins pueden acceder a todo
-        if request.user.is_superadmin:
+        if perms.is_superadmin:
             return True
-        
+
         # Verificar que el usuario y el objeto pertenezcan a la misma empresa
-        if hasattr(obj, 'empresa'):
-            return request.user.empresa == obj.empresa
-        
+        if hasattr(obj, 'empresa_id'):
+            return request.user.empresa_id == obj.empresa_id
+
         return False
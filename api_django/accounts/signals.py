@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .access import invalidate_empresa_activa
+from .models import Empresa
+
+
+@receiver(post_save, sender=Empresa)
+@receiver(post_delete, sender=Empresa)
+def invalidate_empresa_cache(sender, instance, **kwargs):
+    """
+    Invalida el estado de activación cacheado de la empresa
+    al guardarla o eliminarla
+    """
+    invalidate_empresa_activa(instance.pk)
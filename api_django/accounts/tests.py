@@ -221,3 +221,132 @@ class TestMultiTenantSecurity:
             # Sin empresa - permitido por el modelo actual
         )
         assert orphan_user.empresa is None
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestLastAccessTracker:
+    """Tests para el registro diferido del último acceso"""
+    
+    def test_accesos_se_agrupan_por_usuario(self, usuario):
+        """Test que varios accesos del mismo usuario se fusionan hasta el volcado"""
+        from accounts.last_access import LastAccessTracker
+        
+        tracker = LastAccessTracker(interval=3600)
+        tracker.record(usuario)
+        tracker.record(usuario)
+        
+        assert tracker.pending_count == 1
+        usuario.refresh_from_db()
+        assert usuario.ultimo_acceso is None
+    
+    def test_volcado_en_un_solo_update(self, empresa, usuario):
+        """Test que el volcado escribe todos los usuarios con una única query"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from accounts.last_access import LastAccessTracker
+        
+        otro = User.objects.create_user(
+            username="otro", email="otro@user.com", password="testpass123", empresa=empresa
+        )
+        tracker = LastAccessTracker(interval=3600)
+        tracker.record(usuario)
+        tracker.record(otro)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            assert tracker.flush() == 2
+        
+        assert len(ctx.captured_queries) == 1
+        assert tracker.pending_count == 0
+        usuario.refresh_from_db()
+        otro.refresh_from_db()
+        assert usuario.ultimo_acceso is not None
+        assert otro.ultimo_acceso is not None
+    
+    def test_request_api_registra_acceso(self, authenticated_client, usuario):
+        """Test que una request autenticada acaba registrando el último acceso"""
+        response = authenticated_client.get("/api/auth/profile/")
+        
+        assert response.status_code == status.HTTP_200_OK
+        usuario.refresh_from_db()
+        assert usuario.ultimo_acceso is not None
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestPermissionResolution:
+    """Tests de la resolución cacheada de permisos"""
+    
+    def test_permisos_compartidos_por_rol_cargo_y_flags(self, empresa):
+        """Test que usuarios con el mismo rol, cargo y flags comparten el objeto de permisos"""
+        from accounts.access import get_user_permissions
+        
+        u1 = User(username="v1", role="employee", cargo="Vendedora", empresa=empresa)
+        u2 = User(username="v2", role="employee", cargo="Vendedora", empresa=empresa)
+        u3 = User(username="c1", role="employee", cargo="Cajero", empresa=empresa)
+        
+        assert get_user_permissions(u1) is get_user_permissions(u2)
+        assert get_user_permissions(u1) is not get_user_permissions(u3)
+        assert u3.get_accessible_modules() == ['dashboard', 'tpv', 'ventas', 'contactos']
+        with pytest.raises(AttributeError):
+            get_user_permissions(u1).can_delete_data = True
+    
+    def test_get_permissions_mantiene_formato(self, usuario):
+        """Test que get_permissions sigue devolviendo el diccionario de la API"""
+        permisos = usuario.get_permissions()
+        
+        assert permisos['can_delete_data'] is True
+        assert permisos['can_manage_users'] is True
+        assert 'usuarios' in permisos['accessible_modules']
+    
+    def test_permisos_sin_queries(self, empresa, usuario):
+        """Test que las clases de permisos no lanzan queries una vez resuelta la empresa"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.test import APIRequestFactory
+        from accounts import permissions as perms
+        
+        user = User.objects.get(pk=usuario.pk)  # empresa sin cargar
+        request = APIRequestFactory().get('/api/clientes/')
+        request.user = user
+        perms.HasEmpresaPermission().has_permission(request, None)
+        
+        otro_request = APIRequestFactory().get('/api/clientes/')
+        otro_request.user = User.objects.get(pk=usuario.pk)
+        cliente = type('Obj', (), {'empresa_id': empresa.id})()
+        
+        with CaptureQueriesContext(connection) as ctx:
+            for permission_class in (
+                perms.HasEmpresaPermission, perms.IsEmpresaAdmin, perms.IsSuperAdmin,
+                perms.CanManageUsers, perms.CanViewReports, perms.CanManageSettings,
+            ):
+                permission_class().has_permission(otro_request, None)
+            assert perms.IsSameEmpresa().has_object_permission(otro_request, None, cliente)
+            assert perms.IsOwnerOrEmpresaAdmin().has_object_permission(otro_request, None, cliente)
+        
+        assert len(ctx.captured_queries) == 0
+    
+    def test_empresa_desactivada_invalida_cache(self, empresa, usuario):
+        """Test que al desactivar la empresa se invalida el estado cacheado"""
+        from rest_framework.test import APIRequestFactory
+        from accounts.permissions import HasEmpresaPermission
+        
+        def check():
+            request = APIRequestFactory().get('/api/clientes/')
+            request.user = User.objects.get(pk=usuario.pk)
+            return HasEmpresaPermission().has_permission(request, None)
+        
+        assert check() is True
+        empresa.activa = False
+        empresa.save()
+        assert check() is False
+    
+    def test_empresa_cargada_no_usa_cache(self, empresa, usuario):
+        """Test que con la empresa ya cargada se usa su valor aunque la caché diga otra cosa"""
+        from accounts.access import is_empresa_activa
+        
+        assert is_empresa_activa(empresa.id) is True  # cacheado por id
+        Empresa.objects.filter(pk=empresa.pk).update(activa=False)  # sin señal: la caché no se invalida
+        
+        assert is_empresa_activa(empresa.id) is True
+        assert is_empresa_activa(empresa.id, Empresa.objects.get(pk=empresa.pk)) is False
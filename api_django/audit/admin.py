@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import AuditLog, SecurityLog, PerformanceLog, BusinessEventLog
+from .models import AuditLog, SecurityLog, PerformanceLog, PerformanceRollup, BusinessEventLog
 
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
@@ -104,6 +104,23 @@ class PerformanceLogAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         return False
 
+@admin.register(PerformanceRollup)
+class PerformanceRollupAdmin(admin.ModelAdmin):
+    list_display = [
+        'bucket', 'method', 'path_template', 'count', 'slow_count',
+        'p50', 'p95', 'p99', 'empresa'
+    ]
+    list_filter = ['method', 'bucket', 'empresa']
+    search_fields = ['path_template']
+    date_hierarchy = 'bucket'
+    ordering = ['-bucket']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(BusinessEventLog)
 class BusinessEventLogAdmin(admin.ModelAdmin):
     list_display = [
@@ -9,3 +9,11 @@ class AuditConfig(AppConfig):
     def ready(self):
         # Importar signals para registrarlos
         import audit.signals
+        
+        # Volcar la cola de auditoría pendiente al parar el worker
+        from .writer import register_shutdown_flush
+        register_shutdown_flush()
+        
+        # Volcar los rollups de performance pendientes
+        from .rollups import register_shutdown_flush as register_rollups_flush
+        register_rollups_flush()
@@ -0,0 +1,101 @@
+"""
+Instrumentación de queries basada en connection.execute_wrapper.
+
+No depende de DEBUG ni de connection.queries: cuenta queries, acumula el
+tiempo de BD y conserva las N queries más lentas, que al final se agrupan
+por huella (SQL normalizado). El coste por query es un par de llamadas a
+perf_counter y, solo si la query entra en el top-N, un push en un heap.
+"""
+import heapq
+import random
+import re
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?|\d+|\'[^\']*\')\s*,?)+\)', re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+FINGERPRINT_MAX_LENGTH = 500
+
+
+def sql_fingerprint(sql):
+    """Normaliza una sentencia SQL para agrupar las que solo difieren en valores"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _WHITESPACE_RE.sub(' ', sql).strip()
+    return sql[:FINGERPRINT_MAX_LENGTH]
+
+
+class QueryInstrumentation:
+    """Wrapper de ejecución que mide las queries de un request o bloque de código"""
+
+    def __init__(self, top_n=None):
+        if top_n is None:
+            top_n = getattr(settings, 'AUDIT_PERF_TOP_QUERIES', 5)
+        self.top_n = top_n
+        self.count = 0
+        self.db_time = 0.0
+        self._slowest = []  # min-heap de (duración, orden, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.db_time += duration
+            if self.top_n:
+                entry = (duration, self.count, sql)
+                if len(self._slowest) < self.top_n:
+                    heapq.heappush(self._slowest, entry)
+                elif duration > self._slowest[0][0]:
+                    heapq.heapreplace(self._slowest, entry)
+
+    @contextmanager
+    def installed(self):
+        """Instala el wrapper en todas las conexiones mientras dura el bloque"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def slow_queries(self):
+        """Top-N queries más lentas agrupadas por huella, de más a menos lenta"""
+        grouped = {}
+        for duration, _, sql in self._slowest:
+            fingerprint = sql_fingerprint(sql)
+            stats = grouped.setdefault(fingerprint, {'fingerprint': fingerprint, 'count': 0, 'time': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['time'] += duration
+            stats['max'] = max(stats['max'], duration)
+
+        result = sorted(grouped.values(), key=lambda s: s['max'], reverse=True)
+        for stats in result:
+            stats['time'] = round(stats['time'], 6)
+            stats['max'] = round(stats['max'], 6)
+        return result
+
+
+def should_log_performance(response_time, db_queries):
+    """
+    Decide si se registra un request: siempre si supera los umbrales y,
+    si no, una muestra aleatoria (AUDIT_PERF_SAMPLE_RATE).
+    Retorna (registrar, muestreado).
+    """
+    slow_threshold = getattr(settings, 'AUDIT_PERF_SLOW_THRESHOLD', 1.0)
+    query_threshold = getattr(settings, 'AUDIT_PERF_QUERY_THRESHOLD', 10)
+    if response_time > slow_threshold or db_queries > query_threshold:
+        return True, False
+
+    sample_rate = getattr(settings, 'AUDIT_PERF_SAMPLE_RATE', 0.01)
+    if sample_rate > 0 and random.random() < sample_rate:
+        return True, True
+    return False, False
@@ -1,46 +1,65 @@
 import time
 import logging
 from django.utils.deprecation import MiddlewareMixin
-from django.db import connection
+from .instrumentation import QueryInstrumentation, should_log_performance
+from .rollups import performance_aggregator, resolve_path_template
 from .services import AuditService
 
 logger = logging.getLogger(__name__)
 
 class AuditMiddleware(MiddlewareMixin):
     """
-    Middleware para capturar automáticamente eventos de auditoría
+    Middleware para capturar automáticamente eventos de auditoría.
+    
+    Las métricas de BD se obtienen con connection.execute_wrapper (no requiere
+    DEBUG=True) y se agregan en los histogramas de PerformanceRollup. Además se
+    guarda como PerformanceLog de ejemplo si el request es lento, lanza muchas
+    queries o cae en la muestra aleatoria.
     """
     
+    # Mide dentro del mismo hilo que ejecuta las queries de la vista
+    sync_capable = True
+    async_capable = False
+    
     def __init__(self, get_response):
         self.get_response = get_response
         super().__init__(get_response)
     
-    def process_request(self, request):
-        # Marcar inicio de request
-        request._audit_start_time = time.time()
-        request._audit_start_queries = len(connection.queries)
-        return None
-    
-    def process_response(self, request, response):
-        # Calcular métricas
-        end_time = time.time()
-        start_time = getattr(request, '_audit_start_time', end_time)
-        response_time = end_time - start_time
+    def __call__(self, request):
+        instrumentation = QueryInstrumentation()
+        start_time = time.perf_counter()
+        
+        with instrumentation.installed():
+            response = self.get_response(request)
+        
+        response_time = time.perf_counter() - start_time
         
-        # Contar queries
-        start_queries = getattr(request, '_audit_start_queries', 0)
-        db_queries = len(connection.queries) - start_queries
+        log, sampled = should_log_performance(response_time, instrumentation.count)
         
-        # Calcular tiempo de DB
-        db_time = sum(float(query['time']) for query in connection.queries[start_queries:])
+        # Todos los requests de una empresa alimentan los histogramas; solo
+        # unos pocos por cubeta se guardan además como PerformanceLog de ejemplo
+        empresa_id = getattr(request, 'empresa_id', None)
+        if empresa_id:
+            log = performance_aggregator.record(
+                empresa_id=empresa_id,
+                path_template=resolve_path_template(request),
+                method=request.method,
+                response_time=response_time,
+                db_time=instrumentation.db_time,
+                db_queries=instrumentation.count,
+                status_code=response.status_code,
+                want_exemplar=log
+            )
         
-        # Log solo si es lento o hay muchas queries
-        if response_time > 1.0 or db_queries > 10:
+        if log:
             AuditService.log_performance(
                 request=request,
                 response_time=response_time,
-                db_queries=db_queries,
-                db_time=db_time
+                db_queries=instrumentation.count,
+                db_time=instrumentation.db_time,
+                status_code=response.status_code,
+                slow_queries=instrumentation.slow_queries(),
+                sampled=sampled
             )
         
         return response
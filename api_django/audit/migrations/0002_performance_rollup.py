@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userinvitation'),
+        ('audit', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Inicio del minuto agregado')),
+                ('method', models.CharField(max_length=10)),
+                ('path_template', models.CharField(help_text='Ruta sin identificadores', max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('slow_count', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('total_time', models.FloatField(default=0.0, help_text='Suma de tiempos en segundos')),
+                ('min_time', models.FloatField(default=0.0)),
+                ('max_time', models.FloatField(default=0.0)),
+                ('db_time_sum', models.FloatField(default=0.0, help_text='Suma de tiempo DB en segundos')),
+                ('db_queries_sum', models.PositiveIntegerField(default=0)),
+                ('db_queries_max', models.PositiveIntegerField(default=0)),
+                ('p50', models.FloatField(default=0.0)),
+                ('p95', models.FloatField(default=0.0)),
+                ('p99', models.FloatField(default=0.0)),
+                ('le_5ms', models.PositiveIntegerField(default=0)),
+                ('le_10ms', models.PositiveIntegerField(default=0)),
+                ('le_25ms', models.PositiveIntegerField(default=0)),
+                ('le_50ms', models.PositiveIntegerField(default=0)),
+                ('le_100ms', models.PositiveIntegerField(default=0)),
+                ('le_250ms', models.PositiveIntegerField(default=0)),
+                ('le_500ms', models.PositiveIntegerField(default=0)),
+                ('le_1s', models.PositiveIntegerField(default=0)),
+                ('le_2500ms', models.PositiveIntegerField(default=0)),
+                ('le_5s', models.PositiveIntegerField(default=0)),
+                ('le_10s', models.PositiveIntegerField(default=0)),
+                ('gt_10s', models.PositiveIntegerField(default=0)),
+                ('empresa', models.ForeignKey(help_text='Empresa a la que pertenece este registro', on_delete=django.db.models.deletion.CASCADE, to='accounts.empresa', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'Rollup de Performance',
+                'verbose_name_plural': 'Rollups de Performance',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['empresa', 'bucket'], name='audit_perfo_empresa_5daea8_idx'), models.Index(fields=['empresa', 'path_template', 'bucket'], name='audit_perfo_empresa_19d7d5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('empresa', 'bucket', 'method', 'path_template'), name='unique_performance_rollup')],
+            },
+        ),
+    ]
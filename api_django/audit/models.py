@@ -161,6 +161,67 @@ class PerformanceLog(TenantModelMixin, models.Model):
         verbose_name_plural = "Logs de Performance"
 
 
+class PerformanceRollup(TenantModelMixin, models.Model):
+    """
+    Rendimiento agregado por empresa, ruta, método y minuto.
+    
+    Incluye un histograma de latencias con cubetas fijas (columnas le_*/gt_*)
+    para poder sumarlas en BD y estimar percentiles sobre cualquier ventana.
+    """
+    
+    bucket = models.DateTimeField(help_text="Inicio del minuto agregado")
+    method = models.CharField(max_length=10)
+    path_template = models.CharField(max_length=255, help_text="Ruta sin identificadores")
+    
+    # Métricas agregadas
+    count = models.PositiveIntegerField(default=0)
+    slow_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    total_time = models.FloatField(default=0.0, help_text="Suma de tiempos en segundos")
+    min_time = models.FloatField(default=0.0)
+    max_time = models.FloatField(default=0.0)
+    db_time_sum = models.FloatField(default=0.0, help_text="Suma de tiempo DB en segundos")
+    db_queries_sum = models.PositiveIntegerField(default=0)
+    db_queries_max = models.PositiveIntegerField(default=0)
+    
+    # Percentiles estimados del minuto (segundos)
+    p50 = models.FloatField(default=0.0)
+    p95 = models.FloatField(default=0.0)
+    p99 = models.FloatField(default=0.0)
+    
+    # Histograma de latencias
+    le_5ms = models.PositiveIntegerField(default=0)
+    le_10ms = models.PositiveIntegerField(default=0)
+    le_25ms = models.PositiveIntegerField(default=0)
+    le_50ms = models.PositiveIntegerField(default=0)
+    le_100ms = models.PositiveIntegerField(default=0)
+    le_250ms = models.PositiveIntegerField(default=0)
+    le_500ms = models.PositiveIntegerField(default=0)
+    le_1s = models.PositiveIntegerField(default=0)
+    le_2500ms = models.PositiveIntegerField(default=0)
+    le_5s = models.PositiveIntegerField(default=0)
+    le_10s = models.PositiveIntegerField(default=0)
+    gt_10s = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['empresa', 'bucket', 'method', 'path_template'],
+                name='unique_performance_rollup'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['empresa', 'bucket']),
+            models.Index(fields=['empresa', 'path_template', 'bucket']),
+        ]
+        verbose_name = "Rollup de Performance"
+        verbose_name_plural = "Rollups de Performance"
+    
+    def __str__(self):
+        return f"{self.method} {self.path_template} @ {self.bucket:%Y-%m-%d %H:%M} ({self.count})"
+
+
 class BusinessEventLog(TenantModelMixin, models.Model):
     """
     Eventos específicos de negocio
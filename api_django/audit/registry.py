@@ -0,0 +1,75 @@
+"""
+Registro de modelos auditados.
+
+Cada app declara en su AppConfig.ready() qué modelos se auditan:
+
+    from audit.registry import audit_registry
+    audit_registry.register(self.get_model('Ticket'), level='HIGH')
+
+Para los modelos registrados se guarda una copia de los valores de sus
+campos al cargarlos (post_init, que también cubre from_db), de modo que el
+diff de un UPDATE se calcula en memoria sin volver a consultar la fila.
+"""
+from django.db.models.signals import post_init
+
+# Atributo de la instancia con los valores cargados de la BD
+SNAPSHOT_ATTR = '_audit_snapshot'
+
+
+class AuditOptions:
+    """Opciones de auditoría de un modelo registrado"""
+
+    __slots__ = ('level', 'audit_delete', 'fields')
+
+    def __init__(self, level, audit_delete, fields):
+        self.level = level
+        self.audit_delete = audit_delete
+        self.fields = fields
+
+
+class AuditRegistry:
+    """Modelos auditados y sus opciones"""
+
+    def __init__(self):
+        self._registry = {}
+
+    def register(self, model, level='MEDIUM', audit_delete=True):
+        """Registra un modelo para auditoría de altas, cambios y (opcionalmente) bajas"""
+        fields = tuple(
+            field.name for field in model._meta.concrete_fields if not field.is_relation
+        )
+        self._registry[model] = AuditOptions(level, audit_delete, fields)
+        post_init.connect(take_snapshot, sender=model, dispatch_uid=f'audit_snapshot_{model._meta.label}')
+        return model
+
+    def unregister(self, model):
+        self._registry.pop(model, None)
+        post_init.disconnect(sender=model, dispatch_uid=f'audit_snapshot_{model._meta.label}')
+
+    def get_options(self, model):
+        """Opciones del modelo o None si no está registrado"""
+        return self._registry.get(model)
+
+    def is_registered(self, model):
+        return model in self._registry
+
+
+audit_registry = AuditRegistry()
+
+
+def _field_values(instance, fields):
+    # Solo los campos ya cargados: leer uno diferido lanzaría una query
+    loaded = instance.__dict__
+    return {name: loaded[name] for name in fields if name in loaded}
+
+
+def take_snapshot(sender, instance, **kwargs):
+    """Guarda los valores actuales de la instancia como punto de comparación"""
+    options = audit_registry.get_options(sender)
+    if options is not None:
+        setattr(instance, SNAPSHOT_ATTR, _field_values(instance, options.fields))
+
+
+def get_snapshot(instance):
+    """Valores de la instancia en su última carga o guardado"""
+    return getattr(instance, SNAPSHOT_ATTR, None)
@@ -0,0 +1,332 @@
+"""
+Agregación de rendimiento en histogramas por minuto.
+
+Cada request se suma en memoria a su cubeta (empresa, ruta, método, minuto)
+y las cubetas se vuelcan periódicamente (AUDIT_ROLLUP_FLUSH_INTERVAL) en
+PerformanceRollup, fusionándose con las filas que ya existan. Así las
+estadísticas no dependen de una fila por request: en PerformanceLog solo
+quedan unos pocos requests de ejemplo por cubeta.
+"""
+import atexit
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Cubetas del histograma: (columna, límite superior en segundos)
+HISTOGRAM_BUCKETS = (
+    ('le_5ms', 0.005),
+    ('le_10ms', 0.01),
+    ('le_25ms', 0.025),
+    ('le_50ms', 0.05),
+    ('le_100ms', 0.1),
+    ('le_250ms', 0.25),
+    ('le_500ms', 0.5),
+    ('le_1s', 1.0),
+    ('le_2500ms', 2.5),
+    ('le_5s', 5.0),
+    ('le_10s', 10.0),
+    ('gt_10s', None),
+)
+HISTOGRAM_FIELDS = tuple(name for name, _ in HISTOGRAM_BUCKETS)
+
+# Mismo criterio que PerformanceLog.is_slow
+SLOW_REQUEST_THRESHOLD = 2.0
+
+_NAMED_GROUP_RE = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+_NUMERIC_SEGMENT_RE = re.compile(r'/\d+(?=/|$)')
+
+
+def bucket_index(value):
+    """Índice de la cubeta del histograma para una latencia en segundos"""
+    for index, (_, upper) in enumerate(HISTOGRAM_BUCKETS):
+        if upper is None or value <= upper:
+            return index
+    return len(HISTOGRAM_BUCKETS) - 1
+
+
+def estimate_percentile(counts, quantile, min_time=0.0, max_time=0.0):
+    """
+    Estima un percentil a partir de los contadores del histograma,
+    interpolando linealmente dentro de la cubeta.
+    """
+    total = sum(counts)
+    if not total:
+        return 0.0
+
+    rank = quantile * total
+    cumulative = 0
+    lower = 0.0
+    for count, (_, upper) in zip(counts, HISTOGRAM_BUCKETS):
+        upper_value = upper if upper is not None else max(max_time, lower)
+        if count and cumulative + count >= rank:
+            value = lower + (upper_value - lower) * (rank - cumulative) / count
+            return min(max(value, min_time), max_time) if max_time else value
+        cumulative += count
+        lower = upper_value
+    return max_time
+
+
+def rollup_aggregates():
+    """Agregaciones para sumar filas de PerformanceRollup en una sola query"""
+    from django.db.models import Max, Min, Sum
+
+    aggregates = {
+        'total_requests': Sum('count'),
+        'total_slow': Sum('slow_count'),
+        'total_errors': Sum('error_count'),
+        'total_time': Sum('total_time'),
+        'min_response_time': Min('min_time'),
+        'max_response_time': Max('max_time'),
+        'total_db_time': Sum('db_time_sum'),
+        'total_db_queries': Sum('db_queries_sum'),
+        'max_db_queries': Max('db_queries_max'),
+    }
+    aggregates.update({field: Sum(field) for field in HISTOGRAM_FIELDS})
+    return aggregates
+
+
+def summarize_rollups(row):
+    """Convierte una fila agregada (rollup_aggregates) en estadísticas de la API"""
+    total = row.get('total_requests') or 0
+    counts = [row.get(field) or 0 for field in HISTOGRAM_FIELDS]
+    min_time = row.get('min_response_time') or 0.0
+    max_time = row.get('max_response_time') or 0.0
+
+    return {
+        'total_requests': total,
+        'total_slow': row.get('total_slow') or 0,
+        'total_errors': row.get('total_errors') or 0,
+        'avg_response_time': (row.get('total_time') or 0.0) / total if total else None,
+        'min_response_time': row.get('min_response_time'),
+        'max_response_time': row.get('max_response_time'),
+        'p50_response_time': estimate_percentile(counts, 0.50, min_time, max_time) if total else None,
+        'p95_response_time': estimate_percentile(counts, 0.95, min_time, max_time) if total else None,
+        'p99_response_time': estimate_percentile(counts, 0.99, min_time, max_time) if total else None,
+        'avg_db_time': (row.get('total_db_time') or 0.0) / total if total else None,
+        'avg_db_queries': (row.get('total_db_queries') or 0) / total if total else None,
+        'max_db_queries': row.get('max_db_queries'),
+    }
+
+
+def resolve_path_template(request):
+    """Ruta del request sin identificadores (p.ej. api/clientes/<pk>/)"""
+    match = getattr(request, 'resolver_match', None)
+    route = getattr(match, 'route', None) if match else None
+    if route:
+        route = _NAMED_GROUP_RE.sub(r'<\1>', route).replace('^', '').replace('$', '')
+        return '/' + route.lstrip('/')
+    return _NUMERIC_SEGMENT_RE.sub('/<id>', request.path)
+
+
+class _Bucket:
+    """Métricas acumuladas de una cubeta en memoria"""
+
+    __slots__ = (
+        'count', 'slow_count', 'error_count', 'total_time', 'min_time', 'max_time',
+        'db_time_sum', 'db_queries_sum', 'db_queries_max', 'histogram', 'exemplars',
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.slow_count = 0
+        self.error_count = 0
+        self.total_time = 0.0
+        self.min_time = 0.0
+        self.max_time = 0.0
+        self.db_time_sum = 0.0
+        self.db_queries_sum = 0
+        self.db_queries_max = 0
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS)
+        self.exemplars = 0
+
+    def add(self, response_time, db_time, db_queries, status_code):
+        self.min_time = response_time if not self.count else min(self.min_time, response_time)
+        self.max_time = max(self.max_time, response_time)
+        self.count += 1
+        self.total_time += response_time
+        self.db_time_sum += db_time
+        self.db_queries_sum += db_queries
+        self.db_queries_max = max(self.db_queries_max, db_queries)
+        self.histogram[bucket_index(response_time)] += 1
+        if response_time > SLOW_REQUEST_THRESHOLD:
+            self.slow_count += 1
+        if status_code >= 500:
+            self.error_count += 1
+
+    def merge(self, other):
+        """Suma otra cubeta en memoria a esta"""
+        self.min_time = other.min_time if not self.count else min(self.min_time, other.min_time)
+        self.max_time = max(self.max_time, other.max_time)
+        self.count += other.count
+        self.slow_count += other.slow_count
+        self.error_count += other.error_count
+        self.total_time += other.total_time
+        self.db_time_sum += other.db_time_sum
+        self.db_queries_sum += other.db_queries_sum
+        self.db_queries_max = max(self.db_queries_max, other.db_queries_max)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+    def merge_into(self, rollup):
+        """Suma la cubeta a una fila PerformanceRollup y recalcula percentiles"""
+        rollup.min_time = self.min_time if not rollup.count else min(rollup.min_time, self.min_time)
+        rollup.max_time = max(rollup.max_time, self.max_time)
+        rollup.count += self.count
+        rollup.slow_count += self.slow_count
+        rollup.error_count += self.error_count
+        rollup.total_time += self.total_time
+        rollup.db_time_sum += self.db_time_sum
+        rollup.db_queries_sum += self.db_queries_sum
+        rollup.db_queries_max = max(rollup.db_queries_max, self.db_queries_max)
+        counts = []
+        for field, count in zip(HISTOGRAM_FIELDS, self.histogram):
+            total = getattr(rollup, field) + count
+            setattr(rollup, field, total)
+            counts.append(total)
+        rollup.p50 = estimate_percentile(counts, 0.50, rollup.min_time, rollup.max_time)
+        rollup.p95 = estimate_percentile(counts, 0.95, rollup.min_time, rollup.max_time)
+        rollup.p99 = estimate_percentile(counts, 0.99, rollup.min_time, rollup.max_time)
+
+
+class PerformanceAggregator:
+    """
+    Acumula métricas de requests por (empresa, ruta, método, minuto)
+    y las vuelca en PerformanceRollup como mucho una vez por intervalo.
+    """
+
+    UPDATE_FIELDS = (
+        'count', 'slow_count', 'error_count', 'total_time', 'min_time', 'max_time',
+        'db_time_sum', 'db_queries_sum', 'db_queries_max', 'p50', 'p95', 'p99',
+    ) + HISTOGRAM_FIELDS
+
+    def __init__(self, interval=None):
+        self._interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @property
+    def interval(self):
+        if self._interval is not None:
+            return self._interval
+        return getattr(settings, 'AUDIT_ROLLUP_FLUSH_INTERVAL', 60)
+
+    @property
+    def exemplar_limit(self):
+        return getattr(settings, 'AUDIT_PERF_EXEMPLARS_PER_MINUTE', 3)
+
+    @property
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def record(self, empresa_id, path_template, method, response_time,
+               db_time=0.0, db_queries=0, status_code=200, want_exemplar=False, when=None):
+        """
+        Suma un request a su cubeta. Si se pide (want_exemplar) y aún caben
+        requests de ejemplo en la cubeta, reserva uno y retorna True.
+        """
+        minute = (when or timezone.now()).replace(second=0, microsecond=0)
+        key = (empresa_id, minute, method, path_template[:255])
+
+        with self._lock:
+            bucket = self._pending.get(key)
+            if bucket is None:
+                bucket = self._pending[key] = _Bucket()
+            bucket.add(response_time, db_time, db_queries, status_code)
+            exemplar = want_exemplar and bucket.exemplars < self.exemplar_limit
+            if exemplar:
+                bucket.exemplars += 1
+            due = time.monotonic() - self._last_flush >= self.interval
+
+        if due:
+            self.flush()
+        return exemplar
+
+    def flush(self):
+        """Vuelca las cubetas pendientes. Retorna el número de cubetas escritas"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return 0
+
+        try:
+            with transaction.atomic():
+                self._upsert(pending)
+        except Exception as e:
+            logger.error(f"Error volcando {len(pending)} rollups de performance: {e}")
+            self._requeue(pending)
+            return 0
+        return len(pending)
+
+    def reset(self):
+        """Descarta lo pendiente sin escribirlo (usado en tests)"""
+        with self._lock:
+            self._pending = {}
+            self._last_flush = time.monotonic()
+
+    def _upsert(self, pending):
+        from .models import PerformanceRollup
+
+        manager = PerformanceRollup._base_manager
+        condition = Q()
+        for empresa_id, minute, method, path in pending:
+            condition |= Q(empresa_id=empresa_id, bucket=minute, method=method, path_template=path)
+
+        existing = {
+            (r.empresa_id, r.bucket, r.method, r.path_template): r
+            for r in manager.select_for_update().filter(condition)
+        }
+
+        to_create = []
+        for key, bucket in pending.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                empresa_id, minute, method, path = key
+                rollup = PerformanceRollup(
+                    empresa_id=empresa_id, bucket=minute, method=method, path_template=path
+                )
+                to_create.append(rollup)
+            bucket.merge_into(rollup)
+
+        if existing:
+            manager.bulk_update(list(existing.values()), self.UPDATE_FIELDS)
+        if to_create:
+            manager.bulk_create(to_create)
+
+    def _requeue(self, pending):
+        """Devuelve a memoria las cubetas que no se pudieron escribir"""
+        with self._lock:
+            for key, bucket in pending.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = bucket
+                else:
+                    current.merge(bucket)
+
+
+# Instancia única por proceso
+performance_aggregator = PerformanceAggregator()
+
+
+def flush_performance_rollups():
+    """Utility function para volcar los rollups pendientes (p.ej. al parar el worker)"""
+    try:
+        return performance_aggregator.flush()
+    except Exception as e:
+        logger.error(f"Error en el volcado final de rollups de performance: {e}")
+        return 0
+
+
+def register_shutdown_flush():
+    """Registra el volcado final al terminar el proceso del worker"""
+    atexit.register(flush_performance_rollups)
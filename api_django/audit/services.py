@@ -1,6 +1,7 @@
 import logging
 import time
 import json
+from contextlib import ExitStack
 from datetime import datetime, date
 from decimal import Decimal
 from typing import Dict, Any, Optional
@@ -9,6 +10,9 @@ from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.utils import timezone
 from .models import AuditLog, SecurityLog, PerformanceLog, BusinessEventLog
+from .instrumentation import QueryInstrumentation
+from .rollups import SLOW_REQUEST_THRESHOLD
+from .writer import submit_audit_record
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -89,7 +93,10 @@ class AuditService:
             changes = {}
             if old_values and action == 'UPDATE':
                 for key, new_val in current_values.items():
-                    old_val = old_values.get(key)
+                    # Solo campos presentes en la instantánea (p.ej. no diferidos)
+                    if key not in old_values:
+                        continue
+                    old_val = old_values[key]
                     if old_val != new_val:
                         changes[key] = {'old': old_val, 'new': new_val}
             
@@ -100,7 +107,7 @@ class AuditService:
                 ip_address = AuditService._get_client_ip(request)
                 user_agent = request.META.get('HTTP_USER_AGENT', '')
             
-            AuditLog.objects.create(
+            submit_audit_record(AuditLog(
                 empresa=empresa,
                 action=action,
                 level=level,
@@ -117,7 +124,7 @@ class AuditService:
                 ip_address=ip_address,
                 user_agent=user_agent,
                 session_key=getattr(request, 'session', {}).get('session_key') if request else None
-            )
+            ))
             
         except Exception as e:
             logger.error(f"Error logging audit: {e}")
@@ -134,7 +141,7 @@ class AuditService:
             user_agent = request.META.get('HTTP_USER_AGENT', '') if request else None
             referrer = request.META.get('HTTP_REFERER') if request else None
             
-            SecurityLog.objects.create(
+            submit_audit_record(SecurityLog(
                 empresa=empresa,
                 event=event,
                 user=user,
@@ -145,14 +152,15 @@ class AuditService:
                 details=AuditService._serialize_values(details) if details else {},
                 success=success,
                 risk_level=risk_level
-            )
+            ))
             
         except Exception as e:
             logger.error(f"Error logging security event: {e}")
     
     @staticmethod
     def log_performance(request, response_time: float, db_queries: int = 0, 
-                       db_time: float = 0.0, memory_usage: float = None):
+                       db_time: float = 0.0, memory_usage: float = None,
+                       status_code: int = None, slow_queries=None, sampled: bool = False):
         """
         Registra métricas de rendimiento
         """
@@ -161,9 +169,9 @@ class AuditService:
             empresa = getattr(user, 'empresa', None) if user and user.is_authenticated else None
             
             # Determinar si es lento (>2s)
-            is_slow = response_time > 2.0
+            is_slow = response_time > SLOW_REQUEST_THRESHOLD
             
-            PerformanceLog.objects.create(
+            submit_audit_record(PerformanceLog(
                 empresa=empresa,
                 method=request.method,
                 path=request.path,
@@ -173,12 +181,14 @@ class AuditService:
                 db_time=db_time,
                 memory_usage=memory_usage,
                 is_slow=is_slow,
-                status_code=getattr(request, '_cached_response_status', 200),
+                status_code=status_code or getattr(request, '_cached_response_status', 200),
                 extra_data=AuditService._serialize_values({
                     'query_string': request.META.get('QUERY_STRING', ''),
-                    'content_length': request.META.get('CONTENT_LENGTH', 0)
+                    'content_length': request.META.get('CONTENT_LENGTH', 0),
+                    'slow_queries': slow_queries or [],
+                    'sampled': sampled
                 })
-            )
+            ))
             
         except Exception as e:
             logger.error(f"Error logging performance: {e}")
@@ -192,7 +202,7 @@ class AuditService:
         try:
             empresa = getattr(user, 'empresa', None) if user else None
             
-            BusinessEventLog.objects.create(
+            submit_audit_record(BusinessEventLog(
                 empresa=empresa,
                 event=event,
                 user=user,
@@ -200,7 +210,7 @@ class AuditService:
                 data=AuditService._serialize_values(data) if data else {},
                 amount=amount,
                 quantity=quantity
-            )
+            ))
             
         except Exception as e:
             logger.error(f"Error logging business event: {e}")
@@ -227,23 +237,26 @@ class PerformanceMonitor:
         self.request = request
         self.description = description
         self.start_time = None
-        self.start_queries = None
+        self.instrumentation = None
     
     def __enter__(self):
-        self.start_time = time.time()
-        # Podríamos agregar conteo de queries aquí
+        self.start_time = time.perf_counter()
+        self.instrumentation = QueryInstrumentation()
+        self._stack = ExitStack()
+        self._stack.enter_context(self.instrumentation.installed())
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        end_time = time.time()
-        response_time = end_time - self.start_time
+        self._stack.close()
+        response_time = time.perf_counter() - self.start_time
         
         if self.request:
             AuditService.log_performance(
                 request=self.request,
                 response_time=response_time,
-                db_queries=0,  # TODO: implementar conteo real
-                db_time=0.0
+                db_queries=self.instrumentation.count,
+                db_time=self.instrumentation.db_time,
+                slow_queries=self.instrumentation.slow_queries()
             )
 
 
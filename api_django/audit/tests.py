@@ -338,3 +338,233 @@ class TestAuditSecurity:
         # (asumiendo que el contexto está establecido para empresa)
         assert logs_empresa1.count() == 1
         assert logs_empresa2.count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.performance
+class TestAuditWriter:
+    """Tests de la escritura diferida en bloque de auditoría"""
+    
+    def _log(self, empresa, n):
+        return BusinessEventLog(
+            empresa=empresa, event='SALE_COMPLETED', description=f'Evento {n}', data={}
+        )
+    
+    def test_escribe_en_bloque_tras_commit(self, empresa, settings):
+        """Test que los eventos se encolan al hacer commit y se vuelcan con bulk_create"""
+        from django.db import transaction
+        from audit.writer import AuditWriter
+        
+        settings.AUDIT_ASYNC = True
+        writer = AuditWriter(batch_size=50, flush_interval=0.05)
+        
+        with transaction.atomic():
+            for n in range(5):
+                writer.submit(self._log(empresa, n))
+            # Nada se escribe antes del commit
+            assert BusinessEventLog._base_manager.count() == 0
+        
+        writer.flush()
+        writer.stop()
+        assert BusinessEventLog._base_manager.filter(empresa=empresa).count() == 5
+    
+    def test_descarta_eventos_en_rollback(self, empresa, settings):
+        """Test que un rollback descarta los eventos de la transacción"""
+        from django.db import transaction
+        from audit.writer import AuditWriter
+        
+        settings.AUDIT_ASYNC = True
+        writer = AuditWriter(batch_size=50, flush_interval=0.05)
+        
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                writer.submit(self._log(empresa, 1))
+                raise RuntimeError("rollback")
+        
+        writer.flush()
+        writer.stop()
+        assert writer.pending_count == 0
+        assert BusinessEventLog._base_manager.count() == 0
+    
+    def test_modo_sincrono(self, empresa, usuario):
+        """Test que con AUDIT_ASYNC=False el servicio escribe al instante"""
+        from audit.services import AuditService
+        
+        AuditService.log_business_event(
+            event='SALE_COMPLETED', description='Venta', user=usuario, amount=10
+        )
+        
+        assert BusinessEventLog._base_manager.filter(empresa=empresa).count() == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestAuditChangeTracking:
+    """Tests del diff en memoria de los modelos registrados"""
+    
+    def test_update_sin_select_previo(self, empresa, cliente):
+        """Test que guardar un modelo auditado no vuelve a leer la fila"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core.models import Cliente
+        
+        instancia = Cliente._base_manager.get(pk=cliente.pk)
+        instancia.nombre = "Cliente Renombrado"
+        
+        with CaptureQueriesContext(connection) as ctx:
+            instancia.save()
+        
+        selects = [q['sql'] for q in ctx.captured_queries
+                   if q['sql'].startswith('SELECT') and '"core_cliente"' in q['sql']]
+        assert selects == []
+        
+        log = AuditLog._base_manager.filter(action='UPDATE', table_name='core_cliente').latest('timestamp')
+        assert log.changes['nombre'] == {'old': 'Cliente Test', 'new': 'Cliente Renombrado'}
+    
+    def test_snapshot_se_renueva_tras_guardar(self, empresa, cliente):
+        """Test que un segundo save compara contra lo último guardado"""
+        from core.models import Cliente
+        
+        instancia = Cliente._base_manager.get(pk=cliente.pk)
+        instancia.nombre = "Primero"
+        instancia.save()
+        instancia.nombre = "Segundo"
+        instancia.save()
+        
+        log = AuditLog._base_manager.filter(action='UPDATE', table_name='core_cliente').order_by('-id').first()
+        assert log.changes['nombre'] == {'old': 'Primero', 'new': 'Segundo'}
+    
+    def test_modelos_no_registrados_no_se_auditan(self, empresa, categoria):
+        """Test que los modelos fuera del registro no generan auditoría ni snapshot"""
+        from audit.registry import audit_registry, get_snapshot
+        from products.models import Categoria
+        
+        instancia = Categoria._base_manager.get(pk=categoria.pk)
+        instancia.nombre = "Otra"
+        instancia.save()
+        
+        assert not audit_registry.is_registered(Categoria)
+        assert get_snapshot(instancia) is None
+        assert not AuditLog._base_manager.filter(table_name='products_categoria').exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestQueryInstrumentation:
+    """Tests de la instrumentación de queries sin DEBUG"""
+    
+    def test_cuenta_queries_sin_debug(self, empresa, settings):
+        """Test que se cuentan queries y tiempo de BD con DEBUG=False"""
+        from audit.instrumentation import QueryInstrumentation
+        
+        settings.DEBUG = False
+        instrumentation = QueryInstrumentation(top_n=2)
+        with instrumentation.installed():
+            for _ in range(3):
+                list(Empresa.objects.filter(pk=empresa.pk))
+            Empresa.objects.count()
+        
+        assert instrumentation.count == 4
+        assert instrumentation.db_time > 0
+        slow = instrumentation.slow_queries()
+        assert sum(s['count'] for s in slow) == 2
+        assert all('?' in s['fingerprint'] or 'COUNT' in s['fingerprint'] for s in slow)
+    
+    def test_huella_sql_agrupa_valores(self):
+        """Test que la huella ignora literales y listas IN"""
+        from audit.instrumentation import sql_fingerprint
+        
+        a = sql_fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND nombre = 'x'")
+        b = sql_fingerprint("SELECT *  FROM t WHERE id IN (7) AND nombre = 'otro'")
+        assert a == b == "SELECT * FROM t WHERE id IN (...) AND nombre = ?"
+    
+    def test_middleware_registra_request_con_muchas_queries(self, authenticated_client, empresa, settings):
+        """Test que el middleware alimenta PerformanceLog con queries y huellas"""
+        settings.DEBUG = False
+        settings.AUDIT_PERF_QUERY_THRESHOLD = 0
+        
+        response = authenticated_client.get("/api/clientes/")
+        
+        assert response.status_code == 200
+        log = PerformanceLog._base_manager.get(path="/api/clientes/")
+        assert log.db_queries_count > 0
+        assert log.status_code == 200
+        assert log.extra_data['slow_queries']
+        assert log.extra_data['sampled'] is False
+    
+    def test_muestreo(self, settings):
+        """Test del muestreo: umbrales siempre, resto según la tasa"""
+        from audit.instrumentation import should_log_performance
+        
+        settings.AUDIT_PERF_SAMPLE_RATE = 0
+        assert should_log_performance(5.0, 1) == (True, False)
+        assert should_log_performance(0.01, 1) == (False, False)
+        settings.AUDIT_PERF_SAMPLE_RATE = 1
+        assert should_log_performance(0.01, 1) == (True, True)
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestPerformanceRollups:
+    """Tests de los histogramas agregados de rendimiento"""
+    
+    def test_agrega_por_minuto_y_fusiona_volcados(self, empresa):
+        """Test que varios volcados de la misma cubeta se fusionan en una fila"""
+        from datetime import datetime, timezone as dt_timezone
+        from audit.models import PerformanceRollup
+        from audit.rollups import PerformanceAggregator
+        
+        aggregator = PerformanceAggregator(interval=3600)
+        when = datetime(2026, 1, 1, 10, 30, 15, tzinfo=dt_timezone.utc)
+        for ms in (10, 20, 30, 40):
+            aggregator.record(empresa.id, '/api/clientes/', 'GET', ms / 1000, db_time=0.001, db_queries=2, when=when)
+        assert aggregator.flush() == 1
+        
+        aggregator.record(empresa.id, '/api/clientes/', 'GET', 3.0, db_queries=5, when=when)
+        aggregator.flush()
+        
+        rollup = PerformanceRollup._base_manager.get(empresa=empresa)
+        assert rollup.bucket == when.replace(second=0)
+        assert rollup.count == 5
+        assert rollup.slow_count == 1
+        assert rollup.db_queries_sum == 13
+        assert rollup.db_queries_max == 5
+        assert rollup.max_time == 3.0
+        assert rollup.p50 <= 0.05 < rollup.p99 <= 3.0
+    
+    def test_limite_de_requests_de_ejemplo(self, empresa, settings):
+        """Test que solo se guardan unos pocos requests de ejemplo por cubeta"""
+        from audit.rollups import PerformanceAggregator
+        
+        settings.AUDIT_PERF_EXEMPLARS_PER_MINUTE = 2
+        aggregator = PerformanceAggregator(interval=3600)
+        kept = [
+            aggregator.record(empresa.id, '/api/x/', 'GET', 5.0, want_exemplar=True)
+            for _ in range(5)
+        ]
+        assert kept.count(True) == 2
+    
+    def test_stats_desde_rollups(self, authenticated_client, empresa, settings):
+        """Test que stats y slow_queries leen de los rollups ya volcados, sin volcar"""
+        from django.urls import reverse
+        from audit.rollups import performance_aggregator
+        
+        settings.AUDIT_PERF_SAMPLE_RATE = 0
+        settings.AUDIT_ROLLUP_FLUSH_INTERVAL = 3600
+        for ms in (10, 20, 2500):
+            performance_aggregator.record(empresa.id, '/api/clientes/<pk>/', 'GET', ms / 1000)
+        performance_aggregator.flush()
+        
+        response = authenticated_client.get(reverse('performance-stats'))
+        assert response.status_code == 200
+        assert response.data['total_requests'] == 3
+        assert performance_aggregator.pending_count == 1
+        assert response.data['total_slow'] == 1
+        assert response.data['p99_response_time'] > 1.0
+        assert PerformanceLog._base_manager.count() == 0
+        
+        response = authenticated_client.get(reverse('performance-slow-queries'))
+        assert response.status_code == 200
+        results = response.data['results']
+        assert results[0]['path_template'] == '/api/clientes/<pk>/'
+        assert results[0]['total_slow'] == 1
@@ -5,13 +5,15 @@ from rest_framework.response import Response
 from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
-from .models import AuditLog, SecurityLog, PerformanceLog, BusinessEventLog
+from core.mixins import StreamingExportMixin
+from .models import AuditLog, SecurityLog, PerformanceLog, PerformanceRollup, BusinessEventLog
+from .rollups import rollup_aggregates, summarize_rollups
 from .serializers import (
     AuditLogSerializer, SecurityLogSerializer, PerformanceLogSerializer,
     BusinessEventLogSerializer, AuditSummarySerializer, SecuritySummarySerializer
 )
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+class AuditLogViewSet(StreamingExportMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para logs de auditoría - Solo lectura
     """
@@ -20,6 +22,10 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['action', 'level', 'module', 'table_name', 'user']
     search_fields = ['description', 'table_name']
     ordering = ['-timestamp']
+    export_fields = (
+        'id', 'timestamp', 'action', 'level', 'module', 'table_name', 'record_id',
+        'user__username', 'ip_address', 'description', 'changes',
+    )
     
     def get_queryset(self):
         return AuditLog.objects.filter(empresa=self.request.user.empresa)
@@ -181,46 +187,50 @@ class PerformanceLogViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         return PerformanceLog.objects.filter(empresa=self.request.user.empresa)
     
+    def get_rollups(self):
+        """
+        Rollups ya volcados de la empresa en la ventana ?days= (por defecto 7
+        días). Lo que aún está en memoria aparece tras el siguiente volcado
+        periódico (AUDIT_ROLLUP_FLUSH_INTERVAL).
+        """
+        days = int(self.request.query_params.get('days', 7))
+        start_date = timezone.now() - timedelta(days=days)
+        return PerformanceRollup.objects.filter(
+            empresa=self.request.user.empresa,
+            bucket__gte=start_date
+        )
+    
     @action(detail=False, methods=['get'])
     def slow_queries(self, request):
         """
-        Solo queries lentas
+        Rutas con requests lentos, agregadas desde los rollups
+        (percentiles, tiempos medios y de BD por ruta y método)
         """
-        queryset = self.get_queryset().filter(is_slow=True)
+        rows = (
+            self.get_rollups()
+            .values('path_template', 'method')
+            .annotate(**rollup_aggregates())
+            .filter(total_slow__gt=0)
+            .order_by('-total_slow', '-max_response_time')
+        )
         
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        results = [
+            {'path_template': row['path_template'], 'method': row['method'], **summarize_rollups(row)}
+            for row in rows
+        ]
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(results)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(results)
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
-        Estadísticas de performance
+        Estadísticas de performance (desde los rollups por minuto)
         """
-        queryset = self.get_queryset()
-        
-        # Filtros de fecha
-        days = int(request.query_params.get('days', 7))
-        start_date = timezone.now() - timedelta(days=days)
-        queryset = queryset.filter(timestamp__gte=start_date)
-        
-        from django.db.models import Avg, Max, Min
-        
-        stats = queryset.aggregate(
-            avg_response_time=Avg('response_time'),
-            max_response_time=Max('response_time'),
-            min_response_time=Min('response_time'),
-            avg_db_queries=Avg('db_queries_count'),
-            max_db_queries=Max('db_queries_count'),
-            total_slow=Count('id', filter=Q(is_slow=True)),
-            total_requests=Count('id')
-        )
-        
-        return Response(stats)
+        row = self.get_rollups().aggregate(**rollup_aggregates())
+        return Response(summarize_rollups(row))
 
 class BusinessEventLogViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -0,0 +1,222 @@
+"""
+Escritura diferida y en bloque de los registros de auditoría.
+
+Los registros (AuditLog, SecurityLog, PerformanceLog, BusinessEventLog) se
+construyen en el request pero no se insertan allí: cuando la transacción
+actual hace commit se encolan en memoria del proceso y un hilo de fondo los
+vuelca con bulk_create, por tamaño de lote (AUDIT_BATCH_SIZE) o por tiempo
+(AUDIT_FLUSH_INTERVAL). Si la transacción hace rollback el evento se descarta.
+
+Con AUDIT_ASYNC = False (tests) cada registro se guarda de forma síncrona
+dentro de la transacción actual.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from tenants.utils import get_current_empresa_id
+
+logger = logging.getLogger(__name__)
+
+# Marca para detener el hilo escritor
+_STOP = object()
+
+
+class AuditWriter:
+    """
+    Cola de registros de auditoría drenada por un hilo de fondo.
+
+    El hilo se arranca bajo demanda (y se vuelve a arrancar tras un fork),
+    agrupa los registros por modelo y los inserta con bulk_create.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_queue_size=None):
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_queue_size = max_queue_size
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def batch_size(self):
+        if self._batch_size is not None:
+            return self._batch_size
+        return getattr(settings, 'AUDIT_BATCH_SIZE', 100)
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'AUDIT_FLUSH_INTERVAL', 2.0)
+
+    @property
+    def max_queue_size(self):
+        if self._max_queue_size is not None:
+            return self._max_queue_size
+        return getattr(settings, 'AUDIT_QUEUE_MAX_SIZE', 10000)
+
+    @property
+    def is_async(self):
+        return getattr(settings, 'AUDIT_ASYNC', True)
+
+    def submit(self, record):
+        """
+        Registra un objeto de auditoría sin guardar.
+        Se escribe tras el commit de la transacción actual (o al instante si no hay).
+        """
+        if not self.is_async:
+            record.save()
+            return
+
+        self._assign_empresa(record)
+        transaction.on_commit(lambda: self.enqueue(record))
+
+    def enqueue(self, record):
+        """Añade el registro a la cola del hilo escritor"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Cola saturada: escribir en el hilo actual antes que perder el evento
+            logger.warning("Cola de auditoría llena, escribiendo de forma síncrona")
+            self._write_batch(type(record), [record])
+
+    def flush(self, timeout=5.0):
+        """Espera a que el hilo escritor vacíe la cola (p.ej. al parar el worker)"""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        """Vuelca lo pendiente y detiene el hilo escritor"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive() or self._pid != os.getpid():
+                return
+            self._queue.put(_STOP)
+            self._thread = None
+        thread.join(timeout)
+
+    @property
+    def pending_count(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _assign_empresa(self, record):
+        """Misma regla que TenantModelMixin.save (bulk_create no llama a save)"""
+        if not record.empresa_id:
+            empresa_id = get_current_empresa_id()
+            if not empresa_id:
+                raise ValueError(
+                    f"No se puede registrar {type(record).__name__} sin una empresa asignada."
+                )
+            record.empresa_id = empresa_id
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            # Tras un fork la cola y el hilo del padre no sirven
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='audit-writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        """Bucle del hilo escritor: acumula y vuelca por tamaño o por tiempo"""
+        pending = defaultdict(list)
+        count = 0
+        deadline = time.monotonic() + self.flush_interval
+        stop = False
+
+        while not stop:
+            waiters = []
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+                while True:
+                    if item is _STOP:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        pending[type(item)].append(item)
+                        count += 1
+                    if stop or count >= self.batch_size:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if count and (stop or waiters or count >= self.batch_size
+                          or time.monotonic() >= deadline):
+                self._flush_pending(pending)
+                pending = defaultdict(list)
+                count = 0
+
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+            for waiter in waiters:
+                waiter.set()
+
+    def _flush_pending(self, pending):
+        close_old_connections()
+        try:
+            for model, records in pending.items():
+                for start in range(0, len(records), self.batch_size):
+                    self._write_batch(model, records[start:start + self.batch_size])
+        finally:
+            close_old_connections()
+
+    def _write_batch(self, model, records):
+        try:
+            model._base_manager.bulk_create(records)
+        except Exception as e:
+            logger.error(f"Error volcando {len(records)} registros de {model.__name__}: {e}")
+            # Reintentar uno a uno para no perder el lote por un registro inválido
+            for record in records:
+                try:
+                    model._base_manager.bulk_create([record])
+                except Exception as row_error:
+                    logger.error(f"Registro de {model.__name__} descartado: {row_error}")
+
+
+# Instancia única por proceso
+audit_writer = AuditWriter()
+
+
+def submit_audit_record(record):
+    """Utility function para registrar un objeto de auditoría sin guardar"""
+    audit_writer.submit(record)
+
+
+def flush_audit_records():
+    """Utility function para vaciar la cola de auditoría"""
+    try:
+        audit_writer.stop()
+    except Exception as e:
+        logger.error(f"Error en el volcado final de auditoría: {e}")
+
+
+def register_shutdown_flush():
+    """Registra el volcado final al terminar el proceso del worker"""
+    atexit.register(flush_audit_records)
@@ -21,6 +21,33 @@ from inventory.models import Almacen
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def reset_tenant_context():
+    """Evita que el contexto de tenant de un test se filtre al siguiente"""
+    from tenants.utils import clear_context
+    clear_context()
+    yield
+    clear_context()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpia la cache (p.ej. estado de activación de empresas) entre tests"""
+    from django.core.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_performance_rollups():
+    """Descarta los rollups en memoria para que no se vuelquen en otro test"""
+    from audit.rollups import performance_aggregator
+    performance_aggregator.reset()
+    yield
+    performance_aggregator.reset()
+
+
 @pytest.fixture
 def empresa():
     """Fixture para crear una empresa de test"""
@@ -1,10 +1,23 @@
 from django.contrib import admin
-from .models import Cliente, Proveedor
+from .models import Cliente, ClienteEtiqueta, Etiqueta, Proveedor, ProveedorEtiqueta
 
 # Register your models here.
 
+class ClienteEtiquetaInline(admin.TabularInline):
+    model = ClienteEtiqueta
+    extra = 0
+    raw_id_fields = ('etiqueta',)
+
+
+class ProveedorEtiquetaInline(admin.TabularInline):
+    model = ProveedorEtiqueta
+    extra = 0
+    raw_id_fields = ('etiqueta',)
+
+
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
+    inlines = [ClienteEtiquetaInline]
     list_display = ('nombre', 'empresa', 'email', 'telefono', 'activo', 'created_at')
     list_filter = ('empresa', 'activo', 'created_at')
     search_fields = ('nombre', 'email', 'telefono', 'cif_nif')
@@ -36,6 +49,7 @@ class ClienteAdmin(admin.ModelAdmin):
 
 @admin.register(Proveedor)
 class ProveedorAdmin(admin.ModelAdmin):
+    inlines = [ProveedorEtiquetaInline]
     list_display = ('nombre', 'empresa', 'email', 'telefono', 'activo', 'created_at')
     list_filter = ('empresa', 'activo', 'created_at')
     search_fields = ('nombre', 'email', 'telefono', 'cif_nif')
@@ -63,3 +77,19 @@ class ProveedorAdmin(admin.ModelAdmin):
         elif hasattr(request.user, 'empresa') and request.user.empresa:
             return qs.filter(empresa=request.user.empresa)
         return qs.none()
+
+
+@admin.register(Etiqueta)
+class EtiquetaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'clave', 'empresa', 'created_at')
+    list_filter = ('empresa',)
+    search_fields = ('nombre', 'clave')
+    readonly_fields = ('clave', 'created_at')
+    
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser or getattr(request.user, 'role', None) == 'superadmin':
+            return qs
+        elif hasattr(request.user, 'empresa') and request.user.empresa:
+            return qs.filter(empresa=request.user.empresa)
+        return qs.none()
@@ -5,3 +5,26 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'Core - Modelos Base'
+    
+    def ready(self):
+        # Modelos auditados
+        from audit.registry import audit_registry
+        audit_registry.register(self.get_model('Cliente'))
+        
+        # Etiquetas (antes que la búsqueda: el índice lee `tags` ya guardado)
+        from . import signals  # noqa: F401
+        
+        # Búsqueda indexada
+        from search.registry import search_registry
+        contacto_fields = {
+            'nombre': 3, 'nombre_comercial': 3, 'email': 2, 'telefono': 2, 'movil': 2,
+            'poblacion': 1, 'tags': 1,
+        }
+        search_registry.register(
+            self.get_model('Cliente'), fields={**contacto_fields, 'cif': 2},
+            compact=('telefono', 'movil', 'cif')
+        )
+        search_registry.register(
+            self.get_model('Proveedor'), fields={**contacto_fields, 'cif_nif': 2},
+            compact=('telefono', 'movil', 'cif_nif')
+        )
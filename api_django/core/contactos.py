@@ -0,0 +1,106 @@
+"""
+Consulta combinada de contactos (clientes y proveedores).
+
+Las dos tablas se unen en la BD con UNION ALL seleccionando solo las
+columnas del listado. El orden (lower(nombre), tipo, id) y el LIMIT/OFFSET
+también se resuelven en SQL, así que una página no carga el resto de
+contactos. Para páginas profundas hay paginación por cursor (keyset) sobre
+esa misma clave. La búsqueda usa el índice de search (SearchToken) y el
+filtro por etiqueta las tablas de enlace; el texto de etiquetas de la
+página se carga aparte, con una consulta por tipo.
+"""
+import base64
+import json
+
+from django.db.models import CharField, F, Q, Value
+from django.db.models.functions import Lower
+
+from search.services import SearchIndexService
+from .etiquetas import EtiquetaService
+from .models import Cliente, Proveedor
+
+# Columnas comunes a Cliente y Proveedor
+CONTACT_FIELDS = (
+    'id', 'nombre', 'nombre_comercial', 'es_empresa',
+    'email', 'telefono', 'movil', 'website',
+    'direccion', 'poblacion', 'codigo_postal', 'provincia', 'pais',
+    'identificacion_vat', 'activo', 'created_at', 'updated_at',
+)
+
+# Tipo -> (modelo, campo del CIF/NIF)
+CONTACT_SOURCES = (
+    ('cliente', Cliente, 'cif'),
+    ('proveedor', Proveedor, 'cif_nif'),
+)
+
+ORDERING = ('nombre_orden', 'tipo', 'id')
+
+
+def _keyset_filter(tipo, after):
+    """Filas posteriores a la clave (nombre_orden, tipo, id) dentro de un tipo"""
+    nombre, after_tipo, after_id = after
+    if tipo == after_tipo:
+        return Q(nombre_orden__gt=nombre) | Q(nombre_orden=nombre, id__gt=after_id)
+    if tipo > after_tipo:
+        return Q(nombre_orden__gte=nombre)
+    return Q(nombre_orden__gt=nombre)
+
+
+def contactos_queryset(search='', activo=None, etiquetas=(), after=None):
+    """
+    UNION ALL ordenada de clientes y proveedores (filas como dict).
+    `etiquetas` son claves de etiqueta que deben tener todos los contactos.
+    `after` es una clave (nombre_orden, tipo, id) para paginar por cursor.
+    """
+    querysets = []
+    for tipo, model, cif_field in CONTACT_SOURCES:
+        queryset = model.objects.annotate(
+            nombre_orden=Lower('nombre'),
+            tipo=Value(tipo, output_field=CharField()),
+            documento_fiscal=F(cif_field),
+        )
+        matching_ids = SearchIndexService.matching_ids(model, search)
+        if matching_ids is not None:
+            queryset = queryset.filter(pk__in=matching_ids)
+        if activo is not None:
+            queryset = queryset.filter(activo=activo)
+        if etiquetas:
+            queryset = EtiquetaService.filtrar(queryset, etiquetas)
+        if after is not None:
+            queryset = queryset.filter(_keyset_filter(tipo, after))
+        querysets.append(
+            queryset.order_by().values(*CONTACT_FIELDS, 'documento_fiscal', 'tipo', 'nombre_orden')
+        )
+
+    return querysets[0].union(*querysets[1:], all=True).order_by(*ORDERING)
+
+
+def as_contactos(rows):
+    """Filas de la UNION -> dicts del ContactoSerializer (con sus etiquetas)"""
+    rows = list(rows)
+    for tipo, model, _ in CONTACT_SOURCES:
+        ids = [row['id'] for row in rows if row['tipo'] == tipo]
+        tags = EtiquetaService.tags_por_contacto(model, ids) if ids else {}
+        for row in rows:
+            if row['tipo'] == tipo:
+                row['tags'] = tags.get(row['id'])
+    for row in rows:
+        row['cif_nif'] = row.pop('documento_fiscal')
+    return rows
+
+
+def encode_cursor(row):
+    """Cursor opaco con la clave de ordenación de la última fila de la página"""
+    key = [row['nombre_orden'], row['tipo'], row['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Clave (nombre_orden, tipo, id) de un cursor. Lanza ValueError si no es válido"""
+    try:
+        nombre, tipo, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Cursor no válido")
+    if not isinstance(nombre, str) or not isinstance(tipo, str) or not isinstance(pk, int):
+        raise ValueError("Cursor no válido")
+    return nombre, tipo, pk
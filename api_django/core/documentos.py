@@ -0,0 +1,252 @@
+"""
+Escritura en bloque de documentos comerciales y sus líneas.
+
+Crear las líneas una a una dispara en cada post_save el recálculo de
+totales (calculate_totals relee todas las líneas y guarda la cabecera) y la
+auditoría: N líneas cuestan O(N²) lecturas y N escrituras de la cabecera.
+Aquí las líneas se insertan con bulk_create, los totales se calculan en
+memoria y la cabecera se escribe una sola vez.
+
+Fuera de la escritura en bloque, calculate_totals obtiene los totales con un
+único agregado SQL sobre las líneas y un UPDATE de la cabecera.
+DocumentTotalsService detecta (y repara) cabeceras cuyos totales no cuadran
+con sus líneas, p.ej. tras un queryset.update() o una carga directa en BD.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Abs, Coalesce
+from django.dispatch import Signal
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+CENT = Decimal('0.01')
+
+# Documentos con totales calculados a partir de sus líneas
+DOCUMENT_MODELS = (
+    'sales.Presupuesto', 'sales.Pedido', 'sales.Albaran', 'sales.Ticket', 'sales.Factura',
+    'purchases.PedidoCompra', 'purchases.AlbaranCompra', 'purchases.FacturaCompra',
+)
+
+# Un total guardado está descuadrado si difiere más que el redondeo a céntimos
+TOLERANCIA = Decimal('0.006')
+
+_item_totals_deferred = ContextVar('item_totals_deferred', default=False)
+
+# Documentos creados con bulk_create (no disparan post_save).
+# sender=modelo del documento, documentos=[instancias con pk]
+documents_bulk_created = Signal()
+
+# Líneas de un documento nuevo ya guardadas (una vez por documento).
+# sender=modelo del documento, documento=instancia, items=[líneas]
+document_items_created = Signal()
+
+
+@contextmanager
+def defer_item_totals():
+    """Desactiva el recálculo de totales desde las señales de las líneas"""
+    token = _item_totals_deferred.set(True)
+    try:
+        yield
+    finally:
+        _item_totals_deferred.reset(token)
+
+
+def item_totals_deferred():
+    """Utility function para saber si las señales de línea deben ignorar el recálculo de totales"""
+    return _item_totals_deferred.get()
+
+
+def _rounded(subtotal, iva):
+    subtotal = (subtotal or Decimal('0')).quantize(CENT)
+    iva = (iva or Decimal('0')).quantize(CENT)
+    return subtotal, iva, subtotal + iva
+
+
+def compute_totals(items):
+    """Utility function para calcular (subtotal, iva, total) de unas líneas en memoria"""
+    return _rounded(
+        sum((item.subtotal for item in items), Decimal('0')),
+        sum((item.iva_amount for item in items), Decimal('0')),
+    )
+
+
+def aggregate_totals(items):
+    """
+    Utility function para calcular (subtotal, iva, total) de un queryset de
+    líneas con un único agregado SQL (SUM(cantidad * precio_unitario), ...).
+    """
+    model = items.model
+    row = items.order_by().aggregate(
+        subtotal=Sum(model.subtotal_expression(), output_field=MONEY),
+        iva=Sum(model.iva_expression(), output_field=MONEY),
+    )
+    return _rounded(row['subtotal'], row['iva'])
+
+
+def item_relation(model):
+    """Utility function para obtener (modelo de línea, campo hacia el documento) de un documento"""
+    for relation in model._meta.related_objects:
+        if relation.one_to_many and hasattr(relation.related_model, 'subtotal_expression'):
+            return relation.related_model, relation.field.name
+    raise ValueError(f"{model._meta.label} no tiene modelo de líneas")
+
+
+class DocumentWriteService:
+    """Escritura de documentos con sus líneas en bloque"""
+
+    @staticmethod
+    def set_items(documento, item_model, field_name, items_data, replace=False):
+        """
+        Inserta las líneas del documento con bulk_create y guarda los totales
+        (calculados en memoria) con un solo UPDATE. Sin replace el documento
+        debe ser nuevo, sin líneas; con replace=True se sustituyen las que tenga.
+        """
+        with transaction.atomic(), defer_item_totals():
+            if replace:
+                documento.get_items().delete()
+            items = [item_model(**{field_name: documento}, **data) for data in items_data]
+            item_model._base_manager.bulk_create(items)
+            documento.subtotal, documento.iva, documento.total = compute_totals(items)
+            documento.save(update_fields=['subtotal', 'iva', 'total'])
+            if not replace:
+                document_items_created.send(sender=type(documento), documento=documento, items=items)
+        return documento
+
+    @staticmethod
+    def bulk_create_documents(model, item_model, field_name, documents, batch_size=1000):
+        """
+        Crea muchos documentos con sus líneas: documents es [(cabecera, [líneas])]
+        como dicts de campos (la cabecera con empresa). Los totales se calculan
+        en memoria; son un INSERT de cabeceras y otro de líneas por lote.
+        Retorna las cabeceras creadas.
+        """
+        pending = []
+        for header_data, items_data in documents:
+            items = [item_model(**data) for data in items_data]
+            documento = model(**header_data)
+            documento.subtotal, documento.iva, documento.total = compute_totals(items)
+            pending.append((documento, items))
+        documentos = [documento for documento, _ in pending]
+
+        with transaction.atomic():
+            model._base_manager.bulk_create(documentos, batch_size=batch_size)
+            if any(documento.pk is None for documento in documentos):
+                # Backends sin RETURNING (MySQL): ids por (empresa, numero), que es único
+                ids = {}
+                for empresa_id in {documento.empresa_id for documento in documentos}:
+                    numeros = [d.numero for d in documentos if d.empresa_id == empresa_id]
+                    ids.update(
+                        ((empresa_id, numero), pk) for numero, pk in model._base_manager.filter(
+                            empresa_id=empresa_id, numero__in=numeros
+                        ).values_list('numero', 'pk')
+                    )
+                for documento in documentos:
+                    documento.pk = ids[(documento.empresa_id, documento.numero)]
+
+            items = []
+            for documento, document_items in pending:
+                for item in document_items:
+                    setattr(item, field_name, documento)
+                items.extend(document_items)
+            item_model._base_manager.bulk_create(items, batch_size=batch_size)
+
+            documents_bulk_created.send(sender=model, documentos=documentos)
+        return documentos
+
+    @staticmethod
+    def check_bulk_references(model, item_model, documents):
+        """
+        Comprueba con una consulta por tabla (empresa actual) que clientes,
+        series y artículos existen y que los números no se repiten ni existen
+        ya. documents son dicts con cliente, serie e items[].articulo como ids.
+        Retorna una lista de errores por documento ({} si es válido).
+        """
+        def existing(related_model, ids):
+            return set(related_model.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+
+        clientes = existing(
+            model._meta.get_field('cliente').related_model,
+            {doc['cliente'] for doc in documents}
+        )
+        series = existing(
+            model._meta.get_field('serie').related_model,
+            {doc['serie'] for doc in documents if doc.get('serie')}
+        )
+        articulos = existing(
+            item_model._meta.get_field('articulo').related_model,
+            {item['articulo'] for doc in documents for item in doc['items']}
+        )
+        numeros = [doc['numero'] for doc in documents]
+        usados = set(model.objects.filter(numero__in=numeros).values_list('numero', flat=True))
+
+        errors = []
+        vistos = set()
+        for doc in documents:
+            doc_errors = {}
+            if doc['cliente'] not in clientes:
+                doc_errors['cliente'] = ["Cliente no válido para esta empresa"]
+            if doc.get('serie') and doc['serie'] not in series:
+                doc_errors['serie'] = ["Serie no válida para esta empresa"]
+            if doc['numero'] in usados or doc['numero'] in vistos:
+                doc_errors['numero'] = ["Número de documento repetido"]
+            vistos.add(doc['numero'])
+            invalidos = sorted({item['articulo'] for item in doc['items']} - articulos)
+            if invalidos:
+                doc_errors['items'] = [f"Artículos no válidos: {invalidos}"]
+            errors.append(doc_errors)
+        return errors
+
+
+class DocumentTotalsService:
+    """Comprobación y reparación de totales descuadrados respecto a sus líneas"""
+
+    @staticmethod
+    def document_models(labels=None):
+        return [apps.get_model(label) for label in (labels or DOCUMENT_MODELS)]
+
+    @staticmethod
+    def drifted(model, empresa_id=None):
+        """
+        Documentos cuyo subtotal/IVA no cuadra con la suma de sus líneas o
+        cuyo total no es subtotal + IVA. Una sola consulta con subconsultas
+        correlacionadas por documento.
+        """
+        item_model, document_field = item_relation(model)
+        items = item_model._base_manager.filter(**{document_field: OuterRef('pk')}).order_by().values(document_field)
+
+        def suma(expression):
+            return Coalesce(
+                Subquery(items.annotate(valor=Sum(expression, output_field=MONEY)).values('valor')),
+                Value(Decimal('0')), output_field=MONEY
+            )
+
+        queryset = model._base_manager.all()
+        if empresa_id:
+            queryset = queryset.filter(empresa_id=empresa_id)
+        return queryset.annotate(
+            subtotal_lineas=suma(item_model.subtotal_expression()),
+            iva_lineas=suma(item_model.iva_expression()),
+        ).annotate(
+            desvio_subtotal=Abs(F('subtotal') - F('subtotal_lineas')),
+            desvio_iva=Abs(F('iva') - F('iva_lineas')),
+            desvio_total=Abs(F('total') - F('subtotal') - F('iva')),
+        ).filter(
+            Q(desvio_subtotal__gt=TOLERANCIA) | Q(desvio_iva__gt=TOLERANCIA) | Q(desvio_total__gt=TOLERANCIA)
+        ).order_by('pk')
+
+    @staticmethod
+    def repair(model, empresa_id=None):
+        """Recalcula los documentos descuadrados. Retorna cuántos se han corregido"""
+        from tenants.utils import tenant_context
+
+        reparados = 0
+        for documento in DocumentTotalsService.drifted(model, empresa_id).select_related('empresa').iterator():
+            # Las líneas de compra se filtran por tenant: recalcular en nombre de su empresa
+            with tenant_context(documento.empresa):
+                documento.calculate_totals()
+            reparados += 1
+        return reparados
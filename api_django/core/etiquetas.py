@@ -0,0 +1,132 @@
+"""
+Etiquetas de contactos (clientes y proveedores).
+
+Cada etiqueta es una fila de Etiqueta por empresa (única por clave
+normalizada) y cada contacto se enlaza a ella en ClienteEtiqueta /
+ProveedorEtiqueta. Filtrar y contar por etiqueta son joins sobre el índice
+(etiqueta, contacto) de la tabla de enlace en lugar de LIKE sobre un texto.
+El texto separado por comas (`tags`) se mantiene en la API por
+compatibilidad y se traduce aquí.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from search.registry import search_registry
+from search.text import normalize
+from .models import Cliente, ClienteEtiqueta, Etiqueta, Proveedor, ProveedorEtiqueta
+
+NOMBRE_MAX_LENGTH = 100
+
+# Modelo de contacto -> (tabla de enlace, campo hacia el contacto)
+ETIQUETA_LINKS = {
+    Cliente: (ClienteEtiqueta, 'cliente'),
+    Proveedor: (ProveedorEtiqueta, 'proveedor'),
+}
+
+
+def clave_etiqueta(nombre):
+    """Utility function para obtener la clave normalizada de una etiqueta"""
+    return normalize(' '.join(nombre.split()))[:NOMBRE_MAX_LENGTH]
+
+
+def parse_tags(value):
+    """
+    Utility function para separar un texto "a, b, c" en etiquetas.
+    Retorna [(clave, nombre)] en el orden escrito, sin vacías ni repetidas.
+    """
+    etiquetas = {}
+    for nombre in (value or '').split(','):
+        nombre = ' '.join(nombre.split())[:NOMBRE_MAX_LENGTH]
+        if nombre:
+            etiquetas.setdefault(clave_etiqueta(nombre), nombre)
+    return list(etiquetas.items())
+
+
+def parse_filtro(values):
+    """Utility function para obtener las claves de ?etiqueta= (repetido o separado por comas)"""
+    claves = []
+    for value in values:
+        for clave, _ in parse_tags(value):
+            if clave not in claves:
+                claves.append(clave)
+    return claves
+
+
+class EtiquetaService:
+    """Escritura y consultas de etiquetas de contactos"""
+
+    @staticmethod
+    def set_tags(instance, value, reindex=True):
+        """
+        Sustituye las etiquetas del contacto por las del texto separado por
+        comas. Crea las etiquetas que no existan en la empresa del contacto.
+        """
+        link_model, field = ETIQUETA_LINKS[type(instance)]
+        etiquetas = parse_tags(value)
+
+        with transaction.atomic():
+            claves = [clave for clave, _ in etiquetas]
+            existentes = Etiqueta._base_manager.filter(empresa_id=instance.empresa_id, clave__in=claves)
+            ids = dict(existentes.values_list('clave', 'id'))
+            nuevas = [
+                Etiqueta(empresa_id=instance.empresa_id, clave=clave, nombre=nombre)
+                for clave, nombre in etiquetas if clave not in ids
+            ]
+            if nuevas:
+                # ignore_conflicts: otra transacción puede haberla creado a la vez
+                Etiqueta._base_manager.bulk_create(nuevas, ignore_conflicts=True)
+                ids = dict(existentes.values_list('clave', 'id'))
+
+            links = link_model._base_manager.filter(**{field: instance})
+            actuales = set(links.values_list('etiqueta_id', flat=True))
+            deseadas = [ids[clave] for clave in claves]
+            links.exclude(etiqueta_id__in=deseadas).delete()
+            link_model._base_manager.bulk_create([
+                link_model(**{field: instance, 'etiqueta_id': etiqueta_id})
+                for etiqueta_id in deseadas if etiqueta_id not in actuales
+            ])
+
+        getattr(instance, '_prefetched_objects_cache', {}).pop('etiqueta_links', None)
+        if reindex and search_registry.is_registered(type(instance)):
+            from search.services import SearchIndexService
+            SearchIndexService.index_instance(instance)
+
+    @staticmethod
+    def filtrar(queryset, claves):
+        """Contactos que tienen todas las etiquetas indicadas (por clave)"""
+        link_model, field = ETIQUETA_LINKS[queryset.model]
+        for clave in claves:
+            # Etiqueta.objects filtra por empresa: (empresa, clave) es único e indexado
+            queryset = queryset.filter(pk__in=link_model._base_manager.filter(
+                etiqueta__in=Etiqueta.objects.filter(clave=clave)
+            ).values(f'{field}_id'))
+        return queryset
+
+    @staticmethod
+    def facetas(queryset):
+        """
+        Recuento de contactos por etiqueta dentro del queryset:
+        [{'id', 'nombre', 'total'}] de mayor a menor.
+        """
+        link_model, field = ETIQUETA_LINKS[queryset.model]
+        rows = (
+            link_model._base_manager.filter(**{f'{field}__in': queryset.order_by().values('pk')})
+            .values('etiqueta_id', 'etiqueta__nombre')
+            .annotate(total=Count('id'))
+            .order_by('-total', 'etiqueta__nombre')
+        )
+        return [
+            {'id': row['etiqueta_id'], 'nombre': row['etiqueta__nombre'], 'total': row['total']}
+            for row in rows
+        ]
+
+    @staticmethod
+    def tags_por_contacto(model, ids):
+        """Texto de etiquetas de cada contacto: {id: 'a, b'} (una consulta)"""
+        link_model, field = ETIQUETA_LINKS[model]
+        tags = {}
+        for contacto_id, nombre in link_model._base_manager.filter(
+            **{f'{field}_id__in': ids}
+        ).order_by('id').values_list(f'{field}_id', 'etiqueta__nombre'):
+            tags.setdefault(contacto_id, []).append(nombre)
+        return {contacto_id: ', '.join(nombres) for contacto_id, nombres in tags.items()}
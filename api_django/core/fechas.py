@@ -0,0 +1,38 @@
+"""
+Filtros por rango de fechas sobre campos DateTimeField.
+
+fecha__date__gte/lte envuelve la columna en una función (DATE(CONVERT_TZ(...)))
+y obliga a recorrer todas las filas. rango_fechas traduce las fechas del
+usuario a un rango semiabierto de instantes [desde 00:00, hasta + 1 día 00:00)
+en la zona horaria actual, que compara la columna tal cual y usa sus índices.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+
+def parse_fecha(value, param='fecha'):
+    """Utility function para leer una fecha YYYY-MM-DD de un query param (400 si no es válida)"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValidationError({param: f"Fecha no válida: {value} (formato YYYY-MM-DD)"})
+
+
+def inicio_dia(fecha):
+    """Utility function para obtener el instante 00:00 de una fecha en la zona horaria actual"""
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def rango_fechas(campo, desde=None, hasta=None):
+    """
+    Utility function para filtrar un DateTimeField entre dos fechas, ambas
+    incluidas. Retorna los kwargs de filter() ({} sin fechas).
+    """
+    filtros = {}
+    if desde:
+        filtros[f'{campo}__gte'] = inicio_dia(parse_fecha(desde, 'fecha_desde'))
+    if hasta:
+        filtros[f'{campo}__lt'] = inicio_dia(parse_fecha(hasta, 'fecha_hasta') + timedelta(days=1))
+    return filtros
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.documentos import DOCUMENT_MODELS, DocumentTotalsService
+
+
+class Command(BaseCommand):
+    help = 'Comprueba que los totales de los documentos cuadran con sus líneas (pensado para cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID de empresa. Por defecto todas')
+        parser.add_argument('--modelo', action='append', help='app_label.Model (repetible). Por defecto todos')
+        parser.add_argument('--reparar', action='store_true', help='Recalcula los documentos descuadrados')
+
+    def handle(self, *args, **options):
+        modelos = [
+            label for label in DOCUMENT_MODELS
+            if not options['modelo'] or label.lower() in {m.lower() for m in options['modelo']}
+        ]
+        descuadrados = 0
+        for model in DocumentTotalsService.document_models(modelos):
+            label = model._meta.label_lower
+            if options['reparar']:
+                count = DocumentTotalsService.repair(model, empresa_id=options['empresa'])
+                self.stdout.write(f'{label}: {count} documentos reparados')
+            else:
+                ids = list(DocumentTotalsService.drifted(model, empresa_id=options['empresa']).values_list('pk', flat=True))
+                count = len(ids)
+                if ids:
+                    self.stdout.write(self.style.WARNING(f'{label}: {count} descuadrados (ids {ids[:20]})'))
+            descuadrados += count
+
+        if descuadrados and not options['reparar']:
+            self.stdout.write(self.style.WARNING(f'{descuadrados} documentos descuadrados. Ejecuta con --reparar'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Totales de documentos comprobados'))
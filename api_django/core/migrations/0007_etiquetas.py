@@ -0,0 +1,86 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userinvitation'),
+        ('core', '0006_serie'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Etiqueta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('clave', models.CharField(help_text='Nombre normalizado (minúsculas y sin acentos)', max_length=100, verbose_name='Clave')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('empresa', models.ForeignKey(help_text='Empresa a la que pertenece este registro', on_delete=django.db.models.deletion.CASCADE, to='accounts.empresa', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'Etiqueta',
+                'verbose_name_plural': 'Etiquetas',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClienteEtiqueta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='etiqueta_links', to='core.cliente')),
+                ('etiqueta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cliente_links', to='core.etiqueta')),
+            ],
+            options={
+                'verbose_name': 'Etiqueta de cliente',
+                'verbose_name_plural': 'Etiquetas de clientes',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='etiquetas',
+            field=models.ManyToManyField(blank=True, related_name='clientes', through='core.ClienteEtiqueta', to='core.etiqueta', verbose_name='Etiquetas'),
+        ),
+        migrations.CreateModel(
+            name='ProveedorEtiqueta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etiqueta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proveedor_links', to='core.etiqueta')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='etiqueta_links', to='core.proveedor')),
+            ],
+            options={
+                'verbose_name': 'Etiqueta de proveedor',
+                'verbose_name_plural': 'Etiquetas de proveedores',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='etiquetas',
+            field=models.ManyToManyField(blank=True, related_name='proveedores', through='core.ProveedorEtiqueta', to='core.etiqueta', verbose_name='Etiquetas'),
+        ),
+        migrations.AddConstraint(
+            model_name='etiqueta',
+            constraint=models.UniqueConstraint(fields=('empresa', 'clave'), name='unique_etiqueta_clave_empresa'),
+        ),
+        migrations.AddIndex(
+            model_name='clienteetiqueta',
+            index=models.Index(fields=['etiqueta', 'cliente'], name='core_clieti_etiq_cli_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='clienteetiqueta',
+            constraint=models.UniqueConstraint(fields=('cliente', 'etiqueta'), name='unique_cliente_etiqueta'),
+        ),
+        migrations.AddIndex(
+            model_name='proveedoretiqueta',
+            index=models.Index(fields=['etiqueta', 'proveedor'], name='core_proveti_etiq_prov_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='proveedoretiqueta',
+            constraint=models.UniqueConstraint(fields=('proveedor', 'etiqueta'), name='unique_proveedor_etiqueta'),
+        ),
+    ]
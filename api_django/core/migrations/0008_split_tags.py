@@ -0,0 +1,68 @@
+import unicodedata
+
+from django.db import migrations
+
+# Modelo -> (tabla de enlace, campo hacia el contacto)
+SOURCES = (
+    ('Cliente', 'ClienteEtiqueta', 'cliente'),
+    ('Proveedor', 'ProveedorEtiqueta', 'proveedor'),
+)
+
+
+def clave_etiqueta(nombre):
+    """Misma normalización que core.etiquetas.clave_etiqueta (minúsculas y sin acentos)"""
+    decomposed = unicodedata.normalize('NFKD', ' '.join(nombre.split()))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()[:100]
+
+
+def split_tags(apps, schema_editor):
+    """Pasa el texto `tags` de cada contacto a Etiqueta + tabla de enlace"""
+    Etiqueta = apps.get_model('core', 'Etiqueta')
+    etiquetas = {}
+
+    for model_name, link_name, field in SOURCES:
+        model = apps.get_model('core', model_name)
+        link_model = apps.get_model('core', link_name)
+        links = []
+        contactos = model._base_manager.exclude(tags__isnull=True).exclude(tags='')
+        for contacto_id, empresa_id, tags in contactos.values_list('id', 'empresa_id', 'tags').iterator():
+            claves = []
+            for nombre in tags.split(','):
+                nombre = ' '.join(nombre.split())[:100]
+                clave = clave_etiqueta(nombre) if nombre else ''
+                if not clave or clave in claves:
+                    continue
+                claves.append(clave)
+                if (empresa_id, clave) not in etiquetas:
+                    etiquetas[(empresa_id, clave)] = Etiqueta._base_manager.create(
+                        empresa_id=empresa_id, clave=clave, nombre=nombre
+                    ).pk
+                links.append(link_model(**{
+                    f'{field}_id': contacto_id, 'etiqueta_id': etiquetas[(empresa_id, clave)]
+                }))
+        link_model._base_manager.bulk_create(links, batch_size=1000)
+
+
+def join_tags(apps, schema_editor):
+    """Reconstruye el texto `tags` desde las tablas de enlace"""
+    for model_name, link_name, field in SOURCES:
+        model = apps.get_model('core', model_name)
+        link_model = apps.get_model('core', link_name)
+        tags = {}
+        for contacto_id, nombre in link_model._base_manager.order_by('id').values_list(
+            f'{field}_id', 'etiqueta__nombre'
+        ).iterator():
+            tags.setdefault(contacto_id, []).append(nombre)
+        for contacto_id, nombres in tags.items():
+            model._base_manager.filter(pk=contacto_id).update(tags=', '.join(nombres)[:500])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_etiquetas'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_tags, join_tags),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_split_tags'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='cliente',
+            name='tags',
+        ),
+        migrations.RemoveField(
+            model_name='proveedor',
+            name='tags',
+        ),
+    ]
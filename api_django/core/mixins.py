@@ -1,6 +1,11 @@
+from django.conf import settings
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+
+from .documentos import DocumentWriteService
+from .export import EXPORT_FORMATS, export_response
 
 
 class ReadOnlyIfInvoicedMixin:
@@ -93,3 +98,111 @@ class DocumentConversionMixin:
             'message': f'{documento.__class__.__name__} convertido a factura exitosamente',
             'factura_id': factura.id
         }, status=status.HTTP_201_CREATED)
+
+
+class StreamingExportMixin:
+    """
+    Mixin que añade ?format=csv y ?format=ndjson al listado.
+    
+    Exporta todas las filas del listado (mismos filtros, búsqueda y orden,
+    sin paginar) en streaming; ver core.export. El ViewSet declara las
+    columnas en `export_fields` como lookups de values_list.
+    """
+    export_fields = ()
+    export_filename = None
+    
+    def get_export_format(self):
+        if self.action != 'list':
+            return None
+        export_format = self.request.query_params.get('format')
+        return export_format if export_format in EXPORT_FORMATS else None
+    
+    def perform_content_negotiation(self, request, force=False):
+        """?format=csv/ndjson no es un renderer de DRF: los errores se devuelven en JSON"""
+        if request.query_params.get('format') in EXPORT_FORMATS:
+            renderer = JSONRenderer()
+            return (renderer, renderer.media_type)
+        return super().perform_content_negotiation(request, force)
+    
+    def list(self, request, *args, **kwargs):
+        export_format = self.get_export_format()
+        if export_format is None:
+            return super().list(request, *args, **kwargs)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        filename = self.export_filename or queryset.model._meta.model_name
+        return export_response(queryset, self.export_fields, export_format, filename)
+
+
+class BulkDocumentCreateMixin:
+    """
+    Mixin que añade POST .../bulk/ para crear muchos documentos por llamada
+    (p.ej. importar histórico).
+    
+    Cabeceras y líneas se insertan con bulk_create y los totales se calculan
+    en memoria (core.documentos). Pensado para datos históricos: no se
+    descuenta stock ni se audita cada documento; se registra un evento de
+    negocio con la importación. El ViewSet declara `bulk_item_model` y
+    `bulk_document_field` (campo de la línea hacia el documento).
+    """
+    bulk_item_model = None
+    bulk_document_field = None
+    
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Crea en bloque los documentos de {'documentos': [...]} (o de una lista)"""
+        from audit.services import AuditService
+        from .serializers import BulkDocumentSerializer
+        
+        data = request.data.get('documentos') if isinstance(request.data, dict) else request.data
+        if not isinstance(data, list) or not data:
+            return Response(
+                {'error': 'Se esperaba una lista de documentos en "documentos"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(data) > settings.BULK_DOCUMENTS_MAX:
+            return Response(
+                {'error': f'Máximo {settings.BULK_DOCUMENTS_MAX} documentos por llamada'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = BulkDocumentSerializer(data=data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        model = self.get_queryset().model
+        documentos = serializer.validated_data
+        errors = DocumentWriteService.check_bulk_references(model, self.bulk_item_model, documentos)
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        empresa_id = request.user.empresa_id
+        creados = DocumentWriteService.bulk_create_documents(model, self.bulk_item_model, self.bulk_document_field, [
+            (
+                {
+                    'empresa_id': empresa_id, 'numero': doc['numero'], 'cliente_id': doc['cliente'],
+                    'serie_id': doc.get('serie'), 'fecha': doc['fecha'],
+                    'observaciones': doc.get('observaciones'),
+                },
+                [
+                    {
+                        'articulo_id': item['articulo'], 'cantidad': item['cantidad'],
+                        'precio_unitario': item['precio_unitario'], 'iva_porcentaje': item['iva_porcentaje'],
+                    }
+                    for item in doc['items']
+                ],
+            )
+            for doc in documentos
+        ])
+        
+        AuditService.log_business_event(
+            'SALE_CREATED',
+            f'Importación en bloque de {len(creados)} {model._meta.verbose_name_plural}',
+            user=request.user,
+            data={'modelo': model._meta.label_lower, 'documentos': len(creados)},
+            amount=sum(documento.total for documento in creados),
+        )
+        return Response(
+            {'creados': len(creados), 'ids': [documento.pk for documento in creados]},
+            status=status.HTTP_201_CREATED
+        )
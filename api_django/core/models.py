@@ -1,9 +1,40 @@
 from django.db import models
+from django.db.models import F, Value
 from decimal import Decimal
+from .documentos import aggregate_totals
 from tenants.models import TenantModelMixin
 
 
-class Cliente(TenantModelMixin, models.Model):
+class EtiquetasMixin:
+    """
+    Compatibilidad con el antiguo campo `tags` (texto separado por comas).
+
+    Las etiquetas se guardan normalizadas en Etiqueta y en la tabla de enlace
+    del modelo (related_name 'etiqueta_links'). `tags` las devuelve unidas por
+    comas y, al asignarlo (también como kwarg de create), se aplican tras el
+    save con la señal de core.signals.
+    """
+
+    @property
+    def tags(self):
+        if hasattr(self, '_tags_pendientes'):
+            return self._tags_pendientes
+        if self.pk is None:
+            return None
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'etiqueta_links' in prefetched:
+            links = prefetched['etiqueta_links']
+        else:
+            links = self.etiqueta_links.select_related('etiqueta')
+        nombres = [link.etiqueta.nombre for link in links]
+        return ', '.join(nombres) if nombres else None
+
+    @tags.setter
+    def tags(self, value):
+        self._tags_pendientes = value
+
+
+class Cliente(EtiquetasMixin, TenantModelMixin, models.Model):
     """Modelo Cliente - común a varias apps"""
     # Datos básicos
     nombre = models.CharField(max_length=200, verbose_name="Nombre")
@@ -28,7 +59,10 @@ class Cliente(TenantModelMixin, models.Model):
     identificacion_vat = models.CharField(max_length=20, verbose_name="Identificación VAT", blank=True, null=True)
     
     # Metadatos
-    tags = models.CharField(max_length=500, verbose_name="Tags", blank=True, null=True, help_text="Separar por comas")
+    etiquetas = models.ManyToManyField(
+        'core.Etiqueta', through='core.ClienteEtiqueta', related_name='clientes',
+        blank=True, verbose_name="Etiquetas"
+    )
     activo = models.BooleanField(default=True, verbose_name="Activo")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -43,7 +77,7 @@ class Cliente(TenantModelMixin, models.Model):
         return self.nombre
 
 
-class Proveedor(TenantModelMixin, models.Model):
+class Proveedor(EtiquetasMixin, TenantModelMixin, models.Model):
     """Modelo para proveedores de la empresa"""
     # Datos básicos
     nombre = models.CharField(max_length=200, verbose_name="Nombre")
@@ -68,7 +102,10 @@ class Proveedor(TenantModelMixin, models.Model):
     identificacion_vat = models.CharField(max_length=20, verbose_name="Identificación VAT", blank=True, null=True)
     
     # Metadatos
-    tags = models.CharField(max_length=500, verbose_name="Tags", blank=True, null=True, help_text="Separar por comas")
+    etiquetas = models.ManyToManyField(
+        'core.Etiqueta', through='core.ProveedorEtiqueta', related_name='proveedores',
+        blank=True, verbose_name="Etiquetas"
+    )
     activo = models.BooleanField(default=True, verbose_name="Activo")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -89,6 +126,62 @@ class Proveedor(TenantModelMixin, models.Model):
         return self.nombre
 
 
+class Etiqueta(TenantModelMixin, models.Model):
+    """Etiqueta de contactos (clientes y proveedores), única por empresa"""
+    nombre = models.CharField(max_length=100, verbose_name="Nombre")
+    clave = models.CharField(
+        max_length=100, verbose_name="Clave",
+        help_text="Nombre normalizado (minúsculas y sin acentos)"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['nombre']
+        verbose_name = "Etiqueta"
+        verbose_name_plural = "Etiquetas"
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'clave'], name='unique_etiqueta_clave_empresa')
+        ]
+
+    def __str__(self):
+        return self.nombre
+
+
+class ClienteEtiqueta(models.Model):
+    """Enlace cliente-etiqueta"""
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='etiqueta_links')
+    etiqueta = models.ForeignKey(Etiqueta, on_delete=models.CASCADE, related_name='cliente_links')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Etiqueta de cliente"
+        verbose_name_plural = "Etiquetas de clientes"
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'etiqueta'], name='unique_cliente_etiqueta')
+        ]
+        indexes = [
+            # Filtro y recuento por etiqueta: (etiqueta) -> clientes
+            models.Index(fields=['etiqueta', 'cliente'], name='core_clieti_etiq_cli_idx'),
+        ]
+
+
+class ProveedorEtiqueta(models.Model):
+    """Enlace proveedor-etiqueta"""
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, related_name='etiqueta_links')
+    etiqueta = models.ForeignKey(Etiqueta, on_delete=models.CASCADE, related_name='proveedor_links')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Etiqueta de proveedor"
+        verbose_name_plural = "Etiquetas de proveedores"
+        constraints = [
+            models.UniqueConstraint(fields=['proveedor', 'etiqueta'], name='unique_proveedor_etiqueta')
+        ]
+        indexes = [
+            models.Index(fields=['etiqueta', 'proveedor'], name='core_proveti_etiq_prov_idx'),
+        ]
+
+
 class Serie(TenantModelMixin, models.Model):
     """Serie de numeración asociada a un almacén para documentos de venta"""
     
@@ -141,11 +234,8 @@ class AbstractBaseDocument(TenantModelMixin, models.Model):
         ordering = ['-fecha', '-id']
     
     def calculate_totals(self):
-        """Calcula totales basándose en los items relacionados"""
-        items = self.get_items()
-        self.subtotal = sum(item.subtotal for item in items)
-        self.iva = sum(item.iva_amount for item in items) 
-        self.total = self.subtotal + self.iva
+        """Calcula totales con un único agregado SQL sobre los items y los guarda con un UPDATE"""
+        self.subtotal, self.iva, self.total = aggregate_totals(self.get_items())
         self.save(update_fields=['subtotal', 'iva', 'total'])
     
     def get_items(self):
@@ -163,6 +253,16 @@ class AbstractBaseItem(models.Model):
     class Meta:
         abstract = True
     
+    @classmethod
+    def subtotal_expression(cls):
+        """Subtotal de la línea como expresión SQL (equivale a la propiedad subtotal)"""
+        return F('cantidad') * F('precio_unitario')
+    
+    @classmethod
+    def iva_expression(cls):
+        """IVA de la línea como expresión SQL (equivale a la propiedad iva_amount)"""
+        return cls.subtotal_expression() * F('iva_porcentaje') * Value(Decimal('0.01'))
+    
     @property
     def subtotal(self):
         """Calcula el subtotal (sin IVA)"""
@@ -0,0 +1,137 @@
+"""
+Motor de reportes de ventas.
+
+Calcula número de documentos e importes de todos los tipos de documento de
+venta (presupuestos, pedidos, albaranes, tickets y facturas) en una sola
+consulta UNION ALL, con desglose opcional por periodo (día, semana, mes),
+serie y cliente.
+"""
+from decimal import Decimal
+
+from django.db.models import CharField, Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncWeek
+
+# Tipo de documento -> clave del resumen
+DOCUMENT_TYPES = (
+    ('presupuesto', 'presupuestos'),
+    ('pedido', 'pedidos'),
+    ('albaran', 'albaranes'),
+    ('ticket', 'tickets'),
+    ('factura', 'facturas'),
+)
+
+PERIODS = {
+    'dia': TruncDay,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+}
+
+# Dimensión -> columnas que aporta al desglose
+DIMENSIONS = {
+    'serie': ('serie_id', 'serie__nombre'),
+    'cliente': ('cliente_id', 'cliente__nombre'),
+}
+
+
+def _document_models():
+    from sales.models import Presupuesto, Pedido, Albaran, Ticket, Factura
+    return {
+        'presupuesto': Presupuesto,
+        'pedido': Pedido,
+        'albaran': Albaran,
+        'ticket': Ticket,
+        'factura': Factura,
+    }
+
+
+def parse_group_by(value):
+    """
+    Valida el parámetro agrupar_por (p.ej. "mes,serie").
+    Retorna (periodo, dimensiones) o lanza ValueError.
+    """
+    periodo = None
+    dimensiones = []
+    for part in filter(None, (p.strip() for p in (value or '').split(','))):
+        if part in PERIODS:
+            if periodo:
+                raise ValueError("Solo se puede agrupar por un periodo (dia, semana o mes)")
+            periodo = part
+        elif part in DIMENSIONS:
+            if part not in dimensiones:
+                dimensiones.append(part)
+        else:
+            raise ValueError(
+                f"Agrupación no válida: {part}. Opciones: dia, semana, mes, serie, cliente"
+            )
+    return periodo, dimensiones
+
+
+class SalesSummaryReport:
+    """Resumen de ventas por tipo de documento en un único round trip"""
+
+    def __init__(self, fecha_inicio=None, fecha_fin=None, periodo=None, dimensiones=()):
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.periodo = periodo
+        self.dimensiones = tuple(dimensiones)
+
+    def _document_queryset(self, tipo, model):
+        queryset = model.objects.order_by()
+        if self.fecha_inicio:
+            queryset = queryset.filter(fecha__gte=self.fecha_inicio)
+        if self.fecha_fin:
+            queryset = queryset.filter(fecha__lte=self.fecha_fin)
+
+        annotations = {'tipo': Value(tipo, output_field=CharField())}
+        group_fields = ['tipo']
+        if self.periodo:
+            annotations['periodo'] = PERIODS[self.periodo]('fecha')
+            group_fields.append('periodo')
+        for dimension in self.dimensiones:
+            group_fields.extend(DIMENSIONS[dimension])
+
+        return queryset.annotate(**annotations).values(*group_fields).annotate(
+            count=Count('id'),
+            total=Coalesce(
+                Sum('total'),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=15, decimal_places=2)
+            ),
+        )
+
+    def queryset(self):
+        """UNION ALL de los agregados de cada tipo de documento"""
+        querysets = [
+            self._document_queryset(tipo, model)
+            for tipo, model in _document_models().items()
+        ]
+        return querysets[0].union(*querysets[1:], all=True)
+
+    def rows(self):
+        """Filas del desglose (una por tipo y grupo), ordenadas"""
+        rows = list(self.queryset())
+        for row in rows:
+            row['total'] = Decimal(row['total'] or 0).quantize(Decimal('0.01'))
+
+        def sort_key(row):
+            periodo = row.get('periodo')
+            return (
+                periodo is None, periodo or '',
+                *(str(row.get(DIMENSIONS[d][1]) or '') for d in self.dimensiones),
+                row['tipo'],
+            )
+        return sorted(rows, key=sort_key)
+
+    def summary(self, rows=None):
+        """Totales por tipo de documento (a partir de las filas del desglose)"""
+        rows = self.rows() if rows is None else rows
+        resumen = {
+            key: {'count': 0, 'total': Decimal('0.00')}
+            for _, key in DOCUMENT_TYPES
+        }
+        keys = dict(DOCUMENT_TYPES)
+        for row in rows:
+            entry = resumen[keys[row['tipo']]]
+            entry['count'] += row['count']
+            entry['total'] += row['total']
+        return resumen
@@ -1,11 +1,11 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Count
 from django.utils import timezone
 from datetime import datetime, timedelta
-from sales.models import Presupuesto, Pedido, Albaran, Ticket, Factura
-from products.models import Articulo
+from inventory.models import ArticuloStock
+from reporting.services import RANKINGS_PRODUCTO, SalesFactService
+from .report_engine import SalesSummaryReport, parse_group_by
 
 
 class ReportsViewSet(viewsets.ViewSet):
@@ -13,168 +13,116 @@ class ReportsViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def ventas_resumen(self, request):
-        """Resumen de ventas por tipo de documento"""
+        """
+        Resumen de ventas por tipo de documento.
+        
+        Todos los tipos se calculan en una única consulta (UNION ALL). Con
+        ?agrupar_por=mes,serie,cliente (periodo: dia, semana o mes) se añade
+        el desglose por periodo, serie y/o cliente.
+        """
         # Obtener parámetros de fecha
         fecha_inicio = request.query_params.get('fecha_inicio')
         fecha_fin = request.query_params.get('fecha_fin')
         
-        # Filtros de fecha opcionales
-        filters = {}
-        if fecha_inicio:
-            filters['fecha__gte'] = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-        if fecha_fin:
-            filters['fecha__lte'] = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-        
-        # Estadísticas por tipo de documento
-        presupuestos_stats = Presupuesto.objects.filter(**filters).aggregate(
-            count=Count('id'),
-            total=Sum('total') or 0
-        )
-        
-        pedidos_stats = Pedido.objects.filter(**filters).aggregate(
-            count=Count('id'),
-            total=Sum('total') or 0
-        )
-        
-        albaranes_stats = Albaran.objects.filter(**filters).aggregate(
-            count=Count('id'),
-            total=Sum('total') or 0
-        )
-        
-        tickets_stats = Ticket.objects.filter(**filters).aggregate(
-            count=Count('id'),
-            total=Sum('total') or 0
-        )
+        try:
+            periodo, dimensiones = parse_group_by(request.query_params.get('agrupar_por'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        facturas_stats = Factura.objects.filter(**filters).aggregate(
-            count=Count('id'),
-            total=Sum('total') or 0
+        report = SalesSummaryReport(
+            fecha_inicio=datetime.strptime(fecha_inicio, '%Y-%m-%d').date() if fecha_inicio else None,
+            fecha_fin=datetime.strptime(fecha_fin, '%Y-%m-%d').date() if fecha_fin else None,
+            periodo=periodo,
+            dimensiones=dimensiones
         )
+        rows = report.rows()
         
-        return Response({
+        data = {
             'periodo': {
                 'fecha_inicio': fecha_inicio,
                 'fecha_fin': fecha_fin
             },
-            'resumen': {
-                'presupuestos': presupuestos_stats,
-                'pedidos': pedidos_stats,
-                'albaranes': albaranes_stats,
-                'tickets': tickets_stats,
-                'facturas': facturas_stats
-            }
-        })
+            'resumen': report.summary(rows)
+        }
+        if periodo or dimensiones:
+            data['agrupar_por'] = [d for d in [periodo, *dimensiones] if d]
+            data['desglose'] = rows
+        
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def productos_mas_vendidos(self, request):
-        """Top de productos más vendidos"""
-        from django.db.models import F
-        from sales.models import PedidoItem, TicketItem, AlbaranItem
+        """
+        Top de productos más vendidos (desde la tabla de hechos de ventas).
         
+        ?ordenar_por=cantidad (por defecto) o importe. Solo se leen de la BD
+        los `limit` primeros y los importes se devuelven como Decimal exacto.
+        """
         # Parámetros
-        limit = int(request.query_params.get('limit', 10))
         fecha_inicio = request.query_params.get('fecha_inicio')
         fecha_fin = request.query_params.get('fecha_fin')
-        
-        # Filtros de fecha para documentos padre
-        fecha_filters = {}
-        if fecha_inicio:
-            fecha_filters['fecha__gte'] = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-        if fecha_fin:
-            fecha_filters['fecha__lte'] = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-        
-        # Unir datos de todos los tipos de documentos
-        items_data = []
-        
-        # Items de pedidos
-        pedido_filters = {'pedido__' + k: v for k, v in fecha_filters.items()}
-        pedido_items = PedidoItem.objects.filter(**pedido_filters).values(
-            'articulo__id', 'articulo__nombre'
-        ).annotate(
-            total_cantidad=Sum('cantidad'),
-            total_importe=Sum(F('cantidad') * F('precio_unitario'))
-        )
-        
-        # Items de tickets
-        ticket_filters = {'ticket__' + k: v for k, v in fecha_filters.items()}
-        ticket_items = TicketItem.objects.filter(**ticket_filters).values(
-            'articulo__id', 'articulo__nombre'
-        ).annotate(
-            total_cantidad=Sum('cantidad'),
-            total_importe=Sum(F('cantidad') * F('precio_unitario'))
-        )
-        
-        # Items de albaranes
-        albaran_filters = {'albaran__' + k: v for k, v in fecha_filters.items()}
-        albaran_items = AlbaranItem.objects.filter(**albaran_filters).values(
-            'articulo__id', 'articulo__nombre'
-        ).annotate(
-            total_cantidad=Sum('cantidad'),
-            total_importe=Sum(F('cantidad') * F('precio_unitario'))
+        ordenar_por = request.query_params.get('ordenar_por', 'cantidad')
+        
+        if ordenar_por not in RANKINGS_PRODUCTO:
+            return Response(
+                {'error': f"ordenar_por no válido: {ordenar_por}. Opciones: {', '.join(RANKINGS_PRODUCTO)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'error': 'limit debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        productos_top = SalesFactService.productos_mas_vendidos(
+            fecha_inicio=datetime.strptime(fecha_inicio, '%Y-%m-%d').date() if fecha_inicio else None,
+            fecha_fin=datetime.strptime(fecha_fin, '%Y-%m-%d').date() if fecha_fin else None,
+            limit=max(limit, 0),
+            ordenar_por=ordenar_por
         )
         
-        # Combinar y agrupar por artículo
-        productos_dict = {}
-        for items_queryset in [pedido_items, ticket_items, albaran_items]:
-            for item in items_queryset:
-                articulo_id = item['articulo__id']
-                if articulo_id not in productos_dict:
-                    productos_dict[articulo_id] = {
-                        'articulo_id': articulo_id,
-                        'articulo_nombre': item['articulo__nombre'],
-                        'total_cantidad': 0,
-                        'total_importe': 0
-                    }
-                productos_dict[articulo_id]['total_cantidad'] += item['total_cantidad'] or 0
-                productos_dict[articulo_id]['total_importe'] += float(item['total_importe'] or 0)
-        
-        # Ordenar por cantidad y limitar
-        productos_top = sorted(
-            productos_dict.values(),
-            key=lambda x: x['total_cantidad'],
-            reverse=True
-        )[:limit]
-        
         return Response({
             'periodo': {
                 'fecha_inicio': fecha_inicio,
                 'fecha_fin': fecha_fin
             },
-            'productos_mas_vendidos': productos_top
+            'ordenar_por': ordenar_por,
+            'productos_mas_vendidos': list(productos_top)
         })
     
     @action(detail=False, methods=['get'])
     def stock_bajo(self, request):
-        """Productos con stock bajo"""
-        limite_stock = int(request.query_params.get('limite', 10))
-        
-        productos_stock_bajo = Articulo.objects.filter(
-            stock__lte=limite_stock
-        ).order_by('stock').values(
-            'id', 'nombre', 'stock', 'categoria__nombre', 'marca__nombre'
-        )
+        """
+        Productos con stock bajo: stock por almacén en o por debajo de su
+        mínimo, de más a menos urgente. Se lee del índice de alertas
+        (ArticuloStock.urgencia); ?limit= filas como máximo (100 por defecto).
+        """
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response({'error': 'limit debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        alertas = ArticuloStock.objects.filter(urgencia__isnull=False)
+        etiquetas = dict(ArticuloStock.URGENCIA_CHOICES)
+        productos_stock_bajo = [
+            {**row, 'urgencia': etiquetas[row['urgencia']]}
+            for row in alertas.order_by('urgencia', 'id').values(
+                'urgencia', 'articulo_id', 'articulo__nombre', 'stock_actual', 'stock_minimo',
+                'almacen__nombre', 'articulo__categoria__nombre', 'articulo__marca__nombre'
+            )[:max(limit, 0)]
+        ]
         
         return Response({
-            'limite_stock': limite_stock,
-            'productos_stock_bajo': list(productos_stock_bajo)
+            'total': alertas.count(),
+            'productos_stock_bajo': productos_stock_bajo
         })
     
     @action(detail=False, methods=['get'])
     def facturacion_mensual(self, request):
-        """Facturación mensual del último año"""
-        from django.db.models.functions import TruncMonth
-        
+        """Facturación mensual del último año (desde la tabla de hechos de ventas)"""
         # Último año
         fecha_limite = timezone.now().date() - timedelta(days=365)
         
-        facturacion_mensual = Factura.objects.filter(
-            fecha__gte=fecha_limite
-        ).annotate(
-            mes=TruncMonth('fecha')
-        ).values('mes').annotate(
-            total_facturas=Count('id'),
-            total_importe=Sum('total')
-        ).order_by('mes')
+        facturacion_mensual = SalesFactService.facturacion_mensual(fecha_limite)
         
         return Response({
             'periodo': f'Últimos 12 meses desde {fecha_limite}',
@@ -1,5 +1,8 @@
+from decimal import Decimal
+from django.db import transaction
 from rest_framework import serializers
-from .models import Cliente, Proveedor, Serie
+from .documentos import DocumentWriteService
+from .models import Cliente, Etiqueta, Proveedor, Serie
 
 
 class BaseDocumentSerializer(serializers.ModelSerializer):
@@ -14,37 +17,27 @@ class BaseDocumentSerializer(serializers.ModelSerializer):
         return []
     
     def create(self, validated_data):
-        """Crea un documento con sus items"""
+        """Crea un documento con sus items (en bloque, con un único cálculo de totales)"""
         items_data = validated_data.pop('items', [])
-        documento = super().create(validated_data)
-        
-        # Crear items
-        item_model = self.get_item_model()
-        for item_data in items_data:
-            item_data[self.get_document_field_name()] = documento
-            item_model.objects.create(**item_data)
-        
-        # Calcular totales
-        documento.calculate_totals()
+        with transaction.atomic():
+            documento = super().create(validated_data)
+            DocumentWriteService.set_items(
+                documento, self.get_item_model(), self.get_document_field_name(), items_data
+            )
         return documento
     
     def update(self, instance, validated_data):
         """Actualiza un documento y sus items"""
         items_data = validated_data.pop('items', None)
-        instance = super().update(instance, validated_data)
-        
-        if items_data is not None:
-            # Eliminar items existentes
-            instance.get_items().delete()
-            
-            # Crear nuevos items
-            item_model = self.get_item_model()
-            for item_data in items_data:
-                item_data[self.get_document_field_name()] = instance
-                item_model.objects.create(**item_data)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
             
-            # Recalcular totales
-            instance.calculate_totals()
+            if items_data is not None:
+                # Sustituye los items y recalcula los totales una sola vez
+                DocumentWriteService.set_items(
+                    instance, self.get_item_model(), self.get_document_field_name(),
+                    items_data, replace=True
+                )
         
         return instance
     
@@ -67,18 +60,53 @@ class BaseItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'articulo', 'cantidad', 'precio_unitario', 'iva_porcentaje', 'subtotal', 'iva_amount', 'total']
 
 
+class EtiquetaSerializer(serializers.ModelSerializer):
+    """Serializer para Etiqueta"""
+    class Meta:
+        model = Etiqueta
+        fields = ['id', 'nombre']
+
+
+class BulkItemSerializer(serializers.Serializer):
+    """Línea de documento para la creación en bloque (artículo por id)"""
+    articulo = serializers.IntegerField(min_value=1)
+    cantidad = serializers.IntegerField(min_value=1)
+    precio_unitario = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'))
+    iva_porcentaje = serializers.DecimalField(max_digits=5, decimal_places=2, default=Decimal('21.00'))
+
+
+class BulkDocumentSerializer(serializers.Serializer):
+    """
+    Documento para la creación en bloque. Las referencias van como ids y se
+    comprueban todas juntas (DocumentWriteService.check_bulk_references) en
+    lugar de con una consulta por campo y documento.
+    """
+    numero = serializers.CharField(max_length=20)
+    cliente = serializers.IntegerField(min_value=1)
+    serie = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    fecha = serializers.DateField()
+    observaciones = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    items = BulkItemSerializer(many=True, allow_empty=False)
+
+
 class ClienteSerializer(serializers.ModelSerializer):
     """Serializer para Cliente"""
+    # Etiquetas como texto separado por comas (compatibilidad con el antiguo campo)
+    tags = serializers.CharField(max_length=500, required=False, allow_blank=True, allow_null=True)
+    
     class Meta:
         model = Cliente
-        fields = '__all__'
+        exclude = ['etiquetas']
 
 
 class ProveedorSerializer(serializers.ModelSerializer):
     """Serializer para Proveedor"""
+    # Etiquetas como texto separado por comas (compatibilidad con el antiguo campo)
+    tags = serializers.CharField(max_length=500, required=False, allow_blank=True, allow_null=True)
+    
     class Meta:
         model = Proveedor
-        fields = '__all__'
+        exclude = ['etiquetas']
 
 
 class SerieSerializer(serializers.ModelSerializer):
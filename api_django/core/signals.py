@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save
+
+from .etiquetas import ETIQUETA_LINKS, EtiquetaService
+
+
+def apply_pending_tags(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Guarda las etiquetas asignadas con `tags` (texto separado por comas)"""
+    if raw or not hasattr(instance, '_tags_pendientes'):
+        return
+    value = instance.__dict__.pop('_tags_pendientes')
+    # En un save completo el índice de búsqueda se actualiza con su propia señal
+    EtiquetaService.set_tags(instance, value, reindex=update_fields is not None)
+
+
+for model in ETIQUETA_LINKS:
+    post_save.connect(apply_pending_tags, sender=model, dispatch_uid=f'core_tags_{model._meta.model_name}')
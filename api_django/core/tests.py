@@ -7,7 +7,7 @@ from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
 from rest_framework.test import APIClient
 from rest_framework import status
-from core.models import Cliente, Proveedor, Serie, AbstractBaseDocument, AbstractBaseItem
+from core.models import Cliente, Etiqueta, Proveedor, Serie, AbstractBaseDocument, AbstractBaseItem
 
 
 @pytest.mark.django_db
@@ -474,6 +474,140 @@ class TestProveedorAPI:
             ]
 
 
+@pytest.mark.django_db
+@pytest.mark.api
+class TestContactosAPI:
+    """Tests del listado combinado de contactos (UNION en BD)"""
+    
+    @pytest.fixture
+    def contactos(self, empresa):
+        for nombre in ("beta", "Delta", "alfa"):
+            Cliente.objects.create(nombre=nombre, empresa=empresa, cif=f"C-{nombre}")
+        for nombre in ("Alfa", "charlie"):
+            Proveedor.objects.create(nombre=nombre, empresa=empresa, cif_nif=f"P-{nombre}")
+    
+    def test_orden_y_campos(self, authenticated_client, contactos):
+        """Clientes y proveedores se ordenan juntos por (lower(nombre), tipo, id)"""
+        response = authenticated_client.get("/api/core/contactos/")
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 5
+        assert [(c['nombre'], c['tipo']) for c in response.data['results']] == [
+            ("alfa", "cliente"), ("Alfa", "proveedor"), ("beta", "cliente"),
+            ("charlie", "proveedor"), ("Delta", "cliente"),
+        ]
+        assert response.data['results'][1]['cif_nif'] == "P-Alfa"
+    
+    def test_pagina_en_sql(self, authenticated_client, contactos):
+        """La página sale de una UNION con LIMIT/OFFSET, no de cargar todo"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get("/api/core/contactos/", {'page': 2, 'page_size': 2})
+        union_queries = [q['sql'] for q in queries if 'UNION' in q['sql']]
+        
+        assert [c['nombre'] for c in response.data['results']] == ["beta", "charlie"]
+        assert len(union_queries) == 2  # count + página
+        assert any('LIMIT 2 OFFSET 2' in sql for sql in union_queries)
+    
+    def test_paginacion_por_cursor(self, authenticated_client, contactos):
+        """El cursor recorre todos los contactos sin repetir ni saltar ninguno"""
+        vistos = []
+        response = authenticated_client.get("/api/core/contactos/", {'paginacion': 'cursor', 'page_size': 2})
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            vistos.extend((c['nombre'], c['tipo']) for c in response.data['results'])
+            if not response.data['next']:
+                break
+            response = authenticated_client.get(response.data['next'])
+        
+        assert vistos == [
+            ("alfa", "cliente"), ("Alfa", "proveedor"), ("beta", "cliente"),
+            ("charlie", "proveedor"), ("Delta", "cliente"),
+        ]
+    
+    def test_filtros_y_cursor_invalido(self, authenticated_client, contactos):
+        """search filtra ambas tablas y un cursor mal formado devuelve 400"""
+        response = authenticated_client.get("/api/core/contactos/", {'search': 'alfa'})
+        assert [c['tipo'] for c in response.data['results']] == ["cliente", "proveedor"]
+        
+        response = authenticated_client.get("/api/core/contactos/", {'cursor': 'no-es-un-cursor'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestEtiquetasContactos:
+    """Etiquetas normalizadas (Etiqueta + tablas de enlace)"""
+    
+    def test_tags_por_api_compatibles(self, authenticated_client, empresa):
+        """`tags` se sigue leyendo y escribiendo como texto separado por comas"""
+        response = authenticated_client.post("/api/core/clientes/", {
+            'nombre': "Cliente Etiquetado", 'tags': "VIP, Madrid, vip", 'empresa': empresa.id
+        }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['tags'] == "VIP, Madrid"
+        
+        url = f"/api/core/clientes/{response.data['id']}/"
+        response = authenticated_client.patch(url, {'tags': "madrid, Mayorista"}, format='json')
+        assert response.data['tags'] == "Madrid, Mayorista"
+        
+        # Una etiqueta por empresa y clave (sin mayúsculas ni acentos)
+        assert sorted(Etiqueta._base_manager.filter(empresa=empresa).values_list('clave', flat=True)) == ["madrid", "mayorista", "vip"]
+    
+    def test_filtro_exacto_por_etiqueta(self, authenticated_client, empresa):
+        """?etiqueta= exige todas las etiquetas y no da falsos positivos como icontains"""
+        Cliente.objects.create(nombre="Uno", tags="vip, madrid", empresa=empresa)
+        Cliente.objects.create(nombre="Dos", tags="vipx, madrid", empresa=empresa)
+        Cliente.objects.create(nombre="Tres", tags="vip", empresa=empresa)
+        
+        response = authenticated_client.get("/api/core/clientes/", {'etiqueta': "VIP"})
+        assert [c['nombre'] for c in response.data['results']] == ["Tres", "Uno"]
+        
+        response = authenticated_client.get("/api/core/clientes/", {'etiqueta': "vip,madrid"})
+        assert [c['nombre'] for c in response.data['results']] == ["Uno"]
+    
+    def test_facetas_por_etiqueta(self, authenticated_client, empresa):
+        """Recuento de contactos por etiqueta respetando los filtros del listado"""
+        Proveedor.objects.create(nombre="P1", tags="industrial, valencia", empresa=empresa)
+        Proveedor.objects.create(nombre="P2", tags="industrial", empresa=empresa)
+        Proveedor.objects.create(nombre="P3", tags="valencia", activo=False, empresa=empresa)
+        
+        response = authenticated_client.get("/api/core/proveedores/etiquetas/")
+        assert [(e['nombre'], e['total']) for e in response.data] == [("industrial", 2), ("valencia", 2)]
+        
+        response = authenticated_client.get("/api/core/proveedores/etiquetas/", {'activo': 'true'})
+        assert [(e['nombre'], e['total']) for e in response.data] == [("industrial", 2), ("valencia", 1)]
+    
+    def test_listado_sin_n_mas_1(self, authenticated_client, empresa):
+        """Las etiquetas del listado se cargan con prefetch, no una consulta por cliente"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        for i in range(5):
+            Cliente.objects.create(nombre=f"Cliente {i}", tags=f"comun, propia{i}", empresa=empresa)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get("/api/core/clientes/")
+        etiqueta_queries = [q for q in queries if 'core_clienteetiqueta' in q['sql']]
+        
+        assert response.data['results'][0]['tags'] == "comun, propia0"
+        assert len(etiqueta_queries) == 1
+    
+    def test_contactos_con_etiquetas(self, authenticated_client, empresa):
+        """El listado combinado filtra por etiqueta y devuelve el texto de etiquetas"""
+        Cliente.objects.create(nombre="Cliente A", tags="madrid", empresa=empresa)
+        Cliente.objects.create(nombre="Cliente B", tags="valencia", empresa=empresa)
+        Proveedor.objects.create(nombre="Proveedor A", tags="Madrid, industrial", empresa=empresa)
+        
+        response = authenticated_client.get("/api/core/contactos/", {'etiqueta': 'madrid'})
+        
+        assert [(c['nombre'], c['tags']) for c in response.data['results']] == [
+            ("Cliente A", "madrid"), ("Proveedor A", "madrid, industrial"),
+        ]
+
+
 @pytest.mark.django_db
 @pytest.mark.security
 class TestCoreModelsSecurity:
@@ -994,3 +1128,369 @@ class TestCoreModelsIntegration:
         # Verificar que created_at == updated_at en creación
         assert abs((cliente.created_at - cliente.updated_at).total_seconds()) < 1
         assert abs((proveedor.created_at - proveedor.updated_at).total_seconds()) < 1
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestVentasResumenReport:
+    """Tests del resumen de ventas (una sola query UNION ALL)"""
+    
+    @pytest.fixture
+    def documentos(self, empresa, cliente):
+        import datetime
+        from inventory.models import Almacen
+        from sales.models import Ticket, Factura
+        
+        almacen = Almacen._base_manager.create(nombre="Almacén Reportes", codigo="REP", empresa=empresa)
+        serie = Serie._base_manager.create(nombre="Serie A", empresa=empresa, almacen=almacen)
+        Factura._base_manager.create(
+            numero="F-1", cliente=cliente, serie=serie, empresa=empresa,
+            fecha=datetime.date(2024, 1, 10), total=Decimal('100.00')
+        )
+        Factura._base_manager.create(
+            numero="F-2", cliente=cliente, empresa=empresa,
+            fecha=datetime.date(2024, 2, 5), total=Decimal('50.50')
+        )
+        Ticket._base_manager.create(
+            numero="T-1", cliente=cliente, serie=serie, empresa=empresa,
+            fecha=datetime.date(2024, 1, 20), total=Decimal('20.00')
+        )
+        return serie
+    
+    def test_resumen_totales_por_tipo(self, authenticated_client, documentos):
+        """Los totales son correctos y los tipos sin documentos dan 0, no None"""
+        response = authenticated_client.get('/api/reportes/ventas_resumen/')
+        
+        assert response.status_code == status.HTTP_200_OK
+        resumen = response.data['resumen']
+        assert resumen['facturas']['count'] == 2
+        assert resumen['facturas']['total'] == Decimal('150.50')
+        assert resumen['tickets']['count'] == 1
+        assert resumen['tickets']['total'] == Decimal('20.00')
+        assert resumen['pedidos'] == {'count': 0, 'total': Decimal('0.00')}
+        assert 'desglose' not in response.data
+    
+    def test_resumen_una_sola_query(self, empresa, documentos):
+        """Todos los tipos de documento se calculan en un único round trip"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core.report_engine import SalesSummaryReport
+        from tenants.utils import set_current_empresa_id
+        
+        set_current_empresa_id(empresa.id)
+        report = SalesSummaryReport(periodo='mes', dimensiones=['serie'])
+        with CaptureQueriesContext(connection) as queries:
+            rows = report.rows()
+        
+        assert len(queries) == 1
+        assert 'UNION ALL' in queries[0]['sql']
+        assert len(rows) == 3  # factura ene/serie A, factura feb/sin serie, ticket ene/serie A
+    
+    def test_resumen_agrupado_por_mes_y_serie(self, authenticated_client, documentos):
+        """El desglose por mes y serie separa cada grupo"""
+        response = authenticated_client.get(
+            '/api/reportes/ventas_resumen/', {'agrupar_por': 'mes,serie', 'fecha_inicio': '2024-01-01'}
+        )
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['agrupar_por'] == ['mes', 'serie']
+        facturas = [row for row in response.data['desglose'] if row['tipo'] == 'factura']
+        assert [(row['serie__nombre'], row['total']) for row in facturas] == [
+            ('Serie A', Decimal('100.00')), (None, Decimal('50.50'))
+        ]
+    
+    def test_agrupacion_invalida(self, authenticated_client):
+        """Un agrupar_por desconocido devuelve 400"""
+        response = authenticated_client.get('/api/reportes/ventas_resumen/', {'agrupar_por': 'anio'})
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'error' in response.data
+
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestStreamingExport:
+    """Exportación ?format=csv / ndjson de los listados"""
+    
+    @pytest.fixture
+    def facturas(self, empresa, cliente):
+        from datetime import date
+        from sales.models import Factura
+        for i, total in enumerate(('100.00', '20.50', '7.25'), start=1):
+            Factura._base_manager.create(
+                numero=f"F-{i}", fecha=date(2024, 1, i), cliente=cliente,
+                subtotal=Decimal(total), total=Decimal(total), empresa=empresa
+            )
+    
+    def _content(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+    
+    def test_csv_completo_sin_paginar(self, authenticated_client, facturas):
+        """El CSV trae todas las filas (no la página) con el orden del listado"""
+        import csv
+        
+        response = authenticated_client.get('/api/sales/facturas/', {'format': 'csv', 'page_size': 1})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response['Content-Type'].startswith('text/csv')
+        assert 'attachment; filename="factura-' in response['Content-Disposition']
+        rows = list(csv.reader(self._content(response).lstrip('\ufeff').splitlines()))
+        assert rows[0][:4] == ['id', 'numero', 'fecha', 'serie_nombre']
+        assert [(row[1], row[-2]) for row in rows[1:]] == [
+            ('F-3', '7.25'), ('F-2', '20.50'), ('F-1', '100.00')
+        ]
+    
+    def test_ndjson_respeta_filtros(self, authenticated_client, facturas):
+        """NDJSON: un objeto por línea, con los mismos filtros que el listado"""
+        import json
+        
+        response = authenticated_client.get('/api/sales/facturas/', {'format': 'ndjson', 'ordering': 'fecha'})
+        lines = [json.loads(line) for line in self._content(response).splitlines()]
+        
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert [(line['numero'], line['cliente_nombre'], line['total']) for line in lines] == [
+            ('F-1', 'Cliente Test', '100.00'), ('F-2', 'Cliente Test', '20.50'), ('F-3', 'Cliente Test', '7.25')
+        ]
+    
+    def test_exportacion_sin_instanciar_modelos(self, authenticated_client, facturas):
+        """Las filas se leen con values_list: ninguna Factura se instancia"""
+        from django.db.models.signals import post_init
+        from sales.models import Factura
+        
+        instancias = []
+        receiver = lambda sender, **kwargs: instancias.append(sender)
+        post_init.connect(receiver, sender=Factura)
+        try:
+            response = authenticated_client.get('/api/sales/facturas/', {'format': 'csv'})
+            self._content(response)
+        finally:
+            post_init.disconnect(receiver, sender=Factura)
+        
+        assert instancias == []
+    
+    @pytest.mark.parametrize('ordering', [
+        ('fecha',), ('-fecha',), ('serie__nombre', '-fecha'), ('-serie__nombre', 'numero'), ('-total',),
+    ])
+    def test_lotes_por_clave_respetan_el_orden(self, empresa, cliente, ordering):
+        """Los lotes se leen con WHERE/LIMIT por clave y dan las filas en el orden del listado"""
+        from datetime import date
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core.export import export_rows
+        from inventory.models import Almacen
+        from sales.models import Factura
+        almacen = Almacen._base_manager.create(nombre="Almacén Export", codigo="EXP", empresa=empresa)
+        series = [None] + [
+            Serie._base_manager.create(nombre=nombre, empresa=empresa, almacen=almacen) for nombre in ('A', 'B')
+        ]
+        for i in range(11):
+            Factura._base_manager.create(
+                numero=f"F-{i:02}", fecha=date(2024, 1, 1 + i % 3), cliente=cliente, serie=series[i % 3],
+                total=Decimal(i % 4), empresa=empresa
+            )
+        queryset = Factura._base_manager.filter(empresa=empresa).order_by(*ordering)
+        
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(export_rows(queryset, ('numero', 'fecha'), chunk_size=3))
+        
+        assert rows == list(queryset.order_by(*ordering, 'pk').values_list('numero', 'fecha'))
+        assert len(queries) == 4
+        assert all('LIMIT 3' in query['sql'] for query in queries)
+    
+    def test_exportacion_aislada_por_empresa(self, authenticated_client, facturas):
+        """Solo se exportan las filas de la empresa del usuario"""
+        from datetime import date
+        from accounts.models import Empresa
+        from sales.models import Factura
+        otra = Empresa.objects.create(nombre="Otra", cif="B87654321")
+        cliente_ajeno = Cliente._base_manager.create(nombre="Ajeno", empresa=otra)
+        Factura._base_manager.create(numero="X-1", fecha=date(2024, 2, 1), cliente=cliente_ajeno, empresa=otra)
+        
+        response = authenticated_client.get('/api/sales/facturas/', {'format': 'ndjson'})
+        
+        assert 'X-1' not in self._content(response)
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestDocumentosEnBloque:
+    """Escritura en bloque de documentos y líneas (core.documentos)"""
+    
+    @pytest.fixture
+    def articulo(self, empresa):
+        from products.models import Articulo
+        return Articulo._base_manager.create(nombre="Artículo Bloque", precio=Decimal('10.00'), empresa=empresa)
+    
+    def _documento(self, numero, cliente, articulo, cantidades=(1, 2)):
+        return {
+            'numero': numero, 'cliente': cliente.id, 'fecha': '2024-05-10',
+            'items': [
+                {'articulo': articulo.id, 'cantidad': cantidad, 'precio_unitario': '10.00', 'iva_porcentaje': '21.00'}
+                for cantidad in cantidades
+            ],
+        }
+    
+    def test_lineas_con_un_solo_update_de_cabecera(self, empresa, cliente, articulo):
+        """Las líneas van en un INSERT y la cabecera se actualiza una vez"""
+        import datetime
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core.documentos import DocumentWriteService
+        from sales.models import Pedido, PedidoItem
+        
+        pedido = Pedido._base_manager.create(
+            numero="P-1", cliente=cliente, empresa=empresa, fecha=datetime.date(2024, 5, 10)
+        )
+        items = [
+            {'articulo': articulo, 'cantidad': cantidad, 'precio_unitario': Decimal('10.00')}
+            for cantidad in (1, 2, 3, 4)
+        ]
+        
+        with CaptureQueriesContext(connection) as queries:
+            DocumentWriteService.set_items(pedido, PedidoItem, 'pedido', items)
+        sqls = [q['sql'] for q in queries.captured_queries]
+        
+        pedido.refresh_from_db()
+        assert pedido.subtotal == Decimal('100.00')
+        assert pedido.total == Decimal('121.00')
+        assert len([sql for sql in sqls if sql.startswith('INSERT') and 'sales_pedidoitem' in sql]) == 1
+        assert len([sql for sql in sqls if sql.startswith('UPDATE') and 'sales_pedido"' in sql]) == 1
+    
+    def test_bulk_endpoint(self, authenticated_client, empresa, cliente, articulo, django_capture_on_commit_callbacks):
+        """POST .../bulk/ crea documentos, líneas y totales, y actualiza la tabla de hechos"""
+        from reporting.models import VentaDiaria
+        from sales.models import Factura, FacturaItem
+        
+        documentos = [self._documento(f"FB-{i}", cliente, articulo) for i in range(3)]
+        with django_capture_on_commit_callbacks(execute=True):
+            response = authenticated_client.post(
+                '/api/sales/facturas/bulk/', {'documentos': documentos}, format='json'
+            )
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['creados'] == 3
+        facturas = Factura._base_manager.filter(pk__in=response.data['ids'])
+        assert sorted(facturas.values_list('total', flat=True)) == [Decimal('36.30')] * 3
+        assert FacturaItem.objects.filter(factura__in=facturas).count() == 6
+        cabecera = VentaDiaria._base_manager.get(empresa=empresa, tipo_documento='factura', articulo__isnull=True)
+        assert cabecera.num_documentos == 3
+    
+    def test_bulk_consultas_constantes(self, authenticated_client, empresa, cliente, articulo):
+        """El número de consultas no crece con el número de documentos"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        def consultas(prefijo, n):
+            documentos = [self._documento(f"{prefijo}-{i}", cliente, articulo) for i in range(n)]
+            with CaptureQueriesContext(connection) as queries:
+                response = authenticated_client.post('/api/sales/tickets/bulk/', documentos, format='json')
+            assert response.status_code == status.HTTP_201_CREATED
+            return len(queries.captured_queries)
+        
+        assert consultas("A", 2) == consultas("B", 20)
+    
+    def test_bulk_referencias_invalidas(self, authenticated_client, empresa, cliente, articulo):
+        """Errores por documento (artículo inexistente, número repetido) y nada se crea"""
+        from sales.models import Albaran
+        
+        documentos = [
+            self._documento("AB-1", cliente, articulo),
+            self._documento("AB-1", cliente, articulo),
+            {**self._documento("AB-3", cliente, articulo), 'items': [
+                {'articulo': 999999, 'cantidad': 1, 'precio_unitario': '1.00'}
+            ]},
+        ]
+        response = authenticated_client.post('/api/sales/albaranes/bulk/', {'documentos': documentos}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data[0] == {}
+        assert 'numero' in response.data[1]
+        assert 'items' in response.data[2]
+        assert not Albaran._base_manager.filter(empresa=empresa).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestTotalesDocumentos:
+    """Totales por agregado SQL y comprobación de descuadres (core.documentos)"""
+    
+    @pytest.fixture
+    def articulo(self, empresa):
+        from products.models import Articulo
+        return Articulo._base_manager.create(nombre="Artículo Totales", precio=Decimal('10.00'), empresa=empresa)
+    
+    @pytest.fixture
+    def pedido(self, empresa, cliente, articulo):
+        import datetime
+        from sales.models import Pedido, PedidoItem
+        pedido = Pedido._base_manager.create(
+            numero="PT-1", cliente=cliente, empresa=empresa, fecha=datetime.date(2024, 5, 10)
+        )
+        for cantidad in (1, 2, 3):
+            PedidoItem._base_manager.create(
+                pedido=pedido, articulo=articulo, cantidad=cantidad,
+                precio_unitario=Decimal('10.00')
+            )
+        pedido.refresh_from_db()
+        return pedido
+    
+    def test_calculate_totals_agregado_y_update(self, pedido):
+        """calculate_totals es un SELECT agregado y un UPDATE de la cabecera, sin leer las líneas"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as queries:
+            pedido.calculate_totals()
+        sqls = [q['sql'] for q in queries.captured_queries]
+        
+        assert pedido.subtotal == Decimal('60.00')
+        assert pedido.iva == Decimal('12.60')
+        assert pedido.total == Decimal('72.60')
+        lineas = [sql for sql in sqls if 'sales_pedidoitem' in sql]
+        assert len(lineas) == 1 and 'SUM' in lineas[0]
+        assert len([sql for sql in sqls if sql.startswith('UPDATE') and 'sales_pedido"' in sql]) == 1
+    
+    def test_totales_compra_con_descuento(self, empresa, articulo):
+        """Los documentos de compra aplican el descuento de cada línea en el agregado"""
+        import datetime
+        from purchases.models import FacturaCompra, FacturaCompraItem
+        from tenants.utils import tenant_context
+        
+        proveedor = Proveedor._base_manager.create(nombre="Proveedor Totales", empresa=empresa)
+        factura = FacturaCompra._base_manager.create(
+            numero="FC-T1", proveedor=proveedor, empresa=empresa,
+            fecha=datetime.date(2024, 5, 10), fecha_vencimiento=datetime.date(2024, 6, 10)
+        )
+        FacturaCompraItem._base_manager.create(
+            factura=factura, articulo=articulo, cantidad=3, precio_unitario=Decimal('10.00'),
+            descuento_porcentaje=Decimal('10.00'), empresa=empresa
+        )
+        
+        with tenant_context(empresa):
+            factura.calculate_totals()
+        
+        item = FacturaCompraItem._base_manager.get(factura=factura)
+        assert factura.subtotal == item.subtotal == Decimal('27.00')
+        assert factura.iva == Decimal('5.67')
+        assert factura.total == Decimal('32.67')
+    
+    def test_descuadre_detectado_y_reparado(self, empresa, pedido):
+        """Un total alterado fuera del ORM se detecta y el comando lo repara"""
+        from io import StringIO
+        from django.core.management import call_command
+        from core.documentos import DocumentTotalsService
+        from sales.models import Pedido
+        
+        assert not DocumentTotalsService.drifted(Pedido).exists()
+        Pedido._base_manager.filter(pk=pedido.pk).update(subtotal=Decimal('1.00'), total=Decimal('99.00'))
+        assert list(DocumentTotalsService.drifted(Pedido, empresa.id).values_list('pk', flat=True)) == [pedido.pk]
+        
+        out = StringIO()
+        call_command('check_document_totals', '--modelo', 'sales.Pedido', stdout=out)
+        assert 'descuadrados' in out.getvalue()
+        call_command('check_document_totals', '--reparar', stdout=StringIO())
+        
+        pedido.refresh_from_db()
+        assert (pedido.subtotal, pedido.iva, pedido.total) == (Decimal('60.00'), Decimal('12.60'), Decimal('72.60'))
+        assert not DocumentTotalsService.drifted(Pedido).exists()
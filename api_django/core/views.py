@@ -1,14 +1,17 @@
 from django.shortcuts import render
-from django.db.models import Q
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.utils.urls import replace_query_param
 from itertools import chain
 from operator import attrgetter
+from search.filters import IndexedSearchFilter
+from .contactos import as_contactos, contactos_queryset, decode_cursor, encode_cursor
+from .etiquetas import EtiquetaService, parse_filtro
 from .models import Cliente, Proveedor, Serie
 from .serializers import ClienteSerializer, ProveedorSerializer, SerieSerializer, ContactoSerializer
 
@@ -22,36 +25,43 @@ class ContactoPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class ClienteViewSet(viewsets.ModelViewSet):
+class EtiquetasViewSetMixin:
+    """Filtro ?etiqueta= y recuento por etiqueta para los listados de clientes y proveedores"""
+    
+    def get_queryset(self):
+        """Retorna el queryset filtrado por tenant (y por ?etiqueta= si se indica)"""
+        queryset = self.queryset.model.objects.prefetch_related('etiqueta_links__etiqueta')
+        claves = parse_filtro(self.request.query_params.getlist('etiqueta'))
+        return EtiquetaService.filtrar(queryset, claves) if claves else queryset
+    
+    @action(detail=False, methods=['get'])
+    def etiquetas(self, request):
+        """Recuento de registros por etiqueta (con los mismos filtros que el listado)"""
+        return Response(EtiquetaService.facetas(self.filter_queryset(self.get_queryset())))
+
+
+class ClienteViewSet(EtiquetasViewSetMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de clientes"""
     queryset = Cliente.objects.all()  # Para el router
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, IndexedSearchFilter]
     filterset_fields = ['activo', 'es_empresa']
-    search_fields = ['nombre', 'nombre_comercial', 'email', 'telefono', 'movil', 'cif', 'poblacion', 'tags']
+    search_fields = ['nombre', 'nombre_comercial', 'email', 'telefono', 'movil', 'cif', 'poblacion', 'etiquetas__nombre']
     ordering_fields = ['nombre', 'created_at']
     ordering = ['nombre']
-    
-    def get_queryset(self):
-        """Retorna el queryset filtrado por tenant"""
-        return Cliente.objects.all()
 
 
-class ProveedorViewSet(viewsets.ModelViewSet):
+class ProveedorViewSet(EtiquetasViewSetMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de proveedores"""
     queryset = Proveedor.objects.all()  # Para el router
     serializer_class = ProveedorSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, IndexedSearchFilter]
     filterset_fields = ['activo', 'es_empresa']
-    search_fields = ['nombre', 'nombre_comercial', 'email', 'telefono', 'movil', 'cif_nif', 'poblacion', 'tags']
+    search_fields = ['nombre', 'nombre_comercial', 'email', 'telefono', 'movil', 'cif_nif', 'poblacion', 'etiquetas__nombre']
     ordering_fields = ['nombre', 'created_at']
     ordering = ['nombre']
-    
-    def get_queryset(self):
-        """Retorna el queryset filtrado por tenant"""
-        return Proveedor.objects.all()
 
 
 class SerieViewSet(viewsets.ModelViewSet):
@@ -75,98 +85,48 @@ class ContactosViewSet(viewsets.ViewSet):
     pagination_class = ContactoPagination
     
     def list(self, request):
-        """Lista todos los contactos (clientes y proveedores) ordenados alfabéticamente"""
+        """
+        Lista todos los contactos (clientes y proveedores) ordenados alfabéticamente.
+        
+        La combinación, el orden y la paginación se hacen en la BD. Con
+        ?paginacion=cursor (y después ?cursor=...) se pagina por clave en
+        lugar de por número de página, sin OFFSET en páginas profundas.
+        """
         # Obtener parámetros de filtrado
         search = request.query_params.get('search', '')
         activo = request.query_params.get('activo', '')
+        activo = activo.lower() == 'true' if activo else None
+        etiquetas = parse_filtro(request.query_params.getlist('etiqueta'))
         
-        # Obtener clientes
-        clientes_qs = Cliente.objects.all()
-        if search:
-            clientes_qs = clientes_qs.filter(
-                Q(nombre__icontains=search) |
-                Q(email__icontains=search) |
-                Q(telefono__icontains=search) |
-                Q(movil__icontains=search) |
-                Q(cif__icontains=search) |
-                Q(poblacion__icontains=search) |
-                Q(tags__icontains=search)
-            )
-        if activo:
-            clientes_qs = clientes_qs.filter(activo=activo.lower() == 'true')
-        
-        # Obtener proveedores
-        proveedores_qs = Proveedor.objects.all()
-        if search:
-            proveedores_qs = proveedores_qs.filter(
-                Q(nombre__icontains=search) |
-                Q(email__icontains=search) |
-                Q(telefono__icontains=search) |
-                Q(movil__icontains=search) |
-                Q(cif_nif__icontains=search) |
-                Q(poblacion__icontains=search) |
-                Q(tags__icontains=search)
-            )
-        if activo:
-            proveedores_qs = proveedores_qs.filter(activo=activo.lower() == 'true')
+        cursor = request.query_params.get('cursor')
+        if cursor or request.query_params.get('paginacion') == 'cursor':
+            return self._list_cursor(request, search, activo, etiquetas, cursor)
         
-        # Combinar y agregar tipo
-        contactos_list = []
+        # Paginación por número de página (LIMIT/OFFSET sobre la UNION)
+        paginator = self.pagination_class()
+        paginated_contactos = paginator.paginate_queryset(
+            contactos_queryset(search, activo, etiquetas), request
+        )
         
-        for cliente in clientes_qs:
-            contactos_list.append({
-                'id': cliente.id,
-                'nombre': cliente.nombre,
-                'nombre_comercial': cliente.nombre_comercial,
-                'es_empresa': cliente.es_empresa,
-                'email': cliente.email,
-                'telefono': cliente.telefono,
-                'movil': cliente.movil,
-                'website': cliente.website,
-                'direccion': cliente.direccion,
-                'poblacion': cliente.poblacion,
-                'codigo_postal': cliente.codigo_postal,
-                'provincia': cliente.provincia,
-                'pais': cliente.pais,
-                'cif_nif': cliente.cif,
-                'identificacion_vat': cliente.identificacion_vat,
-                'tags': cliente.tags,
-                'activo': cliente.activo,
-                'tipo': 'cliente',
-                'created_at': cliente.created_at,
-                'updated_at': cliente.updated_at,
-            })
-        
-        for proveedor in proveedores_qs:
-            contactos_list.append({
-                'id': proveedor.id,
-                'nombre': proveedor.nombre,
-                'nombre_comercial': proveedor.nombre_comercial,
-                'es_empresa': proveedor.es_empresa,
-                'email': proveedor.email,
-                'telefono': proveedor.telefono,
-                'movil': proveedor.movil,
-                'website': proveedor.website,
-                'direccion': proveedor.direccion,
-                'poblacion': proveedor.poblacion,
-                'codigo_postal': proveedor.codigo_postal,
-                'provincia': proveedor.provincia,
-                'pais': proveedor.pais,
-                'cif_nif': proveedor.cif_nif,
-                'identificacion_vat': proveedor.identificacion_vat,
-                'tags': proveedor.tags,
-                'activo': proveedor.activo,
-                'tipo': 'proveedor',
-                'created_at': proveedor.created_at,
-                'updated_at': proveedor.updated_at,
-            })
+        serializer = ContactoSerializer(as_contactos(paginated_contactos), many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    def _list_cursor(self, request, search, activo, etiquetas, cursor):
+        """Página de contactos posterior al cursor (keyset sobre lower(nombre), tipo, id)"""
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Ordenar alfabéticamente por nombre
-        contactos_list = sorted(contactos_list, key=lambda x: x['nombre'].lower())
+        paginator = self.pagination_class()
+        page_size = paginator.get_page_size(request)
+        rows = list(contactos_queryset(search, activo, etiquetas, after=after)[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
         
-        # Aplicar paginación manual
-        paginator = ContactoPagination()
-        paginated_contactos = paginator.paginate_queryset(contactos_list, request)
+        next_url = None
+        if has_next:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(rows[-1]))
         
-        serializer = ContactoSerializer(paginated_contactos, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        serializer = ContactoSerializer(as_contactos(rows), many=True)
+        return Response({'next': next_url, 'results': serializer.data})
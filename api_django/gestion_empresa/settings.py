@@ -60,6 +60,8 @@ INSTALLED_APPS = [
     'inventory',
     'audit',  # Nueva app de auditoría
     'documents',  # Nueva app de documentos PDF
+    'reporting',  # Tabla de hechos de ventas para reportes
+    'search',  # Índice de búsqueda de contactos y artículos
 ]
 
 MIDDLEWARE = [
@@ -69,10 +71,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'tenants.drf_middleware.DRFTenantMiddleware',    # Middleware específico para DRF
-    'tenants.middleware.ThreadLocalMiddleware',      # Debe estar después de AuthenticationMiddleware
-    'tenants.middleware.TenantMiddleware',           # Debe estar después de ThreadLocalMiddleware
-    'audit.context_middleware.AuditContextMiddleware',  # Contexto para auditoría
+    'tenants.middleware.TenantMiddleware',  # JWT + contexto de tenant/auditoría (después de AuthenticationMiddleware)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'audit.middleware.AuditMiddleware',  # Middleware de auditoría
@@ -164,7 +163,7 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 # Django REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'tenants.authentication.TenantJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -223,7 +222,7 @@ SPECTACULAR_SETTINGS = {
     
     # JWT Authentication
     'AUTHENTICATION_WHITELIST': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'tenants.authentication.TenantJWTAuthentication',
     ],
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -266,6 +265,40 @@ FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 # Invitation settings
 INVITATION_EXPIRY_DAYS = config('INVITATION_EXPIRY_DAYS', default=7, cast=int)
 
+# Último acceso de usuarios: segundos entre volcados en bloque a la base de datos
+LAST_ACCESS_FLUSH_INTERVAL = config('LAST_ACCESS_FLUSH_INTERVAL', default=60, cast=int)
+
+# Segundos que se cachea si una empresa está activa cuando solo se conoce su id.
+# Se invalida al guardarla; con varios procesos requiere una caché compartida (CACHES)
+EMPRESA_ACTIVA_CACHE_TIMEOUT = config('EMPRESA_ACTIVA_CACHE_TIMEOUT', default=300, cast=int)
+
+# Segundos que se cachea la valoración de cada almacén (0 = sin caché, por defecto).
+# Se invalida con los cambios de stock; con varios procesos requiere una caché compartida (CACHES)
+ALMACEN_VALORACION_CACHE_TIMEOUT = config('ALMACEN_VALORACION_CACHE_TIMEOUT', default=0, cast=int)
+
+# Auditoría: escritura diferida en bloque desde un hilo de fondo
+AUDIT_ASYNC = config('AUDIT_ASYNC', default=True, cast=bool)
+AUDIT_BATCH_SIZE = config('AUDIT_BATCH_SIZE', default=100, cast=int)
+AUDIT_FLUSH_INTERVAL = config('AUDIT_FLUSH_INTERVAL', default=2.0, cast=float)
+AUDIT_QUEUE_MAX_SIZE = config('AUDIT_QUEUE_MAX_SIZE', default=10000, cast=int)
+
+# Rendimiento: se registran los requests lentos o con muchas queries y una
+# muestra aleatoria del resto (0.01 = 1%)
+AUDIT_PERF_SAMPLE_RATE = config('AUDIT_PERF_SAMPLE_RATE', default=0.01, cast=float)
+AUDIT_PERF_SLOW_THRESHOLD = config('AUDIT_PERF_SLOW_THRESHOLD', default=1.0, cast=float)
+AUDIT_PERF_QUERY_THRESHOLD = config('AUDIT_PERF_QUERY_THRESHOLD', default=10, cast=int)
+AUDIT_PERF_TOP_QUERIES = config('AUDIT_PERF_TOP_QUERIES', default=5, cast=int)
+
+# Rollups de performance: segundos entre volcados y requests de ejemplo por minuto
+AUDIT_ROLLUP_FLUSH_INTERVAL = config('AUDIT_ROLLUP_FLUSH_INTERVAL', default=60, cast=int)
+AUDIT_PERF_EXEMPLARS_PER_MINUTE = config('AUDIT_PERF_EXEMPLARS_PER_MINUTE', default=3, cast=int)
+
+# Exportación en streaming (?format=csv / ndjson): filas leídas de la BD por bloque
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Creación en bloque de documentos (POST .../bulk/): máximo de documentos por llamada
+BULK_DOCUMENTS_MAX = config('BULK_DOCUMENTS_MAX', default=500, cast=int)
+
 # AWS S3 Configuration (para almacenar PDFs)
 AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID', default='')
 AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY', default='')
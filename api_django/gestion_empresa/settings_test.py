@@ -48,3 +48,12 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Volcar el último acceso en cada request para que los tests sean deterministas
+LAST_ACCESS_FLUSH_INTERVAL = 0
+
+# Auditoría síncrona: los registros se guardan dentro de la transacción del test
+AUDIT_ASYNC = False
+
+# Sin muestreo aleatorio de rendimiento en tests (resultados deterministas)
+AUDIT_PERF_SAMPLE_RATE = 0
@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from accounts.models import CustomUser
+from tenants.utils import tenant_context
 from .models import Empleado
 
 
@@ -13,19 +14,17 @@ def create_employee_profile(sender, instance, created, **kwargs):
     if created and instance.role == 'employee' and instance.empresa:
         # Solo crear empleado si no existe ya uno
         if not hasattr(instance, 'perfil_empleado'):
-            # Establecer el contexto del tenant para TenantModelMixin
-            from tenants.middleware import set_current_tenant
-            set_current_tenant(instance.empresa)
-            
             try:
-                empleado = Empleado(
-                    usuario=instance,
-                    puesto=instance.cargo or '',  # Usar cargo del usuario como puesto inicial
-                    activo=instance.is_active
-                )
-                # Asignar empresa manualmente (TenantModelMixin lo necesita)
-                empleado.empresa = instance.empresa
-                empleado.save()
+                # Establecer el contexto del tenant para TenantModelMixin
+                with tenant_context(instance.empresa):
+                    empleado = Empleado(
+                        usuario=instance,
+                        puesto=instance.cargo or '',  # Usar cargo del usuario como puesto inicial
+                        activo=instance.is_active
+                    )
+                    # Asignar empresa manualmente (TenantModelMixin lo necesita)
+                    empleado.empresa = instance.empresa
+                    empleado.save()
                 print(f"✓ Empleado creado automáticamente: {instance.get_full_name()}")
             except Exception as e:
                 # Log del error pero no fallar la creación del usuario
@@ -42,12 +41,9 @@ def save_employee_profile(sender, instance, **kwargs):
         try:
             empleado = instance.perfil_empleado
             if empleado.activo != instance.is_active:
-                # Establecer contexto del tenant si es necesario
-                if instance.empresa:
-                    from tenants.middleware import set_current_tenant
-                    set_current_tenant(instance.empresa)
-                
-                empleado.activo = instance.is_active
-                empleado.save()
+                # Establecer contexto del tenant de la empresa del usuario
+                with tenant_context(instance.empresa):
+                    empleado.activo = instance.is_active
+                    empleado.save()
         except Exception as e:
             print(f"⚠️  No se pudo sincronizar empleado para {instance.username}: {e}")
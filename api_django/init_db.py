@@ -160,9 +160,9 @@ def create_sample_data_for_empresa(empresa):
     """Crear datos de ejemplo para una empresa específica"""
     print(f"\nCreando datos de ejemplo para {empresa.nombre}...")
     
-    # Establecer la empresa actual en el contexto del thread
-    from tenants.middleware import set_current_tenant
-    set_current_tenant(empresa)
+    # Establecer la empresa actual en el contexto del tenant
+    from tenants.utils import set_current_tenant, reset_context
+    tenant_token = set_current_tenant(empresa)
     
     try:
         # Obtener el usuario administrador de la empresa
@@ -905,8 +905,8 @@ def create_sample_data_for_empresa(empresa):
         print(f"✓ Datos de ejemplo creados para {empresa.nombre}")
         
     finally:
-        # Limpiar el contexto del thread
-        set_current_tenant(None)
+        # Restaurar el contexto del tenant
+        reset_context(tenant_token)
 
 
 def run():
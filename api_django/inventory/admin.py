@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import (
-    Almacen, ArticuloStock, MovimientoStock, 
+    Almacen, ArticuloStock, MovimientoStock, InstantaneaStock,
     TransferenciaStock, TransferenciaStockItem
 )
 
@@ -56,6 +56,20 @@ class MovimientoStockAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(InstantaneaStock)
+class InstantaneaStockAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'articulo', 'almacen', 'stock']
+    list_filter = ['almacen', 'fecha', 'empresa']
+    search_fields = ['articulo__nombre', 'almacen__nombre']
+    ordering = ['-fecha']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 class TransferenciaStockItemInline(admin.TabularInline):
     model = TransferenciaStockItem
     extra = 0
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+    
+    def ready(self):
+        # Invalidación de la valoración cacheada de almacenes
+        import inventory.signals
+        
+        # Modelos auditados
+        from audit.registry import audit_registry
+        audit_registry.register(self.get_model('MovimientoStock'), level='HIGH')
+        audit_registry.register(self.get_model('ArticuloStock'))
@@ -0,0 +1,143 @@
+"""
+Stock y valoración de un almacén en una fecha pasada.
+
+El stock de un artículo en un instante es el de cualquier punto de
+referencia conocido más (o menos) los movimientos del libro entre ambos.
+Hay dos tipos de referencia: las instantáneas (InstantaneaStock, que crea
+el comando instantaneas_stock, p.ej. cada noche) y el stock actual
+(ArticuloStock). stock_a_fecha toma la más cercana al instante pedido y
+solo suma los movimientos del intervalo que las separa, con un agregado
+agrupado por artículo sobre el índice (empresa, almacen, fecha). Nunca se
+recorre el libro completo.
+
+La valoración usa el precio actual del artículo (no hay histórico de precios).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min, Q, Sum
+from django.utils import timezone
+
+from core.fechas import inicio_dia
+from products.models import Articulo
+from .models import ArticuloStock, InstantaneaStock, MovimientoStock
+
+
+def cierre_dia(fecha):
+    """Utility function para obtener el instante de cierre de un día (00:00 del día siguiente)"""
+    return inicio_dia(fecha + timedelta(days=1))
+
+
+def _sumar_movimientos(stock, movimientos, signo):
+    for articulo_id, cantidad in movimientos.values('articulo_id').annotate(
+        cantidad=Sum('cantidad')
+    ).order_by().values_list('articulo_id', 'cantidad'):
+        stock[articulo_id] = stock.get(articulo_id, 0) + signo * cantidad
+    return stock
+
+
+class StockHistoricoService:
+    """Reconstrucción del stock a una fecha desde instantáneas y movimientos"""
+
+    @staticmethod
+    def referencia(almacen, instante):
+        """
+        Punto de partida más cercano al instante: la instantánea anterior o
+        posterior más próxima o, si el stock actual está más cerca, None.
+        """
+        fechas = InstantaneaStock._base_manager.filter(
+            empresa_id=almacen.empresa_id, almacen=almacen
+        ).aggregate(
+            anterior=Max('fecha', filter=Q(fecha__lte=instante)),
+            posterior=Min('fecha', filter=Q(fecha__gt=instante)),
+        )
+        candidatas = [fecha for fecha in (fechas['anterior'], fechas['posterior']) if fecha]
+        ahora = timezone.now()
+        mejor = min(candidatas, key=lambda fecha: abs(fecha - instante), default=None)
+        if mejor is None or abs(ahora - instante) < abs(mejor - instante):
+            return None
+        return mejor
+
+    @staticmethod
+    def stock_actual_a(almacen, instante, articulo_ids=None):
+        """{articulo_id: stock} al instante partiendo del stock actual (deshace los movimientos posteriores)"""
+        stocks = ArticuloStock._base_manager.filter(empresa_id=almacen.empresa_id, almacen=almacen)
+        movimientos = MovimientoStock._base_manager.filter(
+            empresa_id=almacen.empresa_id, almacen=almacen, fecha__gte=instante
+        )
+        if articulo_ids is not None:
+            stocks = stocks.filter(articulo_id__in=articulo_ids)
+            movimientos = movimientos.filter(articulo_id__in=articulo_ids)
+        with transaction.atomic():
+            # Misma transacción: el stock y los movimientos se leen del mismo estado
+            stock = dict(stocks.values_list('articulo_id', 'stock_actual'))
+            return _sumar_movimientos(stock, movimientos, -1)
+
+    @staticmethod
+    def stock_a_fecha(almacen, instante, articulo_ids=None):
+        """
+        Stock de los artículos del almacén al instante (movimientos con fecha
+        anterior). Retorna (referencia, {articulo_id: stock}) sin los que
+        tengan stock 0; referencia es la instantánea usada o None (stock actual).
+        """
+        referencia = StockHistoricoService.referencia(almacen, instante)
+        if referencia is None:
+            stock = StockHistoricoService.stock_actual_a(almacen, instante, articulo_ids)
+        else:
+            instantanea = InstantaneaStock._base_manager.filter(
+                empresa_id=almacen.empresa_id, almacen=almacen, fecha=referencia
+            )
+            movimientos = MovimientoStock._base_manager.filter(empresa_id=almacen.empresa_id, almacen=almacen)
+            if articulo_ids is not None:
+                instantanea = instantanea.filter(articulo_id__in=articulo_ids)
+                movimientos = movimientos.filter(articulo_id__in=articulo_ids)
+            stock = dict(instantanea.values_list('articulo_id', 'stock'))
+            if referencia <= instante:
+                stock = _sumar_movimientos(stock, movimientos.filter(fecha__gte=referencia, fecha__lt=instante), 1)
+            else:
+                stock = _sumar_movimientos(stock, movimientos.filter(fecha__gte=instante, fecha__lt=referencia), -1)
+        return referencia, {articulo_id: cantidad for articulo_id, cantidad in stock.items() if cantidad}
+
+    @staticmethod
+    def valoracion_a_fecha(almacen, instante, articulo_ids=None):
+        """
+        Stock valorado del almacén al instante:
+        {'referencia', 'valor_total', 'articulos': [{articulo_id, nombre, stock, precio, valor}]}
+        """
+        referencia, stock = StockHistoricoService.stock_a_fecha(almacen, instante, articulo_ids)
+        articulos = []
+        valor_total = Decimal('0.00')
+        for articulo_id, nombre, precio in Articulo._base_manager.filter(
+            pk__in=list(stock)
+        ).order_by('nombre', 'id').values_list('id', 'nombre', 'precio'):
+            valor = stock[articulo_id] * precio
+            valor_total += valor
+            articulos.append({
+                'articulo_id': articulo_id,
+                'articulo_nombre': nombre,
+                'stock': stock[articulo_id],
+                'precio': precio,
+                'valor': valor,
+            })
+        return {'referencia': referencia, 'valor_total': valor_total, 'articulos': articulos}
+
+    @staticmethod
+    def crear_instantaneas(almacen, instante):
+        """
+        Guarda (o sustituye) la instantánea del almacén al instante, calculada
+        desde el stock actual. Retorna cuántas filas se han guardado.
+        """
+        stock = StockHistoricoService.stock_actual_a(almacen, instante)
+        with transaction.atomic():
+            InstantaneaStock._base_manager.filter(
+                empresa_id=almacen.empresa_id, almacen=almacen, fecha=instante
+            ).delete()
+            filas = InstantaneaStock._base_manager.bulk_create([
+                InstantaneaStock(
+                    empresa_id=almacen.empresa_id, almacen=almacen,
+                    articulo_id=articulo_id, fecha=instante, stock=cantidad
+                )
+                for articulo_id, cantidad in stock.items() if cantidad
+            ], batch_size=1000)
+        return len(filas)
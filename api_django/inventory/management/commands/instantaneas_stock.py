@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import Empresa
+from inventory.historico import StockHistoricoService, cierre_dia
+from inventory.models import Almacen
+
+
+class Command(BaseCommand):
+    help = 'Guarda el stock de cada almacén al cierre de un día (pensado para cron, por defecto ayer)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día cuyo cierre se guarda (YYYY-MM-DD). Por defecto ayer')
+        parser.add_argument('--empresa', type=int, action='append', help='ID de empresa (repetible). Por defecto todas')
+
+    def handle(self, *args, **options):
+        fecha = self._parse_date(options['fecha']) if options['fecha'] else timezone.localdate() - timedelta(days=1)
+        instante = cierre_dia(fecha)
+        if instante > timezone.now():
+            raise CommandError(f'El día {fecha} todavía no ha terminado')
+
+        empresas = Empresa.objects.order_by('id')
+        if options['empresa']:
+            empresas = empresas.filter(id__in=options['empresa'])
+
+        total = 0
+        for empresa in empresas:
+            filas = sum(
+                StockHistoricoService.crear_instantaneas(almacen, instante)
+                for almacen in Almacen._base_manager.filter(empresa=empresa).order_by('id')
+            )
+            total += filas
+            self.stdout.write(f'{empresa.nombre}: {filas} filas')
+
+        self.stdout.write(self.style.SUCCESS(f'Instantáneas de stock al cierre del {fecha}: {total} filas'))
+
+    @staticmethod
+    def _parse_date(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Fecha no válida: {value} (formato YYYY-MM-DD)')
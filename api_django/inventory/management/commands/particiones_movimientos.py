@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.particiones import TABLA, ParticionesMovimientosService
+
+
+class Command(BaseCommand):
+    help = 'Crea las particiones mensuales de los movimientos de stock (solo MySQL; pensado para cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=3, help='Meses por delante del actual con partición propia')
+        parser.add_argument('--inicializar', action='store_true', help='Particiona la tabla por primera vez')
+        parser.add_argument('--sql', action='store_true', help='Muestra las sentencias sin ejecutarlas')
+
+    def handle(self, *args, **options):
+        if not ParticionesMovimientosService.disponible():
+            raise CommandError('El particionado de movimientos solo está disponible en MySQL')
+        if options['meses'] < 0:
+            raise CommandError('--meses no puede ser negativo')
+
+        try:
+            sentencias = ParticionesMovimientosService.plan(options['meses'], inicializar=options['inicializar'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['sql']:
+            for sentencia in sentencias:
+                self.stdout.write(f'{sentencia};')
+            return
+
+        ParticionesMovimientosService.ejecutar(sentencias)
+        particiones = ParticionesMovimientosService.particiones()
+        self.stdout.write(self.style.SUCCESS(
+            f'{TABLA}: {len(sentencias)} sentencias ejecutadas, {len(particiones)} particiones'
+        ))
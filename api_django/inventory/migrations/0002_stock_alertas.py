@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:12
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+
+
+def calcular_urgencias(apps, schema_editor):
+    """Misma regla que ArticuloStock.urgencia_expression sobre el stock existente"""
+    ArticuloStock = apps.get_model('inventory', 'ArticuloStock')
+    ArticuloStock._base_manager.update(urgencia=Case(
+        When(stock_minimo=0, then=Value(None)),
+        When(stock_actual=0, then=Value(1)),
+        When(stock_actual__gt=F('stock_minimo'), then=Value(None)),
+        When(stock_actual__lte=F('stock_minimo') / 2, then=Value(2)),
+        default=Value(3),
+        output_field=models.PositiveSmallIntegerField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userinvitation'),
+        ('inventory', '0001_initial'),
+        ('products', '0004_articulo_empresa_categoria_empresa_marca_empresa_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articulostock',
+            name='urgencia',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(1, 'critica'), (2, 'alta'), (3, 'media')], editable=False, null=True, verbose_name='Urgencia de reposición'),
+        ),
+        migrations.AddIndex(
+            model_name='articulostock',
+            index=models.Index(fields=['empresa', 'urgencia'], name='inv_stock_alerta_idx'),
+        ),
+        migrations.RunPython(calcular_urgencias, migrations.RunPython.noop),
+    ]
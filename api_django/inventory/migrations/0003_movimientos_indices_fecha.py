@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userinvitation'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('inventory', '0002_stock_alertas'),
+        ('products', '0004_articulo_empresa_categoria_empresa_marca_empresa_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['empresa', 'almacen', 'fecha'], name='inv_mov_almacen_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['empresa', 'almacen_destino', 'fecha'], name='inv_mov_destino_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['empresa', 'articulo', 'fecha'], name='inv_mov_articulo_fecha_idx'),
+        ),
+    ]
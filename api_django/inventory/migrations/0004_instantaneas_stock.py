@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userinvitation'),
+        ('inventory', '0003_movimientos_indices_fecha'),
+        ('products', '0004_articulo_empresa_categoria_empresa_marca_empresa_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(verbose_name='Instante')),
+                ('stock', models.IntegerField(verbose_name='Stock')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('almacen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantaneas', to='inventory.almacen', verbose_name='Almacén')),
+                ('articulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.articulo', verbose_name='Artículo')),
+                ('empresa', models.ForeignKey(help_text='Empresa a la que pertenece este registro', on_delete=django.db.models.deletion.CASCADE, to='accounts.empresa', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'Instantánea de stock',
+                'verbose_name_plural': 'Instantáneas de stock',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['empresa', 'almacen', 'fecha'], name='inv_inst_almacen_fecha_idx')],
+                'unique_together': {('almacen', 'articulo', 'fecha')},
+            },
+        ),
+    ]
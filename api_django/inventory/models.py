@@ -3,7 +3,8 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from decimal import Decimal
+from django.db.models import Case, F, Value, When
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual, LessThanOrEqual
 from tenants.models import TenantModelMixin
 
 
@@ -60,19 +61,29 @@ class Almacen(TenantModelMixin, models.Model):
     
     def get_total_articulos(self):
         """Obtiene el total de artículos diferentes en el almacén"""
-        return self.articulostock_set.filter(stock_actual__gt=0).count()
+        from .valoracion import get_valoracion
+        return get_valoracion([self.pk])[self.pk][0]
     
     def get_valor_total(self):
-        """Calcula el valor total del stock en el almacén"""
-        total = Decimal('0.00')
-        for stock in self.articulostock_set.all():
-            total += stock.stock_actual * stock.articulo.precio
-        return total
+        """Calcula el valor total del stock en el almacén (SUM(stock_actual * precio))"""
+        from .valoracion import get_valoracion
+        return get_valoracion([self.pk])[self.pk][1]
 
 
 class ArticuloStock(TenantModelMixin, models.Model):
     """Modelo para gestión de stock por artículo y almacén"""
     
+    # Urgencia de la alerta de stock bajo (NULL = sin alerta). El número ordena
+    # de más a menos urgente en el índice (empresa, urgencia)
+    URGENCIA_CRITICA = 1
+    URGENCIA_ALTA = 2
+    URGENCIA_MEDIA = 3
+    URGENCIA_CHOICES = [
+        (URGENCIA_CRITICA, 'critica'),
+        (URGENCIA_ALTA, 'alta'),
+        (URGENCIA_MEDIA, 'media'),
+    ]
+    
     articulo = models.ForeignKey(
         'products.Articulo', 
         on_delete=models.CASCADE,
@@ -89,6 +100,10 @@ class ArticuloStock(TenantModelMixin, models.Model):
     stock_minimo = models.PositiveIntegerField(default=0, verbose_name="Stock mínimo")
     stock_maximo = models.PositiveIntegerField(default=0, verbose_name="Stock máximo")
     stock_reservado = models.PositiveIntegerField(default=0, verbose_name="Stock reservado")
+    urgencia = models.PositiveSmallIntegerField(
+        null=True, blank=True, editable=False, choices=URGENCIA_CHOICES,
+        verbose_name="Urgencia de reposición"
+    )
     
     # Ubicación dentro del almacén
     pasillo = models.CharField(max_length=10, blank=True, null=True, verbose_name="Pasillo")
@@ -102,12 +117,55 @@ class ArticuloStock(TenantModelMixin, models.Model):
     class Meta:
         ordering = ['almacen__nombre', 'articulo__nombre']
         unique_together = ['empresa', 'articulo', 'almacen']
+        indexes = [
+            # Alertas de stock bajo: filas con urgencia de la empresa, ya ordenadas
+            models.Index(fields=['empresa', 'urgencia'], name='inv_stock_alerta_idx'),
+        ]
         verbose_name = "Stock de artículo"
         verbose_name_plural = "Stock de artículos"
 
     def __str__(self):
         return f"{self.articulo.nombre} - {self.almacen.codigo} (Stock: {self.stock_actual})"
     
+    def save(self, *args, **kwargs):
+        """Mantiene la urgencia de la alerta de stock bajo"""
+        self.urgencia = self.calcular_urgencia(self.stock_actual, self.stock_minimo)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'urgencia' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'urgencia']
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def calcular_urgencia(cls, stock_actual, stock_minimo):
+        """
+        Urgencia de reposición: crítica sin stock, alta si falta al menos la
+        mitad del mínimo, media si está en el mínimo o por debajo.
+        None si no hay mínimo o el stock lo supera.
+        """
+        if not stock_minimo or stock_actual > stock_minimo:
+            return None
+        if stock_actual <= 0:
+            return cls.URGENCIA_CRITICA
+        if (stock_minimo - stock_actual) * 2 >= stock_minimo:
+            return cls.URGENCIA_ALTA
+        return cls.URGENCIA_MEDIA
+    
+    @classmethod
+    def urgencia_expression(cls, stock=None):
+        """calcular_urgencia como expresión SQL (stock: expresión del stock, por defecto la columna)"""
+        stock = stock if stock is not None else F('stock_actual')
+        return Case(
+            When(stock_minimo=0, then=Value(None)),
+            When(LessThanOrEqual(stock, Value(0)), then=Value(cls.URGENCIA_CRITICA)),
+            When(GreaterThan(stock, F('stock_minimo')), then=Value(None)),
+            When(
+                GreaterThanOrEqual((F('stock_minimo') - stock) * Value(2), F('stock_minimo')),
+                then=Value(cls.URGENCIA_ALTA)
+            ),
+            default=Value(cls.URGENCIA_MEDIA),
+            output_field=models.PositiveSmallIntegerField(),
+        )
+    
     @property
     def stock_disponible(self):
         """Stock disponible (actual - reservado)"""
@@ -235,6 +293,12 @@ class MovimientoStock(TenantModelMixin, models.Model):
         ordering = ['-fecha']
         verbose_name = "Movimiento de stock"
         verbose_name_plural = "Movimientos de stock"
+        # Consultas por rango de fechas de un almacén (origen o destino) o de un artículo
+        indexes = [
+            models.Index(fields=['empresa', 'almacen', 'fecha'], name='inv_mov_almacen_fecha_idx'),
+            models.Index(fields=['empresa', 'almacen_destino', 'fecha'], name='inv_mov_destino_fecha_idx'),
+            models.Index(fields=['empresa', 'articulo', 'fecha'], name='inv_mov_articulo_fecha_idx'),
+        ]
 
     def __str__(self):
         signo = "+" if self.cantidad > 0 else ""
@@ -257,10 +321,48 @@ class MovimientoStock(TenantModelMixin, models.Model):
                 raise ValidationError('El almacén origen y destino no pueden ser el mismo')
     
     def save(self, *args, **kwargs):
+        # El libro de movimientos solo admite inserciones (las correcciones son movimientos nuevos)
+        if not self._state.adding:
+            raise ValidationError('Los movimientos de stock no se pueden modificar')
         self.full_clean()
         super().save(*args, **kwargs)
 
 
+class InstantaneaStock(TenantModelMixin, models.Model):
+    """
+    Stock de un artículo en un almacén en un instante (p.ej. el cierre de cada
+    día), tal como lo deja el libro de movimientos: incluye los movimientos
+    con fecha anterior al instante. Solo se guardan las filas con stock.
+    """
+    
+    almacen = models.ForeignKey(
+        Almacen,
+        on_delete=models.CASCADE,
+        related_name='instantaneas',
+        verbose_name="Almacén"
+    )
+    articulo = models.ForeignKey(
+        'products.Articulo',
+        on_delete=models.CASCADE,
+        verbose_name="Artículo"
+    )
+    fecha = models.DateTimeField(verbose_name="Instante")
+    stock = models.IntegerField(verbose_name="Stock")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-fecha']
+        unique_together = ['almacen', 'articulo', 'fecha']
+        indexes = [
+            models.Index(fields=['empresa', 'almacen', 'fecha'], name='inv_inst_almacen_fecha_idx'),
+        ]
+        verbose_name = "Instantánea de stock"
+        verbose_name_plural = "Instantáneas de stock"
+
+    def __str__(self):
+        return f"{self.articulo_id} - {self.almacen_id} ({self.fecha:%Y-%m-%d %H:%M}): {self.stock}"
+
+
 class TransferenciaStock(TenantModelMixin, models.Model):
     """Modelo para gestionar transferencias entre almacenes"""
     
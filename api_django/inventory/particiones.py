@@ -0,0 +1,148 @@
+"""
+Particionado mensual (MySQL) de la tabla de movimientos de stock.
+
+El libro de movimientos solo crece. En MySQL puede particionarse por RANGE
+sobre TO_DAYS(fecha), una partición por mes (p202610 = octubre de 2026) y
+una última pmax para lo que quede fuera. Las consultas por rango de fechas
+(core.fechas.rango_fechas) solo leen las particiones del rango.
+
+Es opcional y lo hace el comando particiones_movimientos:
+
+- --inicializar convierte la tabla. MySQL exige que la clave primaria
+  incluya la columna de particionado y no admite claves foráneas en tablas
+  particionadas: la clave pasa a ser (id, fecha) y se eliminan las FK de la
+  tabla (la integridad la mantiene Django, que ya borra en cascada por su
+  cuenta). Las migraciones que alteren esas FK deberán tenerlo en cuenta.
+- Sin opciones crea las particiones de los próximos meses partiendo pmax
+  (pensado para cron; pmax debe estar vacía para que sea inmediato).
+
+Los meses se cuentan sobre fecha tal como se guarda (UTC).
+"""
+from datetime import date
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import MovimientoStock
+
+TABLA = MovimientoStock._meta.db_table
+PARTICION_MAX = 'pmax'
+
+
+def inicio_mes(fecha):
+    """Utility function para obtener el primer día del mes de una fecha"""
+    return date(fecha.year, fecha.month, 1)
+
+
+def mes_siguiente(mes):
+    """Utility function para obtener el primer día del mes siguiente"""
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def sumar_meses(mes, n):
+    """Utility function para avanzar n meses desde el primer día de un mes"""
+    for _ in range(n):
+        mes = mes_siguiente(mes)
+    return mes
+
+
+def nombre_particion(mes):
+    """Utility function para obtener el nombre de la partición de un mes (p202610)"""
+    return f'p{mes:%Y%m}'
+
+
+def mes_de_particion(nombre):
+    """Utility function para obtener el mes de una partición mensual (None para pmax)"""
+    if nombre == PARTICION_MAX:
+        return None
+    return date(int(nombre[1:5]), int(nombre[5:7]), 1)
+
+
+def _definiciones(desde, hasta):
+    definiciones = []
+    mes = desde
+    while mes <= hasta:
+        definiciones.append(
+            f"PARTITION {nombre_particion(mes)} VALUES LESS THAN (TO_DAYS('{mes_siguiente(mes):%Y-%m-%d}'))"
+        )
+        mes = mes_siguiente(mes)
+    definiciones.append(f"PARTITION {PARTICION_MAX} VALUES LESS THAN MAXVALUE")
+    return ',\n  '.join(definiciones)
+
+
+def sql_particionar(desde, hasta, claves_foraneas=()):
+    """
+    Utility function para obtener las sentencias que particionan la tabla con
+    un mes por partición de desde a hasta (primeros de mes) más pmax.
+    """
+    sentencias = [f"ALTER TABLE `{TABLA}` DROP FOREIGN KEY `{nombre}`" for nombre in claves_foraneas]
+    sentencias.append(f"ALTER TABLE `{TABLA}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `fecha`)")
+    sentencias.append(
+        f"ALTER TABLE `{TABLA}` PARTITION BY RANGE (TO_DAYS(`fecha`)) (\n  {_definiciones(desde, hasta)}\n)"
+    )
+    return sentencias
+
+
+def sql_rotar(particiones, hasta):
+    """
+    Utility function para obtener la sentencia que añade las particiones
+    mensuales que falten hasta el mes indicado partiendo pmax ([] si ya existen).
+    """
+    meses = [mes for mes in map(mes_de_particion, particiones) if mes]
+    if PARTICION_MAX not in particiones or not meses:
+        raise ValueError(f"La tabla {TABLA} no está particionada por meses (usa --inicializar)")
+    desde = mes_siguiente(max(meses))
+    if desde > hasta:
+        return []
+    return [
+        f"ALTER TABLE `{TABLA}` REORGANIZE PARTITION {PARTICION_MAX} INTO (\n  {_definiciones(desde, hasta)}\n)"
+    ]
+
+
+class ParticionesMovimientosService:
+    """Consulta y mantenimiento de las particiones de MovimientoStock (solo MySQL)"""
+
+    @staticmethod
+    def disponible():
+        return connection.vendor == 'mysql'
+
+    @staticmethod
+    def particiones():
+        """Nombres de las particiones de la tabla en orden ([] si no está particionada)"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+                "ORDER BY PARTITION_ORDINAL_POSITION",
+                [TABLA]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def claves_foraneas():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'",
+                [TABLA]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def plan(meses_adelante, inicializar=False):
+        """Sentencias para tener particiones hasta meses_adelante meses después del actual"""
+        hasta = sumar_meses(inicio_mes(timezone.now()), meses_adelante)
+        if not inicializar:
+            return sql_rotar(ParticionesMovimientosService.particiones(), hasta)
+
+        if ParticionesMovimientosService.particiones():
+            raise ValueError(f"La tabla {TABLA} ya está particionada")
+        primera = MovimientoStock._base_manager.order_by('fecha').values_list('fecha', flat=True).first()
+        desde = inicio_mes(primera) if primera else inicio_mes(timezone.now())
+        return sql_particionar(desde, hasta, ParticionesMovimientosService.claves_foraneas())
+
+    @staticmethod
+    def ejecutar(sentencias):
+        with connection.cursor() as cursor:
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
@@ -6,6 +6,8 @@ from .models import (
     Almacen, ArticuloStock, MovimientoStock, 
     TransferenciaStock, TransferenciaStockItem
 )
+from .services import StockInsuficienteError, StockLedgerService
+from .valoracion import get_valoracion
 from products.models import Articulo
 from accounts.models import CustomUser
 
@@ -26,13 +28,19 @@ class AlmacenSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'updated_at', 'total_articulos', 'valor_total']
     
+    def _valoracion(self, obj):
+        # Listados: valores anotados en el queryset (valoracion_annotations)
+        if hasattr(obj, 'valor_total'):
+            return obj.total_articulos, obj.valor_total
+        return get_valoracion([obj.pk])[obj.pk]
+    
     def get_total_articulos(self, obj):
         """Obtiene el total de artículos diferentes en el almacén"""
-        return obj.get_total_articulos()
+        return self._valoracion(obj)[0]
     
     def get_valor_total(self, obj):
         """Calcula el valor total del stock en el almacén"""
-        return float(obj.get_valor_total())
+        return float(self._valoracion(obj)[1])
     
     def validate_codigo(self, value):
         """Valida que el código sea único por empresa"""
@@ -95,6 +103,37 @@ class ArticuloStockSerializer(serializers.ModelSerializer):
             )
         
         return data
+    
+    def _ajustar_stock(self, instance, stock_actual, motivo):
+        """El stock actual solo cambia con un ajuste del libro (queda su movimiento)"""
+        request = self.context.get('request')
+        StockLedgerService.ajustar(
+            instance.almacen, {instance.articulo_id: stock_actual}, motivo=motivo,
+            usuario=request.user if request else None,
+            observaciones='Edición del stock del artículo',
+        )
+        instance.refresh_from_db(fields=['stock_actual', 'urgencia', 'updated_at'])
+    
+    @transaction.atomic
+    def create(self, validated_data):
+        stock_actual = validated_data.pop('stock_actual', 0)
+        instance = super().create(validated_data)
+        self._ajustar_stock(instance, stock_actual, motivo='inicial')
+        return instance
+    
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        stock_actual = validated_data.pop('stock_actual', None)
+        # Fila bloqueada y releída: no se sobrescribe el stock que haya movido el libro
+        instance.stock_actual = ArticuloStock._base_manager.select_for_update().values_list(
+            'stock_actual', flat=True
+        ).get(pk=instance.pk)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        if stock_actual is not None and stock_actual != instance.stock_actual:
+            self._ajustar_stock(instance, stock_actual, motivo='ajuste_inventario')
+        return instance
 
 
 class MovimientoStockSerializer(serializers.ModelSerializer):
@@ -148,7 +187,6 @@ class MovimientoStockCreateSerializer(serializers.Serializer):
         """Validaciones del movimiento"""
         cantidad = data.get('cantidad')
         tipo = data.get('tipo')
-        articulo = data.get('articulo')
         almacen = data.get('almacen')
         almacen_destino = data.get('almacen_destino')
         
@@ -156,22 +194,10 @@ class MovimientoStockCreateSerializer(serializers.Serializer):
         if cantidad == 0:
             raise serializers.ValidationError("La cantidad no puede ser cero.")
         
-        # Para salidas, validar que hay stock suficiente
-        if tipo in ['salida', 'transferencia_salida', 'ajuste_negativo']:
-            if cantidad > 0:
-                cantidad = -cantidad  # Convertir a negativo
-            
-            try:
-                stock_actual = ArticuloStock.objects.get(
-                    articulo=articulo, almacen=almacen
-                ).stock_actual
-            except ArticuloStock.DoesNotExist:
-                stock_actual = 0
-            
-            if abs(cantidad) > stock_actual:
-                raise serializers.ValidationError(
-                    f"Stock insuficiente. Stock actual: {stock_actual}"
-                )
+        # Las salidas se guardan en negativo. El stock disponible se comprueba
+        # al aplicar el movimiento, con la fila bloqueada
+        if tipo in ['salida', 'transferencia_salida', 'ajuste_negativo'] and cantidad > 0:
+            cantidad = -cantidad
         
         # Para transferencias, validar almacén destino
         if tipo in ['transferencia_salida', 'transferencia_entrada']:
@@ -192,71 +218,34 @@ class MovimientoStockCreateSerializer(serializers.Serializer):
         """Crear movimiento de stock y actualizar stock"""
         articulo = validated_data['articulo']
         almacen = validated_data['almacen']
+        almacen_destino = validated_data.get('almacen_destino')
         cantidad = validated_data['cantidad']
+        precio_unitario = validated_data.get('precio_unitario')
         request = self.context.get('request')
+        usuario = request.user if request else None
         
-        # Obtener o crear registro de stock
-        stock, created = ArticuloStock.objects.get_or_create(
-            articulo=articulo,
-            almacen=almacen,
-            defaults={'stock_actual': 0}
-        )
-        
-        # Calcular nuevo stock
-        stock_anterior = stock.stock_actual
-        stock_posterior = max(0, stock_anterior + cantidad)
-        
-        # Crear movimiento
-        movimiento = MovimientoStock.objects.create(
-            articulo=articulo,
-            almacen=almacen,
-            tipo=validated_data['tipo'],
-            motivo=validated_data['motivo'],
-            cantidad=cantidad,
-            stock_anterior=stock_anterior,
-            stock_posterior=stock_posterior,
-            observaciones=validated_data.get('observaciones', ''),
-            precio_unitario=validated_data.get('precio_unitario'),
-            almacen_destino=validated_data.get('almacen_destino'),
-            usuario=request.user if request else None
-        )
-        
-        # Actualizar stock
-        stock.stock_actual = stock_posterior
-        stock.save()
-        
-        # Si es transferencia, crear movimiento de entrada en destino
-        if validated_data['tipo'] == 'transferencia_salida' and validated_data.get('almacen_destino'):
-            almacen_destino = validated_data['almacen_destino']
-            
-            # Obtener o crear stock en destino
-            stock_destino, created = ArticuloStock.objects.get_or_create(
-                articulo=articulo,
-                almacen=almacen_destino,
-                defaults={'stock_actual': 0}
+        try:
+            movimiento, = StockLedgerService.aplicar(
+                almacen, [(articulo.id, cantidad, precio_unitario)],
+                tipo=validated_data['tipo'],
+                motivo=validated_data['motivo'],
+                almacen_destino=almacen_destino,
+                usuario=usuario,
+                observaciones=validated_data.get('observaciones', ''),
             )
             
-            stock_anterior_destino = stock_destino.stock_actual
-            stock_posterior_destino = stock_anterior_destino + abs(cantidad)
-            
-            # Crear movimiento de entrada
-            MovimientoStock.objects.create(
-                articulo=articulo,
-                almacen=almacen_destino,
-                tipo='transferencia_entrada',
-                motivo='transferencia',
-                cantidad=abs(cantidad),
-                stock_anterior=stock_anterior_destino,
-                stock_posterior=stock_posterior_destino,
-                observaciones=f"Transferencia desde {almacen.codigo}",
-                precio_unitario=validated_data.get('precio_unitario'),
-                almacen_destino=almacen,  # Almacén origen en el movimiento de entrada
-                usuario=request.user if request else None
-            )
-            
-            # Actualizar stock destino
-            stock_destino.stock_actual = stock_posterior_destino
-            stock_destino.save()
+            # Si es transferencia, crear movimiento de entrada en destino
+            if validated_data['tipo'] == 'transferencia_salida' and almacen_destino:
+                StockLedgerService.aplicar(
+                    almacen_destino, [(articulo.id, abs(cantidad), precio_unitario)],
+                    tipo='transferencia_entrada',
+                    motivo='transferencia',
+                    almacen_destino=almacen,  # Almacén origen en el movimiento de entrada
+                    usuario=usuario,
+                    observaciones=f"Transferencia desde {almacen.codigo}",
+                )
+        except StockInsuficienteError as e:
+            raise serializers.ValidationError(f"Stock insuficiente. Stock disponible: {e.disponible}")
         
         return movimiento
 
@@ -389,54 +378,25 @@ class AjusteStockSerializer(serializers.Serializer):
         observaciones = validated_data.get('observaciones', '')
         request = self.context.get('request')
         
-        movimientos_creados = []
+        # Artículos y almacenes de la empresa (los ajustes con ids ajenos se ignoran)
+        articulos = set(Articulo.objects.filter(
+            id__in={ajuste['articulo_id'] for ajuste in ajustes}
+        ).values_list('id', flat=True))
+        almacenes = Almacen.objects.in_bulk({ajuste['almacen_id'] for ajuste in ajustes})
         
+        # Un ajuste por almacén con todos sus artículos (el último nivel indicado manda)
+        niveles = {}
         for ajuste in ajustes:
-            articulo_id = ajuste['articulo_id']
-            almacen_id = ajuste['almacen_id']
-            stock_nuevo = ajuste['stock_nuevo']
-            
-            try:
-                articulo = Articulo.objects.get(id=articulo_id)
-                almacen = Almacen.objects.get(id=almacen_id)
-            except (Articulo.DoesNotExist, Almacen.DoesNotExist):
-                continue
-            
-            # Obtener o crear stock
-            stock, created = ArticuloStock.objects.get_or_create(
-                articulo=articulo,
-                almacen=almacen,
-                defaults={'stock_actual': 0}
+            if ajuste['articulo_id'] in articulos and ajuste['almacen_id'] in almacenes:
+                niveles.setdefault(ajuste['almacen_id'], {})[ajuste['articulo_id']] = ajuste['stock_nuevo']
+        
+        movimientos_creados = []
+        for almacen_id, niveles_almacen in sorted(niveles.items()):
+            movimientos_creados += StockLedgerService.ajustar(
+                almacenes[almacen_id], niveles_almacen,
+                usuario=request.user if request else None,
+                observaciones=f"{motivo}. {observaciones}".strip(),
             )
-            
-            stock_anterior = stock.stock_actual
-            diferencia = stock_nuevo - stock_anterior
-            
-            if diferencia != 0:
-                # Determinar tipo de movimiento
-                if diferencia > 0:
-                    tipo = 'ajuste_positivo'
-                else:
-                    tipo = 'ajuste_negativo'
-                
-                # Crear movimiento
-                movimiento = MovimientoStock.objects.create(
-                    articulo=articulo,
-                    almacen=almacen,
-                    tipo=tipo,
-                    motivo='ajuste_inventario',
-                    cantidad=diferencia,
-                    stock_anterior=stock_anterior,
-                    stock_posterior=stock_nuevo,
-                    observaciones=f"{motivo}. {observaciones}".strip(),
-                    usuario=request.user if request else None
-                )
-                
-                # Actualizar stock
-                stock.stock_actual = stock_nuevo
-                stock.save()
-                
-                movimientos_creados.append(movimiento)
         
         return {
             'movimientos_creados': len(movimientos_creados),
@@ -0,0 +1,319 @@
+"""
+Libro de stock: único punto de escritura de ArticuloStock.stock_actual.
+
+Todo cambio de stock (ventas, compras, ajustes, movimientos manuales y
+transferencias) pasa por StockLedgerService.aplicar:
+
+- Las filas afectadas se bloquean de una vez con select_for_update en orden
+  de artículo (dos operaciones concurrentes bloquean en el mismo orden y no
+  se interbloquean) y se crean a 0 las que falten.
+- El stock se actualiza con un único UPDATE relativo
+  (stock_actual = stock_actual + CASE ... END) condicionado a que ninguna
+  salida deje el stock en negativo. Si alguna fila no cumple la condición
+  la operación entera se deshace.
+- Los movimientos se insertan con bulk_create con el stock anterior y
+  posterior de cada línea.
+
+Las consultas no dependen del número de líneas.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import ArticuloStock, MovimientoStock, TransferenciaStock, TransferenciaStockItem
+from .valoracion import invalidar_valoracion
+
+
+class StockInsuficienteError(ValueError):
+    """Una salida supera el stock disponible del artículo en el almacén"""
+
+    def __init__(self, articulo_id, disponible, solicitado):
+        self.articulo_id = articulo_id
+        self.disponible = disponible
+        self.solicitado = solicitado
+        super().__init__(
+            f"Stock insuficiente para el artículo {articulo_id}. "
+            f"Disponible: {disponible}, Solicitado: {solicitado}"
+        )
+
+
+class StockLedgerService:
+    """Cambios de stock con bloqueo de filas, UPDATE relativo y movimientos en bloque"""
+
+    @staticmethod
+    def lock_stocks(almacen, articulo_ids):
+        """
+        Bloquea (SELECT ... FOR UPDATE, ordenado por artículo) las filas de
+        stock de los artículos en el almacén, creando a 0 las que falten.
+        Debe llamarse dentro de una transacción. Retorna {articulo_id: ArticuloStock}.
+        """
+        articulo_ids = sorted(set(articulo_ids))
+        stocks = ArticuloStock._base_manager.filter(
+            empresa_id=almacen.empresa_id, almacen=almacen, articulo_id__in=articulo_ids
+        )
+        existentes = set(stocks.values_list('articulo_id', flat=True))
+        faltan = [articulo_id for articulo_id in articulo_ids if articulo_id not in existentes]
+        if faltan:
+            # ignore_conflicts: otra transacción puede haberla creado a la vez
+            ArticuloStock._base_manager.bulk_create([
+                ArticuloStock(empresa_id=almacen.empresa_id, almacen=almacen, articulo_id=articulo_id)
+                for articulo_id in faltan
+            ], ignore_conflicts=True)
+        return {
+            stock.articulo_id: stock
+            for stock in stocks.select_for_update().order_by('articulo_id')
+        }
+
+    @staticmethod
+    def apply_deltas(deltas):
+        """
+        Suma a cada fila su delta ({ArticuloStock: delta}) con un único UPDATE
+        relativo. Las salidas solo se aplican si hay stock suficiente; si
+        alguna no se puede aplicar lanza StockInsuficienteError (dentro de una
+        transacción, que deshace las filas ya actualizadas).
+        """
+        deltas = {stock: delta for stock, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        guard = Q()
+        for stock, delta in deltas.items():
+            guard |= Q(pk=stock.pk, stock_actual__gte=-delta) if delta < 0 else Q(pk=stock.pk)
+
+        delta_sql = Case(
+            *[When(pk=stock.pk, then=Value(delta)) for stock, delta in deltas.items()],
+            output_field=IntegerField()
+        )
+        actualizadas = ArticuloStock._base_manager.filter(guard).update(
+            # urgencia va antes que stock_actual: MySQL evalúa el SET de izquierda
+            # a derecha con los valores ya asignados; así todos parten del stock anterior
+            urgencia=ArticuloStock.urgencia_expression(F('stock_actual') + delta_sql),
+            stock_actual=F('stock_actual') + delta_sql,
+            updated_at=timezone.now(),
+        )
+        if actualizadas != len(deltas):
+            salidas = [stock for stock, delta in deltas.items() if delta < 0]
+            stock = next((s for s in salidas if s.stock_actual + deltas[s] < 0), salidas[0])
+            raise StockInsuficienteError(stock.articulo_id, stock.stock_actual, -deltas[stock])
+
+        for stock, delta in deltas.items():
+            stock.stock_actual += delta
+            stock.urgencia = ArticuloStock.calcular_urgencia(stock.stock_actual, stock.stock_minimo)
+        invalidar_valoracion(stock.almacen_id for stock in deltas)
+
+    @staticmethod
+    def aplicar(almacen, lineas, tipo, motivo, estricto=True, stocks=None, documento=None,
+                usuario=None, observaciones=None, almacen_destino=None):
+        """
+        Aplica al almacén las líneas [(articulo_id, cantidad, precio_unitario)]
+        (cantidad positiva para entradas, negativa para salidas) y registra un
+        movimiento por línea. Varias líneas del mismo artículo se encadenan.
+
+        estricto=True: una salida mayor que el stock disponible (actual menos
+        reservado) lanza StockInsuficienteError y no se aplica nada.
+        estricto=False: se descuenta como mucho el stock actual (no baja de 0).
+
+        stocks permite pasar filas ya bloqueadas con lock_stocks (se actualizan
+        en memoria). Retorna los movimientos creados.
+        """
+        lineas = [linea for linea in lineas if linea[1]]
+        if not lineas:
+            return []
+
+        content_type = ContentType.objects.get_for_model(documento) if documento is not None else None
+        with transaction.atomic():
+            if stocks is None:
+                stocks = StockLedgerService.lock_stocks(almacen, [linea[0] for linea in lineas])
+
+            actual = {articulo_id: stock.stock_actual for articulo_id, stock in stocks.items()}
+            movimientos = []
+            for articulo_id, cantidad, precio_unitario in lineas:
+                stock = stocks[articulo_id]
+                stock_anterior = actual[articulo_id]
+                if cantidad < 0:
+                    if estricto:
+                        disponible = max(0, stock_anterior - stock.stock_reservado)
+                        if -cantidad > disponible:
+                            raise StockInsuficienteError(articulo_id, disponible, -cantidad)
+                    else:
+                        cantidad = max(cantidad, -stock_anterior)
+                actual[articulo_id] = stock_anterior + cantidad
+                movimientos.append(MovimientoStock(
+                    empresa_id=almacen.empresa_id,
+                    articulo_id=articulo_id,
+                    almacen=almacen,
+                    tipo=tipo,
+                    motivo=motivo,
+                    cantidad=cantidad,
+                    stock_anterior=stock_anterior,
+                    stock_posterior=actual[articulo_id],
+                    precio_unitario=precio_unitario,
+                    content_type=content_type,
+                    object_id=documento.pk if documento is not None else None,
+                    almacen_destino=almacen_destino,
+                    usuario=usuario,
+                    observaciones=observaciones,
+                ))
+
+            StockLedgerService.apply_deltas({
+                stocks[articulo_id]: actual[articulo_id] - stocks[articulo_id].stock_actual
+                for articulo_id in actual
+            })
+            MovimientoStock._base_manager.bulk_create(movimientos)
+        return movimientos
+
+    @staticmethod
+    def registrar_salidas(almacen, lineas, motivo='venta', documento=None, usuario=None, observaciones=None):
+        """
+        Descuenta del almacén las líneas [(articulo_id, cantidad, precio_unitario)]
+        (cantidades positivas). Si no hay stock suficiente se descuenta lo
+        disponible. Retorna los movimientos.
+        """
+        return StockLedgerService.aplicar(
+            almacen,
+            [(articulo_id, -cantidad, precio_unitario) for articulo_id, cantidad, precio_unitario in lineas],
+            tipo='salida', motivo=motivo, estricto=False,
+            documento=documento, usuario=usuario, observaciones=observaciones,
+        )
+
+    @staticmethod
+    def ajustar(almacen, niveles, motivo='ajuste_inventario', usuario=None, observaciones=None):
+        """
+        Fija el stock de los artículos ({articulo_id: stock_nuevo}) con
+        movimientos de ajuste positivo/negativo por la diferencia.
+        Retorna los movimientos creados.
+        """
+        with transaction.atomic():
+            stocks = StockLedgerService.lock_stocks(almacen, niveles)
+            movimientos = []
+            for tipo, signo in (('ajuste_positivo', 1), ('ajuste_negativo', -1)):
+                lineas = [
+                    (articulo_id, nuevo - stocks[articulo_id].stock_actual, None)
+                    for articulo_id, nuevo in sorted(niveles.items())
+                    if (nuevo - stocks[articulo_id].stock_actual) * signo > 0
+                ]
+                # El ajuste fija el stock: ignora lo reservado
+                movimientos += StockLedgerService.aplicar(
+                    almacen, lineas, tipo, motivo, estricto=False, stocks=stocks,
+                    usuario=usuario, observaciones=observaciones,
+                )
+        return movimientos
+
+
+class TransferenciaStockService:
+    """
+    Transiciones de una transferencia (enviar, recibir, cancelar) sobre todos
+    sus items a la vez: las consultas no dependen del número de líneas.
+    El estado y los items se leen después de bloquear la transferencia: la
+    instancia recibida puede haberse cargado antes de otra transición.
+    """
+
+    @staticmethod
+    def _lock(transferencia, estados):
+        """
+        Bloquea la transferencia, comprueba que sigue en uno de los estados y
+        carga su estado e items actuales. Retorna los items (con su artículo).
+        """
+        estado = TransferenciaStock._base_manager.select_for_update().filter(
+            pk=transferencia.pk
+        ).values_list('estado', flat=True).get()
+        if estado not in estados:
+            raise ValueError(f"La transferencia está {estado}")
+        transferencia.estado = estado
+
+        items = TransferenciaStockItem._base_manager.filter(transferencia=transferencia).select_related('articulo')
+        # transferencia.items.all() devuelve los items recién leídos (p.ej. al serializar)
+        if not hasattr(transferencia, '_prefetched_objects_cache'):
+            transferencia._prefetched_objects_cache = {}
+        transferencia._prefetched_objects_cache['items'] = items
+        return list(items)
+
+    @staticmethod
+    def _guardar(transferencia, items, campos_items, campos):
+        ahora = timezone.now()
+        for item in items:
+            item.updated_at = ahora
+        TransferenciaStockItem._base_manager.bulk_update(items, campos_items + ['updated_at'])
+        transferencia.save(update_fields=campos + ['updated_at'])
+
+    @staticmethod
+    def enviar(transferencia, usuario):
+        """Salida del origen de todo lo solicitado. Falla entera si algún artículo no tiene stock"""
+        with transaction.atomic():
+            items = TransferenciaStockService._lock(transferencia, ['pendiente'])
+            StockLedgerService.aplicar(
+                transferencia.almacen_origen,
+                [(item.articulo_id, -item.cantidad_solicitada, None) for item in items],
+                tipo='transferencia_salida',
+                motivo='transferencia',
+                almacen_destino=transferencia.almacen_destino,
+                usuario=usuario,
+                observaciones=f'Transferencia {transferencia.numero} hacia {transferencia.almacen_destino.nombre}',
+            )
+            for item in items:
+                item.cantidad_enviada = item.cantidad_solicitada
+            transferencia.estado = 'en_transito'
+            transferencia.fecha_envio = timezone.now()
+            transferencia.enviado_por = usuario
+            TransferenciaStockService._guardar(
+                transferencia, items, ['cantidad_enviada'], ['estado', 'fecha_envio', 'enviado_por']
+            )
+        return transferencia
+
+    @staticmethod
+    def recibir(transferencia, usuario, cantidades=None):
+        """
+        Entrada en destino de lo recibido. cantidades es {item_id: cantidad}
+        (por defecto lo enviado); no puede superar lo enviado.
+        """
+        cantidades = {str(item_id): cantidad for item_id, cantidad in (cantidades or {}).items()}
+        with transaction.atomic():
+            items = TransferenciaStockService._lock(transferencia, ['en_transito'])
+            for item in items:
+                try:
+                    cantidad = int(cantidades.get(str(item.id), item.cantidad_enviada))
+                except (TypeError, ValueError):
+                    raise ValueError(f"Cantidad recibida no válida para {item.articulo.nombre}")
+                if not 0 <= cantidad <= item.cantidad_enviada:
+                    raise ValueError(
+                        f"Cantidad recibida de {item.articulo.nombre} fuera de rango (enviado: {item.cantidad_enviada})"
+                    )
+                item.cantidad_recibida = cantidad
+
+            StockLedgerService.aplicar(
+                transferencia.almacen_destino,
+                [(item.articulo_id, item.cantidad_recibida, None) for item in items],
+                tipo='transferencia_entrada',
+                motivo='transferencia',
+                almacen_destino=transferencia.almacen_origen,
+                usuario=usuario,
+                observaciones=f'Transferencia {transferencia.numero} desde {transferencia.almacen_origen.nombre}',
+            )
+            transferencia.estado = 'completada'
+            transferencia.fecha_recepcion = timezone.now()
+            transferencia.recibido_por = usuario
+            TransferenciaStockService._guardar(
+                transferencia, items, ['cantidad_recibida'], ['estado', 'fecha_recepcion', 'recibido_por']
+            )
+        return transferencia
+
+    @staticmethod
+    def cancelar(transferencia, usuario):
+        """Cancela la transferencia; si está en tránsito devuelve al origen lo no recibido"""
+        with transaction.atomic():
+            items = TransferenciaStockService._lock(transferencia, ['pendiente', 'en_transito'])
+            if transferencia.estado == 'en_transito':
+                StockLedgerService.aplicar(
+                    transferencia.almacen_origen,
+                    [
+                        (item.articulo_id, item.cantidad_enviada - item.cantidad_recibida, None)
+                        for item in items if item.cantidad_enviada > item.cantidad_recibida
+                    ],
+                    tipo='entrada',
+                    motivo='devolucion_proveedor',
+                    usuario=usuario,
+                    observaciones=f'Cancelación de transferencia {transferencia.numero}',
+                )
+            transferencia.estado = 'cancelada'
+            transferencia.save(update_fields=['estado', 'updated_at'])
+        return transferencia
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import Articulo
+from .models import ArticuloStock
+from .valoracion import invalidar_valoracion
+
+
+@receiver(post_save, sender=ArticuloStock)
+@receiver(post_delete, sender=ArticuloStock)
+def invalidar_valoracion_stock(sender, instance, **kwargs):
+    """Invalida la valoración cacheada del almacén al guardar o borrar un stock"""
+    invalidar_valoracion([instance.almacen_id])
+
+
+@receiver(post_save, sender=Articulo)
+def invalidar_valoracion_precio(sender, instance, created, update_fields=None, **kwargs):
+    """Invalida la valoración de los almacenes con stock del artículo si puede haber cambiado su precio"""
+    if created or (update_fields is not None and 'precio' not in update_fields):
+        return
+    invalidar_valoracion(
+        ArticuloStock._base_manager.filter(articulo=instance).values_list('almacen_id', flat=True)
+    )
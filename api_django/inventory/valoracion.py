@@ -0,0 +1,104 @@
+"""
+Valoración de almacenes (artículos con stock y valor del stock).
+
+El valor de un almacén es un único SUM(stock_actual * precio) en SQL:
+- En listados se anota sobre el queryset de almacenes con subconsultas
+  correlacionadas (valoracion_annotations), sin consultas por almacén.
+- Para almacenes sueltos (detalle, Almacen.get_valor_total) se calculan
+  juntos con un solo agregado agrupado por almacén.
+
+Opcionalmente (ALMACEN_VALORACION_CACHE_TIMEOUT > 0; por defecto 0) se
+cachea una instantánea por almacén. Los cambios de stock (StockLedgerService,
+guardar o borrar un ArticuloStock) y de precio de un artículo la invalidan
+en la caché del proceso que los hace: con varios procesos solo es correcta
+con un backend compartido en CACHES (Redis, Memcached), no con LocMemCache.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import ArticuloStock
+
+VALOR = DecimalField(max_digits=15, decimal_places=2)
+CERO = Decimal('0.00')
+
+
+def _valor_stock():
+    return Sum(F('stock_actual') * F('articulo__precio'), output_field=VALOR)
+
+
+def _articulos_con_stock():
+    return Count('id', filter=Q(stock_actual__gt=0))
+
+
+def valoracion_annotations():
+    """
+    Utility function para anotar total_articulos y valor_total sobre un
+    queryset de almacenes (una subconsulta por columna, sin GROUP BY externo)
+    """
+    stocks = ArticuloStock._base_manager.filter(almacen=OuterRef('pk')).order_by().values('almacen')
+    return {
+        'total_articulos': Coalesce(
+            Subquery(stocks.annotate(n=_articulos_con_stock()).values('n')), Value(0)
+        ),
+        'valor_total': Coalesce(
+            Subquery(stocks.annotate(valor=_valor_stock()).values('valor')),
+            Value(CERO), output_field=VALOR
+        ),
+    }
+
+
+def _valoracion_key(almacen_id):
+    return f'inventory:valoracion:{almacen_id}'
+
+
+def calcular_valoracion(almacen_ids):
+    """Utility function para calcular {almacen_id: (total_articulos, valor_total)} con un agregado"""
+    valores = {almacen_id: (0, CERO) for almacen_id in almacen_ids}
+    rows = (
+        ArticuloStock._base_manager.filter(almacen_id__in=almacen_ids)
+        .order_by().values('almacen_id')
+        .annotate(total_articulos=_articulos_con_stock(), valor_total=_valor_stock())
+    )
+    for row in rows:
+        valores[row['almacen_id']] = (row['total_articulos'], row['valor_total'] or CERO)
+    return valores
+
+
+def get_valoracion(almacen_ids):
+    """
+    Utility function para obtener la valoración de varios almacenes en una
+    consulta. Con la caché activada se leen de la instantánea cacheada y solo
+    se calculan los que falten.
+    """
+    almacen_ids = list(almacen_ids)
+    timeout = getattr(settings, 'ALMACEN_VALORACION_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return calcular_valoracion(almacen_ids)
+
+    keys = {_valoracion_key(almacen_id): almacen_id for almacen_id in almacen_ids}
+    cached = cache.get_many(keys)
+    valores = {keys[key]: valor for key, valor in cached.items()}
+    faltan = [almacen_id for almacen_id in almacen_ids if almacen_id not in valores]
+    if faltan:
+        calculados = calcular_valoracion(faltan)
+        cache.set_many({_valoracion_key(almacen_id): valor for almacen_id, valor in calculados.items()}, timeout)
+        valores.update(calculados)
+    return valores
+
+
+def invalidar_valoracion(almacen_ids):
+    """
+    Utility function para invalidar la instantánea de los almacenes. Se borra
+    ya y otra vez al confirmar la transacción, por si otra lectura la ha vuelto
+    a cachear con el stock anterior.
+    """
+    keys = [_valoracion_key(almacen_id) for almacen_id in set(almacen_ids)]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,17 +1,21 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Sum, F, Count, Case, When, IntegerField, DecimalField
-from django.db import transaction
-from django.utils import timezone
 from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
 
 from .models import (
     Almacen, ArticuloStock, MovimientoStock, 
     TransferenciaStock, TransferenciaStockItem
 )
+from .services import StockInsuficienteError, TransferenciaStockService
+from .historico import StockHistoricoService, cierre_dia
+from .valoracion import valoracion_annotations
 from .serializers import (
     AlmacenSerializer, ArticuloStockSerializer, MovimientoStockSerializer,
     MovimientoStockCreateSerializer, TransferenciaStockSerializer,
@@ -20,6 +24,8 @@ from .serializers import (
 )
 from products.models import Articulo
 from accounts.permissions import HasEmpresaPermission
+from core.fechas import parse_fecha, rango_fechas
+from core.mixins import StreamingExportMixin
 
 
 class AlmacenViewSet(viewsets.ModelViewSet):
@@ -34,7 +40,11 @@ class AlmacenViewSet(viewsets.ModelViewSet):
     ordering = ['nombre']
     
     def get_queryset(self):
-        return Almacen.objects.all()
+        queryset = Almacen.objects.all()
+        if self.action == 'list':
+            # Valoración de toda la página en la misma consulta
+            queryset = queryset.annotate(**valoracion_annotations())
+        return queryset
     
     @action(detail=True, methods=['get'])
     def stock(self, request, pk=None):
@@ -65,19 +75,16 @@ class AlmacenViewSet(viewsets.ModelViewSet):
     def movimientos(self, request, pk=None):
         """Obtiene los movimientos de stock del almacén"""
         almacen = self.get_object()
+        # Rango semiabierto sobre fecha: cada rama del OR usa su índice (empresa, almacen*, fecha)
+        rango = rango_fechas(
+            'fecha', request.query_params.get('fecha_desde'), request.query_params.get('fecha_hasta')
+        )
         movimientos = MovimientoStock.objects.filter(
-            Q(almacen=almacen) | Q(almacen_destino=almacen)
+            Q(almacen=almacen, **rango) | Q(almacen_destino=almacen, **rango)
+        ).select_related(
+            'articulo', 'almacen', 'almacen_destino', 'usuario'
         ).order_by('-fecha')
         
-        # Filtro por fechas
-        fecha_desde = request.query_params.get('fecha_desde')
-        fecha_hasta = request.query_params.get('fecha_hasta')
-        
-        if fecha_desde:
-            movimientos = movimientos.filter(fecha__date__gte=fecha_desde)
-        if fecha_hasta:
-            movimientos = movimientos.filter(fecha__date__lte=fecha_hasta)
-        
         # Filtro por tipo
         tipo = request.query_params.get('tipo')
         if tipo:
@@ -92,6 +99,33 @@ class AlmacenViewSet(viewsets.ModelViewSet):
         serializer = MovimientoStockSerializer(movimientos, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def stock_a_fecha(self, request, pk=None):
+        """
+        Stock valorado del almacén al cierre de ?fecha=YYYY-MM-DD (opcional
+        ?articulo=). Parte de la instantánea o del stock actual más cercano y
+        solo suma los movimientos intermedios.
+        """
+        almacen = self.get_object()
+        if not request.query_params.get('fecha'):
+            return Response({'fecha': 'Parámetro obligatorio (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        fecha = parse_fecha(request.query_params['fecha'])
+        articulo = request.query_params.get('articulo')
+        if articulo and not articulo.isdigit():
+            return Response({'articulo': 'ID de artículo no válido'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        valoracion = StockHistoricoService.valoracion_a_fecha(
+            almacen, cierre_dia(fecha), articulo_ids=[int(articulo)] if articulo else None
+        )
+        return Response({
+            'almacen': almacen.id,
+            'fecha': fecha,
+            'instantanea': valoracion['referencia'],
+            'total_articulos': len(valoracion['articulos']),
+            'valor_total': valoracion['valor_total'],
+            'articulos': valoracion['articulos'],
+        })
+    
     @action(detail=False, methods=['get'])
     def principal(self, request):
         """Obtiene el almacén principal de la empresa"""
@@ -106,6 +140,13 @@ class AlmacenViewSet(viewsets.ModelViewSet):
             )
 
 
+class StockResumenPagination(PageNumberPagination):
+    """Paginación del resumen y de las alertas de stock"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
 class ArticuloStockViewSet(viewsets.ModelViewSet):
     """ViewSet para gestión de stock por artículo"""
     
@@ -122,83 +163,116 @@ class ArticuloStockViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def resumen(self, request):
-        """Obtiene resumen de stock por artículo (suma de todos los almacenes)"""
-        # Obtener todos los artículos con su stock total
-        articulos_stock = ArticuloStock.objects.values(
-            'articulo__id', 'articulo__nombre', 'articulo__codigo'
+        """
+        Resumen de stock por artículo (suma de todos los almacenes) con el
+        detalle por almacén. Paginado por artículo: una consulta para la
+        página de totales y otra, ordenada, para el detalle de esos artículos,
+        que se agrupa en una sola pasada. Filtros: ?categoria=, ?marca=, ?almacen=
+        """
+        filtros = {
+            'categoria': 'articulo__categoria_id',
+            'marca': 'articulo__marca_id',
+            'almacen': 'almacen_id',
+        }
+        stocks = ArticuloStock.objects.all()
+        for param, lookup in filtros.items():
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            if not value.isdigit():
+                return Response({param: f'ID de {param} no válido'}, status=status.HTTP_400_BAD_REQUEST)
+            stocks = stocks.filter(**{lookup: int(value)})
+        
+        articulos_stock = stocks.values(
+            'articulo_id', 'articulo__nombre'
         ).annotate(
             stock_total=Sum('stock_actual'),
             stock_reservado_total=Sum('stock_reservado'),
             stock_disponible_total=Sum(F('stock_actual') - F('stock_reservado')),
-            valor_total=Sum(F('stock_actual') * F('articulo__precio_venta'))
-        ).filter(stock_total__gt=0)
-        
-        # Agregar detalle por almacén
-        resumen = []
-        for item in articulos_stock:
-            almacenes_detail = ArticuloStock.objects.filter(
-                articulo_id=item['articulo__id'],
-                stock_actual__gt=0
-            ).values(
-                'almacen__id', 'almacen__nombre', 'almacen__codigo',
-                'stock_actual', 'stock_reservado', 'stock_minimo'
-            ).annotate(
-                stock_disponible=F('stock_actual') - F('stock_reservado')
+            valor_total=Sum(
+                F('stock_actual') * F('articulo__precio'),
+                output_field=DecimalField(max_digits=15, decimal_places=2)
             )
-            
-            resumen.append({
-                'articulo_id': item['articulo__id'],
+        ).filter(stock_total__gt=0).order_by('articulo__nombre', 'articulo_id')
+        
+        paginator = StockResumenPagination()
+        pagina = paginator.paginate_queryset(articulos_stock, request, view=self)
+        
+        # Detalle por almacén de los artículos de la página, en una consulta
+        detalle = stocks.filter(
+            articulo_id__in=[item['articulo_id'] for item in pagina],
+            stock_actual__gt=0
+        ).order_by('articulo_id', 'almacen__nombre').values(
+            'articulo_id', 'almacen__id', 'almacen__nombre', 'almacen__codigo',
+            'stock_actual', 'stock_reservado', 'stock_minimo'
+        ).annotate(
+            stock_disponible=F('stock_actual') - F('stock_reservado')
+        )
+        almacenes = {
+            articulo_id: [{k: v for k, v in fila.items() if k != 'articulo_id'} for fila in filas]
+            for articulo_id, filas in groupby(detalle, key=itemgetter('articulo_id'))
+        }
+        
+        resumen = [
+            {
+                'articulo_id': item['articulo_id'],
                 'articulo_nombre': item['articulo__nombre'],
-                'articulo_codigo': item['articulo__codigo'],
+                'articulo_codigo': None,  # Articulo no tiene código propio
                 'stock_total': item['stock_total'],
                 'stock_reservado_total': item['stock_reservado_total'],
                 'stock_disponible_total': item['stock_disponible_total'],
                 'valor_total': item['valor_total'] or Decimal('0.00'),
-                'almacenes': list(almacenes_detail)
-            })
+                'almacenes': almacenes.get(item['articulo_id'], [])
+            }
+            for item in pagina
+        ]
         
         serializer = StockResumenSerializer(resumen, many=True)
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def alertas(self, request):
-        """Obtiene alertas de stock bajo"""
-        stock_bajo = ArticuloStock.objects.filter(
-            stock_actual__lte=F('stock_minimo'),
-            stock_minimo__gt=0
-        ).select_related('articulo', 'almacen')
-        
-        alertas = []
-        for stock in stock_bajo:
-            diferencia = stock.stock_minimo - stock.stock_actual
-            
-            # Determinar urgencia
-            if stock.stock_actual == 0:
-                urgencia = 'critica'
-            elif diferencia >= stock.stock_minimo * 0.5:
-                urgencia = 'alta'
-            else:
-                urgencia = 'media'
-            
-            alertas.append({
-                'articulo_id': stock.articulo.id,
-                'articulo_nombre': stock.articulo.nombre,
-                'articulo_codigo': stock.articulo.codigo,
-                'almacen_id': stock.almacen.id,
-                'almacen_nombre': stock.almacen.nombre,
-                'almacen_codigo': stock.almacen.codigo,
-                'stock_actual': stock.stock_actual,
-                'stock_minimo': stock.stock_minimo,
-                'diferencia': diferencia,
-                'urgencia': urgencia
-            })
-        
-        # Ordenar por urgencia
-        orden_urgencia = {'critica': 0, 'alta': 1, 'media': 2}
-        alertas.sort(key=lambda x: orden_urgencia[x['urgencia']])
-        
-        serializer = AlertaStockSerializer(alertas, many=True)
-        return Response(serializer.data)
+        """
+        Alertas de stock bajo, de más a menos urgentes. La urgencia se mantiene
+        al cambiar el stock (ArticuloStock.urgencia), así que es una lectura
+        paginada del índice (empresa, urgencia). Filtro: ?urgencia=critica|alta|media
+        """
+        alertas = ArticuloStock.objects.filter(urgencia__isnull=False)
+        urgencia = request.query_params.get('urgencia')
+        if urgencia:
+            codigos = {label: code for code, label in ArticuloStock.URGENCIA_CHOICES}
+            if urgencia not in codigos:
+                return Response(
+                    {'detail': f"urgencia no válida: {urgencia}. Opciones: {', '.join(codigos)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            alertas = alertas.filter(urgencia=codigos[urgencia])
+        alertas = alertas.order_by('urgencia', 'id').values(
+            'urgencia', 'articulo_id', 'articulo__nombre',
+            'almacen_id', 'almacen__nombre', 'almacen__codigo',
+            'stock_actual', 'stock_minimo'
+        ).annotate(diferencia=F('stock_minimo') - F('stock_actual'))
+        
+        paginator = StockResumenPagination()
+        pagina = paginator.paginate_queryset(alertas, request, view=self)
+        etiquetas = dict(ArticuloStock.URGENCIA_CHOICES)
+        
+        serializer = AlertaStockSerializer([
+            {
+                'articulo_id': row['articulo_id'],
+                'articulo_nombre': row['articulo__nombre'],
+                'articulo_codigo': None,  # Articulo no tiene código propio
+                'almacen_id': row['almacen_id'],
+                'almacen_nombre': row['almacen__nombre'],
+                'almacen_codigo': row['almacen__codigo'],
+                'stock_actual': row['stock_actual'],
+                'stock_minimo': row['stock_minimo'],
+                'diferencia': row['diferencia'],
+                'urgencia': etiquetas[row['urgencia']]
+            }
+            for row in pagina
+        ], many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['post'])
     def ajuste_masivo(self, request):
@@ -210,7 +284,7 @@ class ArticuloStockViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class MovimientoStockViewSet(viewsets.ReadOnlyModelViewSet):
+class MovimientoStockViewSet(StreamingExportMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet para consulta de movimientos de stock"""
     
     serializer_class = MovimientoStockSerializer
@@ -220,6 +294,12 @@ class MovimientoStockViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['articulo__nombre', 'articulo__codigo', 'almacen__nombre', 'observaciones']
     ordering_fields = ['fecha', 'cantidad', 'stock_posterior']
     ordering = ['-fecha']
+    export_fields = (
+        'id', 'fecha', 'tipo', 'motivo', 'articulo_id', 'articulo__nombre',
+        'almacen__nombre', 'almacen_destino__nombre', 'cantidad',
+        'stock_anterior', 'stock_posterior', 'precio_unitario',
+        'usuario__username', 'observaciones',
+    )
     
     def get_queryset(self):
         return MovimientoStock.objects.select_related(
@@ -242,31 +322,15 @@ class MovimientoStockViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def estadisticas(self, request):
         """Obtiene estadísticas de movimientos"""
-        fecha_desde = request.query_params.get('fecha_desde')
-        fecha_hasta = request.query_params.get('fecha_hasta')
-        
-        movimientos = self.get_queryset()
-        
-        if fecha_desde:
-            movimientos = movimientos.filter(fecha__date__gte=fecha_desde)
-        if fecha_hasta:
-            movimientos = movimientos.filter(fecha__date__lte=fecha_hasta)
+        # Sin select_related: los agregados solo necesitan el join con almacén
+        movimientos = MovimientoStock.objects.filter(**rango_fechas(
+            'fecha', request.query_params.get('fecha_desde'), request.query_params.get('fecha_hasta')
+        ))
         
-        # Estadísticas por tipo
-        por_tipo = movimientos.values('tipo').annotate(
-            total=Count('id'),
-            cantidad_total=Sum('cantidad')
-        ).order_by('tipo')
-        
-        # Estadísticas por almacén
-        por_almacen = movimientos.values('almacen__nombre', 'almacen__codigo').annotate(
+        # Estadísticas por tipo (con el valor y el total de movimientos en la misma pasada)
+        por_tipo = list(movimientos.values('tipo').annotate(
             total=Count('id'),
-            entradas=Count(Case(When(cantidad__gt=0, then=1), output_field=IntegerField())),
-            salidas=Count(Case(When(cantidad__lt=0, then=1), output_field=IntegerField()))
-        ).order_by('almacen__nombre')
-        
-        # Valor de movimientos
-        valor_total = movimientos.aggregate(
+            cantidad_total=Sum('cantidad'),
             valor_entradas=Sum(
                 Case(
                     When(cantidad__gt=0, then=F('cantidad') * F('precio_unitario')),
@@ -281,14 +345,25 @@ class MovimientoStockViewSet(viewsets.ReadOnlyModelViewSet):
                     output_field=DecimalField()
                 )
             )
-        )
+        ).order_by('tipo'))
+        
+        # Estadísticas por almacén
+        por_almacen = movimientos.values('almacen__nombre', 'almacen__codigo').annotate(
+            total=Count('id'),
+            entradas=Count(Case(When(cantidad__gt=0, then=1), output_field=IntegerField())),
+            salidas=Count(Case(When(cantidad__lt=0, then=1), output_field=IntegerField()))
+        ).order_by('almacen__nombre')
+        
+        # Valor de movimientos
+        valor_entradas = sum((fila.pop('valor_entradas') or 0 for fila in por_tipo), Decimal('0.00'))
+        valor_salidas = sum((fila.pop('valor_salidas') or 0 for fila in por_tipo), Decimal('0.00'))
         
         return Response({
-            'total_movimientos': movimientos.count(),
-            'por_tipo': list(por_tipo),
+            'total_movimientos': sum(fila['total'] for fila in por_tipo),
+            'por_tipo': por_tipo,
             'por_almacen': list(por_almacen),
-            'valor_entradas': valor_total['valor_entradas'] or Decimal('0.00'),
-            'valor_salidas': valor_total['valor_salidas'] or Decimal('0.00')
+            'valor_entradas': valor_entradas,
+            'valor_salidas': valor_salidas
         })
 
 
@@ -347,67 +422,19 @@ class TransferenciaStockViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        with transaction.atomic():
-            # Verificar stock disponible para todos los items
-            for item in transferencia.items.all():
-                try:
-                    stock = ArticuloStock.objects.get(
-                        articulo=item.articulo,
-                        almacen=transferencia.almacen_origen
-                    )
-                    if stock.stock_disponible < item.cantidad_solicitada:
-                        return Response(
-                            {
-                                'detail': f'Stock insuficiente para {item.articulo.nombre}. '
-                                         f'Disponible: {stock.stock_disponible}, Solicitado: {item.cantidad_solicitada}'
-                            },
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                except ArticuloStock.DoesNotExist:
-                    return Response(
-                        {'detail': f'No hay stock para {item.articulo.nombre} en {transferencia.almacen_origen.nombre}'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            
-            # Crear movimientos de salida y reservar stock
-            for item in transferencia.items.all():
-                stock = ArticuloStock.objects.get(
-                    articulo=item.articulo,
-                    almacen=transferencia.almacen_origen
-                )
-                
-                # Reservar stock
-                stock.stock_reservado += item.cantidad_solicitada
-                stock.save()
-                
-                # Crear movimiento de salida
-                MovimientoStock.objects.create(
-                    articulo=item.articulo,
-                    almacen=transferencia.almacen_origen,
-                    tipo='transferencia_salida',
-                    motivo='transferencia',
-                    cantidad=-item.cantidad_solicitada,
-                    stock_anterior=stock.stock_actual,
-                    stock_posterior=stock.stock_actual - item.cantidad_solicitada,
-                    observaciones=f'Transferencia {transferencia.numero} hacia {transferencia.almacen_destino.nombre}',
-                    almacen_destino=transferencia.almacen_destino,
-                    usuario=request.user
-                )
-                
-                # Actualizar stock actual
-                stock.stock_actual -= item.cantidad_solicitada
-                stock.stock_reservado -= item.cantidad_solicitada
-                stock.save()
-                
-                # Actualizar cantidad enviada
-                item.cantidad_enviada = item.cantidad_solicitada
-                item.save()
-            
-            # Actualizar estado de transferencia
-            transferencia.estado = 'en_transito'
-            transferencia.fecha_envio = timezone.now()
-            transferencia.enviado_por = request.user
-            transferencia.save()
+        try:
+            TransferenciaStockService.enviar(transferencia, request.user)
+        except StockInsuficienteError as e:
+            articulo = next(item.articulo for item in transferencia.items.all() if item.articulo_id == e.articulo_id)
+            return Response(
+                {
+                    'detail': f'Stock insuficiente para {articulo.nombre}. '
+                             f'Disponible: {e.disponible}, Solicitado: {e.solicitado}'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(transferencia)
         return Response(serializer.data)
@@ -423,51 +450,10 @@ class TransferenciaStockViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        cantidades_recibidas = request.data.get('cantidades', {})
-        
-        with transaction.atomic():
-            # Crear movimientos de entrada
-            for item in transferencia.items.all():
-                cantidad_recibida = cantidades_recibidas.get(
-                    str(item.id), 
-                    item.cantidad_enviada
-                )
-                
-                if cantidad_recibida > 0:
-                    # Obtener o crear stock en destino
-                    stock_destino, created = ArticuloStock.objects.get_or_create(
-                        articulo=item.articulo,
-                        almacen=transferencia.almacen_destino,
-                        defaults={'stock_actual': 0}
-                    )
-                    
-                    # Crear movimiento de entrada
-                    MovimientoStock.objects.create(
-                        articulo=item.articulo,
-                        almacen=transferencia.almacen_destino,
-                        tipo='transferencia_entrada',
-                        motivo='transferencia',
-                        cantidad=cantidad_recibida,
-                        stock_anterior=stock_destino.stock_actual,
-                        stock_posterior=stock_destino.stock_actual + cantidad_recibida,
-                        observaciones=f'Transferencia {transferencia.numero} desde {transferencia.almacen_origen.nombre}',
-                        almacen_destino=transferencia.almacen_origen,
-                        usuario=request.user
-                    )
-                    
-                    # Actualizar stock
-                    stock_destino.stock_actual += cantidad_recibida
-                    stock_destino.save()
-                
-                # Actualizar cantidad recibida
-                item.cantidad_recibida = cantidad_recibida
-                item.save()
-            
-            # Actualizar estado de transferencia
-            transferencia.estado = 'completada'
-            transferencia.fecha_recepcion = timezone.now()
-            transferencia.recibido_por = request.user
-            transferencia.save()
+        try:
+            TransferenciaStockService.recibir(transferencia, request.user, request.data.get('cantidades'))
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(transferencia)
         return Response(serializer.data)
@@ -483,39 +469,10 @@ class TransferenciaStockViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        with transaction.atomic():
-            # Si está en tránsito, liberar stock reservado
-            if transferencia.estado == 'en_transito':
-                for item in transferencia.items.all():
-                    if item.cantidad_enviada > item.cantidad_recibida:
-                        # Devolver stock al almacén origen
-                        stock_origen = ArticuloStock.objects.get(
-                            articulo=item.articulo,
-                            almacen=transferencia.almacen_origen
-                        )
-                        
-                        cantidad_devolver = item.cantidad_enviada - item.cantidad_recibida
-                        
-                        # Crear movimiento de entrada (devolución)
-                        MovimientoStock.objects.create(
-                            articulo=item.articulo,
-                            almacen=transferencia.almacen_origen,
-                            tipo='entrada',
-                            motivo='devolucion_proveedor',
-                            cantidad=cantidad_devolver,
-                            stock_anterior=stock_origen.stock_actual,
-                            stock_posterior=stock_origen.stock_actual + cantidad_devolver,
-                            observaciones=f'Cancelación de transferencia {transferencia.numero}',
-                            usuario=request.user
-                        )
-                        
-                        # Actualizar stock
-                        stock_origen.stock_actual += cantidad_devolver
-                        stock_origen.save()
-            
-            # Cambiar estado
-            transferencia.estado = 'cancelada'
-            transferencia.save()
+        try:
+            TransferenciaStockService.cancelar(transferencia, request.user)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(transferencia)
         return Response(serializer.data)
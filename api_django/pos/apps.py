@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pos'
+    
+    def ready(self):
+        # Modelos auditados
+        from audit.registry import audit_registry
+        audit_registry.register(self.get_model('CajaSession'), audit_delete=False)
+        audit_registry.register(self.get_model('MovimientoCaja'), audit_delete=False)
@@ -16,6 +16,7 @@ from .serializers import (
     CerrarCajaSerializer, EstadisticasCajaSerializer
 )
 from accounts.permissions import HasEmpresaPermission, IsOwnerOrEmpresaAdmin
+from reporting.services import SalesFactService, periodo
 
 
 class CajaSessionViewSet(viewsets.ModelViewSet):
@@ -360,47 +361,24 @@ class EstadisticasPOSViewSet(viewsets.ViewSet):
         )
         sesiones_activas = sesiones_hoy.filter(estado='abierta')
         
-        # Movimientos y ventas
-        movimientos_hoy = MovimientoCaja.objects.filter(
-            created_at__date=hoy,
-            tipo='venta'
+        # Ventas (tabla de hechos): los tres periodos en una sola query
+        ventas = SalesFactService.resumen_tpv(
+            hoy=periodo(hoy, hoy),
+            ultimos_7_dias=periodo(hace_7_dias),
+            ultimos_30_dias=periodo(hace_30_dias)
         )
         
-        movimientos_7d = MovimientoCaja.objects.filter(
-            created_at__date__gte=hace_7_dias,
-            tipo='venta'
+        # Métodos de pago hoy
+        metodos_pago_hoy = SalesFactService.metodos_pago_tpv(hoy, hoy).values(
+            'metodo_pago', 'total', 'cantidad'
         )
         
-        movimientos_30d = MovimientoCaja.objects.filter(
-            created_at__date__gte=hace_30_dias,
+        # El desglose por usuario no está en la tabla de hechos
+        movimientos_7d = MovimientoCaja.objects.filter(
+            created_at__date__gte=hace_7_dias,
             tipo='venta'
         )
         
-        # Estadísticas del día
-        ventas_hoy = movimientos_hoy.aggregate(
-            total=Sum('importe'),
-            cantidad=Count('id'),
-            promedio=Avg('importe')
-        )
-        
-        # Comparativa 7 días
-        ventas_7d = movimientos_7d.aggregate(
-            total=Sum('importe'),
-            cantidad=Count('id')
-        )
-        
-        # Comparativa 30 días
-        ventas_30d = movimientos_30d.aggregate(
-            total=Sum('importe'),
-            cantidad=Count('id')
-        )
-        
-        # Métodos de pago hoy
-        metodos_pago_hoy = movimientos_hoy.values('metodo_pago').annotate(
-            total=Sum('importe'),
-            cantidad=Count('id')
-        )
-        
         # Top usuarios por ventas (últimos 7 días)
         top_usuarios = movimientos_7d.values(
             'caja_session__usuario__username',
@@ -415,11 +393,7 @@ class EstadisticasPOSViewSet(viewsets.ViewSet):
             'fecha': hoy,
             'sesiones_activas': sesiones_activas.count(),
             'total_sesiones_hoy': sesiones_hoy.count(),
-            'ventas': {
-                'hoy': ventas_hoy,
-                'ultimos_7_dias': ventas_7d,
-                'ultimos_30_dias': ventas_30d
-            },
+            'ventas': ventas,
             'metodos_pago_hoy': metodos_pago_hoy,
             'top_usuarios_7d': top_usuarios
         })
@@ -439,38 +413,28 @@ class EstadisticasPOSViewSet(viewsets.ViewSet):
                 fecha_apertura__date__lte=fecha_fin
             )
             
-            # Movimientos del período
-            movimientos = MovimientoCaja.objects.filter(
-                created_at__date__gte=fecha_inicio,
-                created_at__date__lte=fecha_fin,
-                tipo='venta'
-            )
+            # Ventas del período (tabla de hechos)
+            resumen = SalesFactService.resumen_tpv(periodo=periodo(fecha_inicio, fecha_fin))['periodo']
+            metodos_pago = list(SalesFactService.metodos_pago_tpv(fecha_inicio, fecha_fin))
             
             # Cálculos principales
             total_sesiones = sesiones.count()
-            total_ventas = movimientos.aggregate(Sum('importe'))['importe__sum'] or Decimal('0')
+            total_ventas = resumen['total'] or Decimal('0')
             
             # Efectivo vs Tarjeta
-            efectivo = movimientos.filter(
-                Q(metodo_pago='efectivo') | Q(metodo_pago='mixto')
-            ).aggregate(
-                total=Sum(
-                    models.Case(
-                        models.When(metodo_pago='efectivo', then='importe'),
-                        models.When(metodo_pago='mixto', then='importe_efectivo'),
-                        default=0
-                    )
-                )
-            )['total'] or Decimal('0')
-            
+            efectivo = sum((m['efectivo'] for m in metodos_pago), Decimal('0'))
             tarjeta = total_ventas - efectivo
             
             # Promedios
             promedio_ventas_sesion = total_ventas / total_sesiones if total_sesiones > 0 else Decimal('0')
-            promedio_ticket = movimientos.aggregate(Avg('importe'))['importe__avg'] or Decimal('0')
+            promedio_ticket = resumen['promedio'] or Decimal('0')
             
-            # Usuarios más activos
-            usuarios_activos = movimientos.values(
+            # Usuarios más activos (el desglose por usuario no está en la tabla de hechos)
+            usuarios_activos = MovimientoCaja.objects.filter(
+                created_at__date__gte=fecha_inicio,
+                created_at__date__lte=fecha_fin,
+                tipo='venta'
+            ).values(
                 'caja_session__usuario__username'
             ).annotate(
                 total_ventas=Sum('importe'),
@@ -478,11 +442,15 @@ class EstadisticasPOSViewSet(viewsets.ViewSet):
             ).order_by('-total_ventas')[:10]
             
             # Distribución por método de pago
-            distribucion_pagos = movimientos.values('metodo_pago').annotate(
-                total=Sum('importe'),
-                cantidad=Count('id'),
-                porcentaje=Sum('importe') * 100 / total_ventas if total_ventas > 0 else 0
-            )
+            distribucion_pagos = [
+                {
+                    'metodo_pago': m['metodo_pago'],
+                    'total': m['total'],
+                    'cantidad': m['cantidad'],
+                    'porcentaje': m['total'] * 100 / total_ventas if total_ventas > 0 else 0
+                }
+                for m in metodos_pago
+            ]
             
             response_data = {
                 'fecha_inicio': fecha_inicio,
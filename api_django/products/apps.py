@@ -5,3 +5,15 @@ class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
     verbose_name = 'Gestión de Productos'
+    
+    def ready(self):
+        # Modelos auditados
+        from audit.registry import audit_registry
+        audit_registry.register(self.get_model('Articulo'))
+        
+        # Búsqueda indexada
+        from search.registry import search_registry
+        search_registry.register(
+            self.get_model('Articulo'), fields={'nombre': 3, 'modelo': 2, 'descripcion': 1},
+            compact=('modelo',)
+        )
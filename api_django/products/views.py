@@ -1,6 +1,9 @@
 from django.shortcuts import render
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.filters import OrderingFilter
+from django_filters.rest_framework import DjangoFilterBackend
+from search.filters import IndexedSearchFilter
 from .models import Categoria, Marca, Articulo
 from .serializers import CategoriaSerializer, MarcaSerializer, ArticuloSerializer
 
@@ -34,6 +37,8 @@ class ArticuloViewSet(viewsets.ModelViewSet):
     queryset = Articulo.objects.all()  # Para el router
     serializer_class = ArticuloSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, IndexedSearchFilter]
+    search_fields = ['nombre', 'modelo', 'descripcion']
     
     def get_queryset(self):
         """Retorna el queryset filtrado por tenant"""
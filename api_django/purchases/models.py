@@ -1,8 +1,10 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import F, Value
 from decimal import Decimal
 from tenants.models import TenantModelMixin
+from core.documentos import aggregate_totals
 from core.models import AbstractBaseDocument, AbstractBaseItem
 
 
@@ -22,11 +24,8 @@ class AbstractBasePurchaseDocument(TenantModelMixin, models.Model):
         abstract = True
     
     def calculate_totals(self):
-        """Calcula totales basándose en los items relacionados"""
-        items = self.get_items()
-        self.subtotal = sum(item.subtotal for item in items)
-        self.iva = sum(item.iva_amount for item in items)
-        self.total = self.subtotal + self.iva
+        """Calcula totales con un único agregado SQL sobre los items y los guarda con un UPDATE"""
+        self.subtotal, self.iva, self.total = aggregate_totals(self.get_items())
         self.save(update_fields=['subtotal', 'iva', 'total'])
     
     def get_items(self):
@@ -49,6 +48,17 @@ class AbstractBasePurchaseItem(TenantModelMixin, models.Model):
     class Meta:
         abstract = True
     
+    @classmethod
+    def subtotal_expression(cls):
+        """Subtotal de la línea (con descuento) como expresión SQL"""
+        descuento = Value(Decimal('1')) - F('descuento_porcentaje') * Value(Decimal('0.01'))
+        return F('cantidad') * F('precio_unitario') * descuento
+    
+    @classmethod
+    def iva_expression(cls):
+        """IVA de la línea como expresión SQL (equivale a la propiedad iva_amount)"""
+        return cls.subtotal_expression() * F('iva_porcentaje') * Value(Decimal('0.01'))
+    
     @property
     def precio_con_descuento(self):
         """Calcula el precio unitario con descuento aplicado"""
@@ -5,7 +5,7 @@ from .models import (
     PedidoCompra, PedidoCompraItem, AlbaranCompra, AlbaranCompraItem,
     FacturaCompra, FacturaCompraItem, CuentaPorPagar
 )
-from inventory.models import MovimientoStock, ArticuloStock
+from inventory.services import StockLedgerService
 from audit.services import AuditService
 
 
@@ -261,51 +261,16 @@ class PurchaseStockService:
         """
         Crea un movimiento de stock de entrada por compra
         """
-        # Obtener o crear el registro de stock del artículo en el almacén
-        article_stock, created = ArticuloStock.objects.get_or_create(
-            empresa=almacen.empresa,
-            articulo=articulo,
-            almacen=almacen,
-            defaults={
-                'stock_actual': 0,
-                'stock_minimo': 0,
-                'stock_maximo': 0,
-                'precio_promedio': precio_unitario
-            }
-        )
-        
-        # Calcular nuevo stock y precio promedio
-        stock_anterior = article_stock.stock_actual
-        stock_posterior = stock_anterior + cantidad
-        
-        # Actualizar precio promedio ponderado
-        if stock_anterior > 0:
-            valor_actual = stock_anterior * article_stock.precio_promedio
-            valor_nuevo = cantidad * precio_unitario
-            nuevo_precio_promedio = (valor_actual + valor_nuevo) / stock_posterior
-        else:
-            nuevo_precio_promedio = precio_unitario
-        
-        # Actualizar stock
-        article_stock.stock_actual = stock_posterior
-        article_stock.precio_promedio = nuevo_precio_promedio
-        article_stock.save()
-        
-        # Crear movimiento de stock
-        movimiento = MovimientoStock.objects.create(
-            empresa=almacen.empresa,
-            articulo=articulo,
-            almacen=almacen,
+        movimiento, = StockLedgerService.aplicar(
+            almacen, [(articulo.id, cantidad, precio_unitario)],
             tipo='entrada',
             motivo='compra',
-            cantidad=cantidad,
-            stock_anterior=stock_anterior,
-            stock_posterior=stock_posterior,
-            precio_unitario=precio_unitario,
-            documento_origen=documento_origen,
+            documento=documento_origen,
             usuario=user,
             observaciones=f'Entrada por compra - {documento_origen}'
         )
+        stock_anterior = movimiento.stock_anterior
+        stock_posterior = movimiento.stock_posterior
         
         # Auditoría
         AuditService.log_business_event(
@@ -17,9 +17,16 @@ from .serializers import (
     FacturaCompraItemSerializer, CuentaPorPagarSerializer
 )
 from .filters import PedidoCompraFilter, AlbaranCompraFilter, FacturaCompraFilter, CuentaPorPagarFilter
+from core.mixins import StreamingExportMixin
+
+# Columnas de ?format=csv / ndjson comunes a los documentos de compra
+EXPORT_FIELDS = (
+    'id', 'numero', 'fecha', 'estado', 'proveedor__nombre', 'proveedor__cif_nif',
+    'subtotal', 'iva', 'total',
+)
 
 
-class PedidoCompraViewSet(viewsets.ModelViewSet):
+class PedidoCompraViewSet(StreamingExportMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de pedidos de compra
     
@@ -36,6 +43,7 @@ class PedidoCompraViewSet(viewsets.ModelViewSet):
     search_fields = ['numero', 'proveedor__nombre', 'referencia_proveedor']
     ordering_fields = ['fecha', 'numero', 'total']
     ordering = ['-fecha']
+    export_fields = EXPORT_FIELDS + ('fecha_esperada', 'referencia_proveedor')
     
     def get_queryset(self):
         return PedidoCompra.objects.all()
@@ -96,7 +104,7 @@ class PedidoCompraItemViewSet(viewsets.ModelViewSet):
         return PedidoCompraItem.objects.all()
 
 
-class AlbaranCompraViewSet(viewsets.ModelViewSet):
+class AlbaranCompraViewSet(StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de albaranes de compra"""
     serializer_class = AlbaranCompraSerializer
     permission_classes = [IsAuthenticated]
@@ -105,6 +113,7 @@ class AlbaranCompraViewSet(viewsets.ModelViewSet):
     search_fields = ['numero', 'proveedor__nombre']
     ordering_fields = ['fecha', 'numero', 'total']
     ordering = ['-fecha']
+    export_fields = EXPORT_FIELDS + ('numero_albaran_proveedor', 'almacen__nombre')
     
     def get_queryset(self):
         return AlbaranCompra.objects.all()
@@ -121,7 +130,7 @@ class AlbaranCompraItemViewSet(viewsets.ModelViewSet):
         return AlbaranCompraItem.objects.all()
 
 
-class FacturaCompraViewSet(viewsets.ModelViewSet):
+class FacturaCompraViewSet(StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de facturas de compra"""
     serializer_class = FacturaCompraSerializer
     permission_classes = [IsAuthenticated]
@@ -130,6 +139,7 @@ class FacturaCompraViewSet(viewsets.ModelViewSet):
     search_fields = ['numero', 'numero_factura_proveedor', 'proveedor__nombre']
     ordering_fields = ['fecha', 'fecha_vencimiento', 'total']
     ordering = ['-fecha']
+    export_fields = EXPORT_FIELDS + ('numero_factura_proveedor', 'fecha_vencimiento', 'fecha_pago')
     
     def get_queryset(self):
         return FacturaCompra.objects.all()
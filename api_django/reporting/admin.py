@@ -0,0 +1,19 @@
+from django.contrib import admin
+from .models import VentaDiaria
+
+
+@admin.register(VentaDiaria)
+class VentaDiariaAdmin(admin.ModelAdmin):
+    list_display = [
+        'fecha', 'tipo_documento', 'serie', 'articulo', 'metodo_pago',
+        'num_documentos', 'cantidad', 'total', 'empresa'
+    ]
+    list_filter = ['tipo_documento', 'fecha', 'empresa']
+    date_hierarchy = 'fecha'
+    ordering = ['-fecha']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class ReportingConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'reporting'
+    verbose_name = 'Reporting - Hechos agregados'
+
+    def ready(self):
+        # Mantener la tabla de hechos al crear, editar o borrar documentos
+        import reporting.signals
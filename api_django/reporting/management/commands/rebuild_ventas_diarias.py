@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Empresa
+from reporting.services import TIPOS, SalesFactService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla de hechos de ventas (VentaDiaria) para un rango de fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (YYYY-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final (YYYY-MM-DD)')
+        parser.add_argument('--empresa', type=int, action='append', help='ID de empresa (repetible). Por defecto todas')
+        parser.add_argument('--tipo', action='append', choices=TIPOS, help='Tipo de documento (repetible). Por defecto todos')
+
+    def handle(self, *args, **options):
+        desde = self._parse_date(options['desde'])
+        hasta = self._parse_date(options['hasta'])
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+
+        empresas = Empresa.objects.order_by('id')
+        if options['empresa']:
+            empresas = empresas.filter(id__in=options['empresa'])
+
+        total = 0
+        for empresa in empresas:
+            filas = SalesFactService.rebuild(empresa.id, desde, hasta, tipos=options['tipo'])
+            total += filas
+            self.stdout.write(f'{empresa.nombre}: {filas} filas')
+
+        self.stdout.write(self.style.SUCCESS(f'Ventas diarias reconstruidas: {total} filas'))
+
+    @staticmethod
+    def _parse_date(value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Fecha no válida: {value} (formato YYYY-MM-DD)')
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:38
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0002_userinvitation'),
+        ('core', '0006_serie'),
+        ('products', '0004_articulo_empresa_categoria_empresa_marca_empresa_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_documento', models.CharField(choices=[('presupuesto', 'Presupuesto'), ('pedido', 'Pedido'), ('albaran', 'Albarán'), ('ticket', 'Ticket'), ('factura', 'Factura'), ('tpv', 'Venta TPV')], max_length=20)),
+                ('metodo_pago', models.CharField(blank=True, default='', help_text='Solo ventas TPV', max_length=20)),
+                ('num_documentos', models.PositiveIntegerField(default=0)),
+                ('num_lineas', models.PositiveIntegerField(default=0)),
+                ('cantidad', models.PositiveBigIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('iva', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('importe_efectivo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Parte cobrada en efectivo (solo ventas TPV)', max_digits=15)),
+                ('articulo', models.ForeignKey(blank=True, help_text='Vacío en las filas de cabecera', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.articulo')),
+                ('empresa', models.ForeignKey(help_text='Empresa a la que pertenece este registro', on_delete=django.db.models.deletion.CASCADE, to='accounts.empresa', verbose_name='Empresa')),
+                ('serie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.serie')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria',
+                'verbose_name_plural': 'Ventas diarias',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['empresa', 'tipo_documento', 'fecha'], name='reporting_v_empresa_bc7c37_idx'), models.Index(fields=['empresa', 'fecha'], name='reporting_v_empresa_3838b3_idx')],
+            },
+        ),
+    ]
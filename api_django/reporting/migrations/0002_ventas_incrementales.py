@@ -0,0 +1,65 @@
+# Generated by Django 5.2.3 on 2026-10-17 13:37
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def eliminar_duplicados(apps, schema_editor):
+    """Deja una sola fila por grano antes de crear la restricción única"""
+    VentaDiaria = apps.get_model('reporting', 'VentaDiaria')
+    grano = ['empresa_id', 'tipo_documento', 'fecha', 'serie_id', 'articulo_id', 'metodo_pago']
+    repetidos = (
+        VentaDiaria.objects.order_by().values(*grano)
+        .annotate(primera=Min('id'), n=models.Count('id')).filter(n__gt=1)
+    )
+    for fila in repetidos:
+        VentaDiaria.objects.filter(
+            **{campo: fila[campo] for campo in grano}
+        ).exclude(id=fila['primera']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userinvitation'),
+        ('core', '0009_remove_tags'),
+        ('products', '0004_articulo_empresa_categoria_empresa_marca_empresa_and_more'),
+        ('reporting', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaAportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_documento', models.CharField(choices=[('presupuesto', 'Presupuesto'), ('pedido', 'Pedido'), ('albaran', 'Albarán'), ('ticket', 'Ticket'), ('factura', 'Factura'), ('tpv', 'Venta TPV')], max_length=20)),
+                ('documento_id', models.PositiveBigIntegerField()),
+                ('fecha', models.DateField()),
+                ('hechos', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name': 'Aportación a ventas diarias',
+                'verbose_name_plural': 'Aportaciones a ventas diarias',
+            },
+        ),
+        migrations.RunPython(eliminar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ventadiaria',
+            constraint=models.UniqueConstraint(models.F('empresa'), models.F('tipo_documento'), models.F('fecha'), django.db.models.functions.comparison.Coalesce('serie', models.Value(0)), django.db.models.functions.comparison.Coalesce('articulo', models.Value(0)), models.F('metodo_pago'), name='reporting_venta_diaria_grano_uniq'),
+        ),
+        migrations.AddField(
+            model_name='ventaaportacion',
+            name='empresa',
+            field=models.ForeignKey(help_text='Empresa a la que pertenece este registro', on_delete=django.db.models.deletion.CASCADE, to='accounts.empresa', verbose_name='Empresa'),
+        ),
+        migrations.AddIndex(
+            model_name='ventaaportacion',
+            index=models.Index(fields=['empresa', 'tipo_documento', 'fecha'], name='reporting_v_empresa_302e2e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ventaaportacion',
+            unique_together={('tipo_documento', 'documento_id')},
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def rellenar_ventas_diarias(apps, schema_editor):
+    """
+    Calcula VentaDiaria y VentaAportacion para las ventas existentes.
+
+    Usa SalesFactService con los modelos actuales, no los históricos. En una
+    BD nueva no hay empresas y no hace nada; si falla al migrar una BD
+    antigua, basta con ejecutar después rebuild_ventas_diarias.
+    """
+    from reporting.services import SalesFactService
+
+    Empresa = apps.get_model('accounts', 'Empresa')
+    for empresa_id in Empresa.objects.order_by('id').values_list('id', flat=True):
+        SalesFactService.rebuild(empresa_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0002_ventas_incrementales'),
+        ('sales', '0007_factura_presupuesto'),
+        ('pos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_ventas_diarias, migrations.RunPython.noop),
+    ]
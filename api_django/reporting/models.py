@@ -0,0 +1,97 @@
+from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from decimal import Decimal
+from tenants.models import TenantModelMixin
+
+
+class VentaDiaria(TenantModelMixin, models.Model):
+    """
+    Hechos de venta agregados por día.
+
+    Una fila por (empresa, fecha, tipo de documento, serie, artículo). Las
+    filas con artículo vacío son de cabecera: llevan el número de documentos
+    y los importes de los documentos; las filas con artículo llevan las
+    líneas, unidades e importes de ese artículo. En el TPV (tipo 'tpv') solo
+    hay filas de cabecera, una por método de pago.
+    """
+
+    TIPO_CHOICES = [
+        ('presupuesto', 'Presupuesto'),
+        ('pedido', 'Pedido'),
+        ('albaran', 'Albarán'),
+        ('ticket', 'Ticket'),
+        ('factura', 'Factura'),
+        ('tpv', 'Venta TPV'),
+    ]
+
+    fecha = models.DateField()
+    tipo_documento = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    serie = models.ForeignKey(
+        'core.Serie', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+'
+    )
+    articulo = models.ForeignKey(
+        'products.Articulo', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='+', help_text="Vacío en las filas de cabecera"
+    )
+    metodo_pago = models.CharField(max_length=20, blank=True, default='', help_text="Solo ventas TPV")
+
+    # Métricas
+    num_documentos = models.PositiveIntegerField(default=0)
+    num_lineas = models.PositiveIntegerField(default=0)
+    cantidad = models.PositiveBigIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    iva = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    importe_efectivo = models.DecimalField(
+        max_digits=15, decimal_places=2, default=Decimal('0.00'),
+        help_text="Parte cobrada en efectivo (solo ventas TPV)"
+    )
+
+    class Meta:
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['empresa', 'tipo_documento', 'fecha']),
+            models.Index(fields=['empresa', 'fecha']),
+        ]
+        constraints = [
+            # Una fila por grano. Serie y artículo vacíos (cabeceras) cuentan
+            # como 0 para que NULL no permita filas repetidas
+            models.UniqueConstraint(
+                F('empresa'), F('tipo_documento'), F('fecha'),
+                Coalesce('serie', Value(0)), Coalesce('articulo', Value(0)), F('metodo_pago'),
+                name='reporting_venta_diaria_grano_uniq',
+            ),
+        ]
+        verbose_name = "Venta diaria"
+        verbose_name_plural = "Ventas diarias"
+
+    def __str__(self):
+        return f"{self.get_tipo_documento_display()} {self.fecha} ({self.total})"
+
+
+class VentaAportacion(TenantModelMixin, models.Model):
+    """
+    Lo que un documento (o una venta del TPV) ha sumado a VentaDiaria.
+
+    El mantenimiento incremental compara la aportación actual del documento
+    con la guardada y solo aplica la diferencia. hechos es una lista de
+    [serie, artículo, método de pago, *métricas] con los importes como texto.
+    """
+
+    tipo_documento = models.CharField(max_length=20, choices=VentaDiaria.TIPO_CHOICES)
+    documento_id = models.PositiveBigIntegerField()
+    fecha = models.DateField()
+    hechos = models.JSONField(default=list)
+
+    class Meta:
+        unique_together = ['tipo_documento', 'documento_id']
+        indexes = [
+            models.Index(fields=['empresa', 'tipo_documento', 'fecha']),
+        ]
+        verbose_name = "Aportación a ventas diarias"
+        verbose_name_plural = "Aportaciones a ventas diarias"
+
+    def __str__(self):
+        return f"{self.tipo_documento} {self.documento_id} ({self.fecha})"
@@ -0,0 +1,427 @@
+"""
+Servicios de la tabla de hechos de ventas (VentaDiaria).
+
+Cada documento (o venta del TPV) aporta a unas filas de VentaDiaria: una de
+cabecera (serie) y una por artículo de sus líneas. La aportación aplicada se
+guarda en VentaAportacion. El mantenimiento incremental (apply) recalcula
+solo los documentos tocados, resta su aportación anterior, suma la nueva y
+aplica la diferencia con UPDATE ... SET campo = campo + delta sobre el grano
+(empresa, tipo, fecha, serie, artículo, método de pago): el coste depende
+del documento y no del volumen del día.
+
+La reconstrucción por rango de fechas (rebuild) borra los días y los vuelve
+a calcular sumando las aportaciones de sus documentos, así que da las mismas
+filas que el mantenimiento incremental.
+
+La migración reporting 0003 rellena las tablas con rebuild para todas las
+empresas. Un día sin ninguna aportación guardada (p.ej. ventas cargadas sin
+señales) se reconstruye entero la primera vez que se añade o edita uno de
+sus documentos. Las escrituras sin señales (queryset.update/delete,
+importaciones por SQL) se corrigen con el comando rebuild_ventas_diarias.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import VentaAportacion, VentaDiaria
+
+logger = logging.getLogger(__name__)
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+CENT = Decimal('0.01')
+
+TIPOS_DOCUMENTO = ('presupuesto', 'pedido', 'albaran', 'ticket', 'factura')
+TIPO_TPV = 'tpv'
+TIPOS = TIPOS_DOCUMENTO + (TIPO_TPV,)
+
+# Métricas de VentaDiaria en el orden en que se guardan las aportaciones
+METRICAS = ('num_documentos', 'num_lineas', 'cantidad', 'subtotal', 'iva', 'total', 'importe_efectivo')
+METRICAS_ENTERAS = 3
+
+# Documentos por consulta al reconstruir
+REBUILD_CHUNK = 1000
+
+# Documentos que cuentan como venta de producto (mismo criterio que tenía el reporte)
+TIPOS_VENTA_PRODUCTO = ('pedido', 'ticket', 'albaran')
+
+# Criterio del ranking de productos -> ordenación
+RANKINGS_PRODUCTO = {
+    'cantidad': ('-total_cantidad', '-total_importe', 'articulo_id'),
+    'importe': ('-total_importe', '-total_cantidad', 'articulo_id'),
+}
+
+
+def document_sources():
+    """Tipo de documento -> (modelo documento, modelo item, campo del item hacia el documento)"""
+    from sales.models import (
+        Presupuesto, PresupuestoItem, Pedido, PedidoItem, Albaran, AlbaranItem,
+        Ticket, TicketItem, Factura, FacturaItem
+    )
+    return {
+        'presupuesto': (Presupuesto, PresupuestoItem, 'presupuesto'),
+        'pedido': (Pedido, PedidoItem, 'pedido'),
+        'albaran': (Albaran, AlbaranItem, 'albaran'),
+        'ticket': (Ticket, TicketItem, 'ticket'),
+        'factura': (Factura, FacturaItem, 'factura'),
+    }
+
+
+def _date_filter(field, fechas=None, fecha_inicio=None, fecha_fin=None):
+    filters = {}
+    if fechas is not None:
+        filters[f'{field}__in'] = sorted(fechas)
+    if fecha_inicio:
+        filters[f'{field}__gte'] = fecha_inicio
+    if fecha_fin:
+        filters[f'{field}__lte'] = fecha_fin
+    return filters
+
+
+def _money(value):
+    return (value or Decimal('0')).quantize(CENT)
+
+
+def _metricas(**valores):
+    return tuple(valores.get(metrica, 0) for metrica in METRICAS)
+
+
+def _sumar(a, b, signo=1):
+    return tuple(x + signo * y for x, y in zip(a, b))
+
+
+def _to_json(hechos):
+    return [
+        [*grano, *metricas[:METRICAS_ENTERAS], *(str(valor) for valor in metricas[METRICAS_ENTERAS:])]
+        for grano, metricas in sorted(hechos.items(), key=lambda item: _orden_grano(item[0]))
+    ]
+
+
+def _from_json(filas):
+    return {
+        tuple(fila[:3]): (*fila[3:3 + METRICAS_ENTERAS], *(Decimal(valor) for valor in fila[3 + METRICAS_ENTERAS:]))
+        for fila in filas
+    }
+
+
+def _orden_grano(grano):
+    *claves, metodo_pago = grano
+    return (*(clave or 0 for clave in claves), metodo_pago)
+
+
+def aportaciones(tipo, ids):
+    """
+    Utility function para calcular lo que aportan a VentaDiaria los documentos
+    (o movimientos de caja) indicados.
+    Retorna {id: (empresa_id, fecha, {(serie_id, articulo_id, metodo_pago): métricas})};
+    los que ya no existen no aparecen.
+    """
+    if tipo == TIPO_TPV:
+        return _aportaciones_tpv(ids)
+
+    document_model, item_model, document_field = document_sources()[tipo]
+    resultado, series = {}, {}
+    for doc_id, empresa_id, fecha, serie_id, subtotal, iva, total in document_model._base_manager.filter(
+        pk__in=ids
+    ).values_list('id', 'empresa_id', 'fecha', 'serie_id', 'subtotal', 'iva', 'total'):
+        series[doc_id] = serie_id
+        resultado[doc_id] = (empresa_id, fecha, {
+            (serie_id, None, ''): _metricas(
+                num_documentos=1, subtotal=_money(subtotal), iva=_money(iva), total=_money(total)
+            ),
+        })
+
+    importe = F('cantidad') * F('precio_unitario')
+    items = item_model._base_manager.filter(
+        **{f'{document_field}_id__in': list(resultado)}
+    ).order_by().values('articulo_id', documento=F(f'{document_field}_id')).annotate(
+        lineas=Count('id'),
+        unidades=Sum('cantidad'),
+        suma_subtotal=Sum(importe, output_field=MONEY),
+        suma_iva=Sum(importe * F('iva_porcentaje') * Value(Decimal('0.01')), output_field=MONEY),
+    )
+    for row in items:
+        subtotal = _money(row['suma_subtotal'])
+        iva = _money(row['suma_iva'])
+        resultado[row['documento']][2][(series[row['documento']], row['articulo_id'], '')] = _metricas(
+            num_lineas=row['lineas'], cantidad=row['unidades'] or 0,
+            subtotal=subtotal, iva=iva, total=subtotal + iva,
+        )
+    return resultado
+
+
+def _aportaciones_tpv(ids):
+    from pos.models import MovimientoCaja
+
+    resultado = {}
+    for mov_id, empresa_id, created_at, serie_id, metodo_pago, importe, importe_efectivo in (
+        MovimientoCaja._base_manager.filter(pk__in=ids, tipo='venta').values_list(
+            'id', 'empresa_id', 'created_at', 'ticket__serie_id', 'metodo_pago', 'importe', 'importe_efectivo'
+        )
+    ):
+        if metodo_pago == 'efectivo':
+            efectivo = importe
+        elif metodo_pago == 'mixto':
+            efectivo = importe_efectivo
+        else:
+            efectivo = None
+        resultado[mov_id] = (empresa_id, timezone.localdate(created_at), {
+            (serie_id, None, metodo_pago): _metricas(
+                num_documentos=1, total=_money(importe), importe_efectivo=_money(efectivo)
+            ),
+        })
+    return resultado
+
+
+class SalesFactService:
+    """Mantenimiento y consulta de VentaDiaria"""
+
+    @staticmethod
+    def apply(tipo, ids):
+        """
+        Aplica a VentaDiaria el cambio de aportación de los documentos indicados
+        (creados, editados o borrados). Si otra transacción guarda a la vez la
+        primera aportación de un documento se reintenta una vez.
+        """
+        try:
+            return SalesFactService._apply(tipo, ids)
+        except IntegrityError:
+            return SalesFactService._apply(tipo, ids)
+
+    @staticmethod
+    @transaction.atomic
+    def _apply(tipo, ids):
+        ids = sorted(set(ids))
+        guardadas = {
+            aportacion.documento_id: aportacion
+            for aportacion in VentaAportacion._base_manager.select_for_update().filter(
+                tipo_documento=tipo, documento_id__in=ids
+            ).order_by('documento_id')
+        }
+        nuevas = aportaciones(tipo, ids)
+        sin_inicializar = SalesFactService._dias_sin_inicializar(tipo, {
+            (empresa_id, fecha) for doc_id, (empresa_id, fecha, _) in nuevas.items() if doc_id not in guardadas
+        })
+
+        deltas = defaultdict(lambda: _metricas())
+        for aportacion in guardadas.values():
+            for grano, metricas in _from_json(aportacion.hechos).items():
+                key = (aportacion.empresa_id, aportacion.fecha, *grano)
+                deltas[key] = _sumar(deltas[key], metricas, -1)
+        for empresa_id, fecha, hechos in nuevas.values():
+            for grano, metricas in hechos.items():
+                key = (empresa_id, fecha, *grano)
+                deltas[key] = _sumar(deltas[key], metricas)
+
+        tocados = defaultdict(set)
+        # Orden fijo para que dos transacciones bloqueen las filas en el mismo orden
+        for key in sorted(deltas, key=_orden_grano):
+            if any(deltas[key]):
+                SalesFactService._sumar_hecho(tipo, key, deltas[key])
+                tocados[key[0]].add(key[1])
+        for empresa_id, fechas in tocados.items():
+            VentaDiaria._base_manager.filter(
+                empresa_id=empresa_id, tipo_documento=tipo, fecha__in=sorted(fechas),
+                num_documentos=0, num_lineas=0
+            ).delete()
+
+        SalesFactService._guardar_aportaciones(tipo, guardadas, nuevas)
+
+        dias = defaultdict(set)
+        for empresa_id, fecha in sin_inicializar:
+            dias[empresa_id].add(fecha)
+        for empresa_id, fechas in dias.items():
+            SalesFactService._rebuild(empresa_id, tipo, fechas=fechas)
+        return len(deltas)
+
+    @staticmethod
+    def _dias_sin_inicializar(tipo, dias):
+        """Días (empresa, fecha) sin ninguna aportación guardada (se reconstruyen enteros)"""
+        if not dias:
+            return set()
+        filtros = {
+            'tipo_documento': tipo,
+            'empresa_id__in': {empresa_id for empresa_id, _ in dias},
+            'fecha__in': sorted({fecha for _, fecha in dias}),
+        }
+        con_aportaciones = set(VentaAportacion._base_manager.filter(**filtros).order_by().values_list(
+            'empresa_id', 'fecha'
+        ).distinct())
+        return dias - con_aportaciones
+
+    @staticmethod
+    def _sumar_hecho(tipo, key, delta):
+        empresa_id, fecha, serie_id, articulo_id, metodo_pago = key
+        grano = VentaDiaria._base_manager.filter(
+            empresa_id=empresa_id, tipo_documento=tipo, fecha=fecha,
+            serie_id=serie_id, articulo_id=articulo_id, metodo_pago=metodo_pago
+        )
+        cambios = {metrica: F(metrica) + valor for metrica, valor in zip(METRICAS, delta) if valor}
+        if grano.update(**cambios):
+            return
+        if any(valor < 0 for valor in delta):
+            logger.warning(f"Ventas diarias sin la fila a descontar ({tipo}, {key}): usa rebuild_ventas_diarias")
+            return
+        try:
+            with transaction.atomic():
+                VentaDiaria._base_manager.create(
+                    empresa_id=empresa_id, tipo_documento=tipo, fecha=fecha,
+                    serie_id=serie_id, articulo_id=articulo_id, metodo_pago=metodo_pago,
+                    **dict(zip(METRICAS, delta))
+                )
+        except IntegrityError:
+            # Otra transacción ha creado la fila entre el UPDATE y el INSERT
+            grano.update(**cambios)
+
+    @staticmethod
+    def _guardar_aportaciones(tipo, guardadas, nuevas):
+        borradas = [doc_id for doc_id in guardadas if doc_id not in nuevas]
+        if borradas:
+            VentaAportacion._base_manager.filter(tipo_documento=tipo, documento_id__in=borradas).delete()
+
+        cambiadas, creadas = [], []
+        for doc_id, (empresa_id, fecha, hechos) in nuevas.items():
+            aportacion = guardadas.get(doc_id)
+            if aportacion is None:
+                creadas.append(VentaAportacion(
+                    empresa_id=empresa_id, tipo_documento=tipo, documento_id=doc_id,
+                    fecha=fecha, hechos=_to_json(hechos)
+                ))
+            else:
+                aportacion.fecha = fecha
+                aportacion.hechos = _to_json(hechos)
+                cambiadas.append(aportacion)
+        VentaAportacion._base_manager.bulk_update(cambiadas, ['fecha', 'hechos'])
+        VentaAportacion._base_manager.bulk_create(creadas)
+
+    @staticmethod
+    def rebuild(empresa_id, fecha_inicio=None, fecha_fin=None, tipos=None):
+        """Reconstruye los hechos de una empresa en un rango de fechas. Retorna las filas creadas"""
+        return sum(
+            SalesFactService._rebuild(empresa_id, tipo, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+            for tipo in (tipos or TIPOS)
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def _rebuild(empresa_id, tipo, **dates):
+        """Recalcula días completos sumando las aportaciones de sus documentos"""
+        for model in (VentaDiaria, VentaAportacion):
+            model._base_manager.filter(
+                empresa_id=empresa_id, tipo_documento=tipo, **_date_filter('fecha', **dates)
+            ).delete()
+
+        if tipo == TIPO_TPV:
+            from pos.models import MovimientoCaja
+            documentos = MovimientoCaja._base_manager.filter(
+                empresa_id=empresa_id, tipo='venta', **_date_filter('created_at__date', **dates)
+            )
+        else:
+            documentos = document_sources()[tipo][0]._base_manager.filter(
+                empresa_id=empresa_id, **_date_filter('fecha', **dates)
+            )
+        ids = list(documentos.order_by('pk').values_list('pk', flat=True))
+
+        hechos = defaultdict(lambda: _metricas())
+        for start in range(0, len(ids), REBUILD_CHUNK):
+            chunk = ids[start:start + REBUILD_CHUNK]
+            # Aportaciones guardadas en otra fecha (documentos que han cambiado de día)
+            VentaAportacion._base_manager.filter(tipo_documento=tipo, documento_id__in=chunk).delete()
+            creadas = []
+            for doc_id, (doc_empresa_id, fecha, aportacion) in aportaciones(tipo, chunk).items():
+                for grano, metricas in aportacion.items():
+                    hechos[(fecha, *grano)] = _sumar(hechos[(fecha, *grano)], metricas)
+                creadas.append(VentaAportacion(
+                    empresa_id=doc_empresa_id, tipo_documento=tipo, documento_id=doc_id,
+                    fecha=fecha, hechos=_to_json(aportacion)
+                ))
+            VentaAportacion._base_manager.bulk_create(creadas, batch_size=500)
+
+        facts = [
+            VentaDiaria(
+                empresa_id=empresa_id, tipo_documento=tipo, fecha=fecha,
+                serie_id=serie_id, articulo_id=articulo_id, metodo_pago=metodo_pago,
+                **dict(zip(METRICAS, metricas))
+            )
+            for (fecha, serie_id, articulo_id, metodo_pago), metricas in hechos.items()
+        ]
+        VentaDiaria._base_manager.bulk_create(facts, batch_size=500)
+        return len(facts)
+
+    # Consultas de los reportes (filtradas por el tenant actual)
+
+    @staticmethod
+    def documentos(tipo, fecha_inicio=None, fecha_fin=None):
+        """Filas de cabecera de un tipo de documento"""
+        return VentaDiaria.objects.filter(
+            tipo_documento=tipo, articulo__isnull=True,
+            **_date_filter('fecha', fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+        )
+
+    @staticmethod
+    def facturacion_mensual(fecha_inicio):
+        """Número de facturas e importe por mes"""
+        return SalesFactService.documentos('factura', fecha_inicio).annotate(
+            mes=TruncMonth('fecha')
+        ).values('mes').annotate(
+            total_facturas=Sum('num_documentos'),
+            total_importe=Sum('total')
+        ).order_by('mes')
+
+    @staticmethod
+    def productos_mas_vendidos(fecha_inicio=None, fecha_fin=None, limit=10,
+                               ordenar_por='cantidad', tipos=TIPOS_VENTA_PRODUCTO):
+        """
+        Top-N de artículos por unidades (ordenar_por='cantidad') o por importe
+        ('importe'). Agrupación, orden y LIMIT se resuelven en la BD.
+        """
+        return VentaDiaria.objects.filter(
+            tipo_documento__in=tipos, articulo__isnull=False,
+            **_date_filter('fecha', fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+        ).values('articulo_id', articulo_nombre=F('articulo__nombre')).annotate(
+            total_cantidad=Sum('cantidad'),
+            total_importe=Sum('subtotal')
+        ).order_by(*RANKINGS_PRODUCTO[ordenar_por])[:limit]
+
+    @staticmethod
+    def resumen_tpv(**periodos):
+        """
+        Total, número de ventas y ticket medio del TPV para varios periodos en
+        una sola query. Cada periodo es un Q sobre 'fecha'.
+        """
+        aggregates = {}
+        for nombre, condicion in periodos.items():
+            aggregates[f'{nombre}__total'] = Sum('total', filter=condicion)
+            aggregates[f'{nombre}__cantidad'] = Coalesce(Sum('num_documentos', filter=condicion), 0)
+        row = SalesFactService.documentos(TIPO_TPV).aggregate(**aggregates)
+
+        resumen = {}
+        for nombre in periodos:
+            total = row[f'{nombre}__total']
+            cantidad = row[f'{nombre}__cantidad']
+            resumen[nombre] = {
+                'total': total,
+                'cantidad': cantidad,
+                'promedio': (total / cantidad).quantize(CENT) if cantidad else None,
+            }
+        return resumen
+
+    @staticmethod
+    def metodos_pago_tpv(fecha_inicio=None, fecha_fin=None):
+        """Ventas del TPV por método de pago"""
+        return SalesFactService.documentos(TIPO_TPV, fecha_inicio, fecha_fin).values(
+            'metodo_pago'
+        ).annotate(
+            total=Sum('total'),
+            cantidad=Sum('num_documentos'),
+            efectivo=Sum('importe_efectivo')
+        ).order_by('metodo_pago')
+
+
+def periodo(fecha_inicio=None, fecha_fin=None):
+    """Utility function para construir un periodo de resumen_tpv"""
+    return Q(**_date_filter('fecha', fecha_inicio=fecha_inicio, fecha_fin=fecha_fin))
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save
+
+from core.documentos import documents_bulk_created
+from pos.models import MovimientoCaja
+from .services import TIPO_TPV, document_sources
+from .tracker import sales_fact_tracker
+
+# Modelo -> tipo de documento; modelo de línea -> (tipo, campo hacia el documento)
+DOCUMENT_TIPOS = {}
+ITEM_SOURCES = {}
+
+
+def mark_document(sender, instance, using=None, **kwargs):
+    """Marca el documento (creado, editado o borrado)"""
+    sales_fact_tracker.mark(DOCUMENT_TIPOS[sender], instance.pk, using)
+
+
+def mark_item(sender, instance, using=None, **kwargs):
+    """Marca el documento al que pertenece la línea"""
+    tipo, document_field = ITEM_SOURCES[sender]
+    sales_fact_tracker.mark(tipo, getattr(instance, f'{document_field}_id'), using)
+
+
+def mark_documents_bulk(sender, documentos, **kwargs):
+    """Marca los documentos creados en bloque (sin post_save)"""
+    tipo = DOCUMENT_TIPOS.get(sender)
+    if tipo is None:
+        return
+    for documento in documentos:
+        sales_fact_tracker.mark(tipo, documento.pk)
+
+
+def mark_movimiento_caja(sender, instance, using=None, **kwargs):
+    """Marca una venta del TPV"""
+    if instance.tipo == 'venta':
+        sales_fact_tracker.mark(TIPO_TPV, instance.pk, using)
+
+
+for tipo, (document_model, item_model, document_field) in document_sources().items():
+    DOCUMENT_TIPOS[document_model] = tipo
+    ITEM_SOURCES[item_model] = (tipo, document_field)
+
+    post_save.connect(mark_document, sender=document_model, dispatch_uid=f'reporting_{tipo}_save')
+    post_delete.connect(mark_document, sender=document_model, dispatch_uid=f'reporting_{tipo}_delete')
+    post_save.connect(mark_item, sender=item_model, dispatch_uid=f'reporting_{tipo}_item_save')
+    post_delete.connect(mark_item, sender=item_model, dispatch_uid=f'reporting_{tipo}_item_delete')
+
+documents_bulk_created.connect(mark_documents_bulk, dispatch_uid='reporting_documents_bulk')
+post_save.connect(mark_movimiento_caja, sender=MovimientoCaja, dispatch_uid='reporting_tpv_save')
+post_delete.connect(mark_movimiento_caja, sender=MovimientoCaja, dispatch_uid='reporting_tpv_delete')
@@ -0,0 +1,326 @@
+"""
+Tests para la app reporting - Tabla de hechos de ventas
+"""
+import datetime
+import importlib
+import pytest
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from core.models import Serie
+from inventory.models import Almacen
+from products.models import Articulo
+from reporting.models import VentaAportacion, VentaDiaria
+from reporting.services import SalesFactService
+from sales.models import Ticket, TicketItem, Factura
+
+
+FECHA = datetime.date(2024, 3, 15)
+
+
+@pytest.fixture
+def serie(empresa):
+    almacen = Almacen._base_manager.create(nombre="Almacén Hechos", codigo="HEC", empresa=empresa)
+    return Serie._base_manager.create(nombre="Serie Hechos", empresa=empresa, almacen=almacen)
+
+
+@pytest.fixture
+def articulo(empresa):
+    return Articulo._base_manager.create(nombre="Artículo Hechos", precio=Decimal('10.00'), empresa=empresa)
+
+
+def crear_ticket(empresa, cliente, serie, articulo, numero="T-1", fecha=FECHA, cantidades=(2,)):
+    ticket = Ticket._base_manager.create(
+        numero=numero, cliente=cliente, serie=serie, empresa=empresa, fecha=fecha
+    )
+    for cantidad in cantidades:
+        TicketItem.objects.create(
+            ticket=ticket, articulo=articulo, cantidad=cantidad,
+            precio_unitario=Decimal('10.00'), iva_porcentaje=Decimal('21.00')
+        )
+    return ticket
+
+
+def hechos(empresa, **filters):
+    return VentaDiaria._base_manager.filter(empresa=empresa, **filters)
+
+
+@pytest.mark.django_db
+class TestVentaDiariaIncremental:
+    """Mantenimiento incremental de la tabla de hechos"""
+
+    def test_alta_documento_crea_hechos(self, empresa, cliente, serie, articulo, django_capture_on_commit_callbacks):
+        """Al hacer commit se crean la fila de cabecera y la del artículo"""
+        with django_capture_on_commit_callbacks(execute=True):
+            crear_ticket(empresa, cliente, serie, articulo, cantidades=(2, 3))
+
+        cabecera = hechos(empresa, tipo_documento='ticket', articulo__isnull=True).get()
+        assert cabecera.fecha == FECHA
+        assert cabecera.serie == serie
+        assert cabecera.num_documentos == 1
+        assert cabecera.total == Decimal('60.50')
+
+        linea = hechos(empresa, tipo_documento='ticket', articulo=articulo).get()
+        assert linea.num_lineas == 2
+        assert linea.cantidad == 5
+        assert linea.subtotal == Decimal('50.00')
+        assert linea.total == Decimal('60.50')
+
+    def test_cambios_de_una_transaccion_se_recalculan_una_vez(self, empresa, cliente, serie, articulo, django_capture_on_commit_callbacks):
+        """Documento y líneas de la misma transacción comparten un único callback"""
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                crear_ticket(empresa, cliente, serie, articulo, cantidades=(1, 1, 1))
+
+        assert len(callbacks) == 1
+        assert hechos(empresa, articulo=articulo).get().cantidad == 3
+
+    def test_rollback_descarta_cambios(self, empresa, cliente, serie, articulo, django_capture_on_commit_callbacks):
+        """Si la transacción hace rollback no se toca la tabla de hechos"""
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    crear_ticket(empresa, cliente, serie, articulo)
+                    raise RuntimeError("rollback")
+            except RuntimeError:
+                pass
+
+        assert callbacks == []
+        assert not hechos(empresa).exists()
+
+    def test_edicion_y_borrado(self, empresa, cliente, serie, articulo, django_capture_on_commit_callbacks):
+        """Editar una línea actualiza el día y borrar el documento lo vacía"""
+        with django_capture_on_commit_callbacks(execute=True):
+            ticket = crear_ticket(empresa, cliente, serie, articulo)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            item = ticket.ticketitem_set.get()
+            item.cantidad = 7
+            item.save()
+        assert hechos(empresa, articulo=articulo).get().cantidad == 7
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Ticket._base_manager.get(pk=ticket.pk).delete()
+        assert not hechos(empresa).exists()
+
+    def test_cambio_de_fecha_recalcula_ambos_dias(self, empresa, cliente, serie, articulo, django_capture_on_commit_callbacks):
+        """Mover un documento de día limpia el día anterior"""
+        with django_capture_on_commit_callbacks(execute=True):
+            crear_ticket(empresa, cliente, serie, articulo)
+
+        nueva_fecha = FECHA + datetime.timedelta(days=1)
+        with django_capture_on_commit_callbacks(execute=True):
+            ticket = Ticket._base_manager.get(numero="T-1")
+            ticket.fecha = nueva_fecha
+            ticket.save()
+
+        assert set(hechos(empresa).values_list('fecha', flat=True)) == {nueva_fecha}
+
+    @pytest.mark.performance
+    def test_coste_no_depende_del_volumen_del_dia(self, empresa, cliente, serie, articulo, django_capture_on_commit_callbacks):
+        """Editar un documento aplica su diferencia sin releer el resto del día"""
+        with django_capture_on_commit_callbacks(execute=True):
+            ticket = crear_ticket(empresa, cliente, serie, articulo)
+        item = ticket.ticketitem_set.get()
+
+        def editar(cantidad):
+            item.cantidad = cantidad
+            with CaptureQueriesContext(connection) as queries:
+                with django_capture_on_commit_callbacks(execute=True):
+                    item.save()
+            return len(queries)
+
+        consultas = editar(3)
+        with django_capture_on_commit_callbacks(execute=True):
+            for numero in range(20):
+                crear_ticket(empresa, cliente, serie, articulo, numero=f"T-{numero + 2}")
+
+        assert editar(4) == consultas
+        linea = hechos(empresa, articulo=articulo).get()
+        assert linea.cantidad == 4 + 20 * 2
+        assert linea.num_lineas == 21
+
+    def test_dia_sin_aportaciones_se_reconstruye(self, empresa, cliente, serie, articulo, django_capture_on_commit_callbacks):
+        """Un día con hechos anteriores a las aportaciones se recalcula entero la primera vez"""
+        with django_capture_on_commit_callbacks(execute=True):
+            crear_ticket(empresa, cliente, serie, articulo, numero="T-1")
+        VentaAportacion._base_manager.all().delete()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            crear_ticket(empresa, cliente, serie, articulo, numero="T-2")
+
+        cabecera = hechos(empresa, articulo__isnull=True).get()
+        assert cabecera.num_documentos == 2
+        assert hechos(empresa, articulo=articulo).get().cantidad == 4
+        assert VentaAportacion._base_manager.filter(empresa=empresa).count() == 2
+
+    def test_dia_sin_hechos_se_reconstruye(self, empresa, cliente, serie, articulo, django_capture_on_commit_callbacks):
+        """Un día con ventas que nunca llegaron a la tabla se calcula entero con la primera edición"""
+        with django_capture_on_commit_callbacks(execute=True):
+            crear_ticket(empresa, cliente, serie, articulo, numero="T-1")
+        VentaDiaria._base_manager.all().delete()
+        VentaAportacion._base_manager.all().delete()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            crear_ticket(empresa, cliente, serie, articulo, numero="T-2")
+
+        assert hechos(empresa, articulo__isnull=True).get().num_documentos == 2
+        assert hechos(empresa, articulo=articulo).get().cantidad == 4
+
+    def test_grano_unico(self, empresa):
+        """No puede haber dos filas de cabecera del mismo grano (serie y artículo vacíos)"""
+        VentaDiaria._base_manager.create(empresa=empresa, tipo_documento='factura', fecha=FECHA)
+
+        with pytest.raises(IntegrityError):
+            with transaction.atomic():
+                VentaDiaria._base_manager.create(empresa=empresa, tipo_documento='factura', fecha=FECHA)
+
+
+@pytest.mark.django_db
+class TestRebuildVentasDiarias:
+    """Reconstrucción por rango de fechas"""
+
+    def test_rebuild_equivale_al_incremental(self, empresa, cliente, serie, articulo, django_capture_on_commit_callbacks):
+        """El comando deja la tabla igual que el mantenimiento incremental"""
+        with django_capture_on_commit_callbacks(execute=True):
+            crear_ticket(empresa, cliente, serie, articulo, cantidades=(2, 3))
+        campos = ('tipo_documento', 'fecha', 'articulo_id', 'num_documentos', 'cantidad', 'total')
+        incremental = sorted(hechos(empresa).values_list(*campos), key=str)
+
+        VentaDiaria._base_manager.all().delete()
+        call_command('rebuild_ventas_diarias', '--desde', '2024-03-01', '--hasta', '2024-03-31', stdout=None)
+
+        assert sorted(hechos(empresa).values_list(*campos), key=str) == incremental
+
+    def test_migracion_rellena_las_ventas_existentes(self, empresa, cliente, serie, articulo):
+        """La migración de datos calcula los hechos de las ventas anteriores"""
+        from django.apps import apps
+        migracion = importlib.import_module('reporting.migrations.0003_rellenar_ventas_diarias')
+        crear_ticket(empresa, cliente, serie, articulo, cantidades=(2, 3))
+        VentaDiaria._base_manager.all().delete()
+        VentaAportacion._base_manager.all().delete()
+
+        migracion.rellenar_ventas_diarias(apps, None)
+
+        assert hechos(empresa, articulo__isnull=True).get().total == Decimal('60.50')
+        assert hechos(empresa, articulo=articulo).get().cantidad == 5
+        assert VentaAportacion._base_manager.filter(empresa=empresa).count() == 1
+
+    def test_rebuild_respeta_el_rango(self, empresa, cliente, serie, articulo):
+        """Solo se reconstruyen los días del rango"""
+        crear_ticket(empresa, cliente, serie, articulo, numero="T-1", fecha=FECHA)
+        crear_ticket(empresa, cliente, serie, articulo, numero="T-2", fecha=datetime.date(2024, 5, 1))
+
+        SalesFactService.rebuild(empresa.id, FECHA, FECHA)
+
+        assert set(hechos(empresa).values_list('fecha', flat=True)) == {FECHA}
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestReportesDesdeHechos:
+    """Los reportes leen la tabla de hechos"""
+
+    def test_productos_mas_vendidos(self, authenticated_client, empresa, cliente, serie, articulo):
+        """El top de productos sale de la tabla de hechos en una sola query"""
+        crear_ticket(empresa, cliente, serie, articulo, cantidades=(4,))
+        SalesFactService.rebuild(empresa.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get('/api/reportes/productos_mas_vendidos/')
+
+        assert response.status_code == status.HTTP_200_OK
+        top = response.data['productos_mas_vendidos']
+        assert top == [{
+            'articulo_id': articulo.id,
+            'articulo_nombre': articulo.nombre,
+            'total_cantidad': 4,
+            'total_importe': Decimal('40.00'),
+        }]
+        report_queries = [q for q in queries if 'reporting_ventadiaria' in q['sql']]
+        assert len(report_queries) == 1
+        assert not any('sales_ticketitem' in q['sql'] for q in queries)
+
+    def test_ranking_por_cantidad_o_importe(self, authenticated_client, empresa, cliente, serie, articulo):
+        """El top-N se ordena y limita en SQL por unidades o por importe"""
+        caro = Articulo._base_manager.create(nombre="Artículo Caro", precio=Decimal('100.00'), empresa=empresa)
+        ticket = crear_ticket(empresa, cliente, serie, articulo, cantidades=(10,))
+        TicketItem.objects.create(
+            ticket=ticket, articulo=caro, cantidad=2, precio_unitario=Decimal('100.00')
+        )
+        SalesFactService.rebuild(empresa.id)
+        url = '/api/reportes/productos_mas_vendidos/'
+
+        with CaptureQueriesContext(connection) as queries:
+            por_cantidad = authenticated_client.get(url, {'limit': 1})
+        (report_query,) = [q['sql'] for q in queries if 'reporting_ventadiaria' in q['sql']]
+        por_importe = authenticated_client.get(url, {'limit': 1, 'ordenar_por': 'importe'})
+
+        assert [p['articulo_id'] for p in por_cantidad.data['productos_mas_vendidos']] == [articulo.id]
+        assert por_importe.data['productos_mas_vendidos'] == [{
+            'articulo_id': caro.id,
+            'articulo_nombre': caro.nombre,
+            'total_cantidad': 2,
+            'total_importe': Decimal('200.00'),
+        }]
+        assert 'ORDER BY' in report_query and 'LIMIT 1' in report_query
+
+    def test_ranking_no_valido(self, authenticated_client):
+        """Un criterio de ordenación desconocido devuelve 400"""
+        response = authenticated_client.get('/api/reportes/productos_mas_vendidos/', {'ordenar_por': 'margen'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_facturacion_mensual(self, authenticated_client, empresa, cliente, serie):
+        """La facturación mensual suma las cabeceras de factura"""
+        from django.utils import timezone
+        hoy = timezone.now().date()
+        for numero in ("F-1", "F-2"):
+            Factura._base_manager.create(
+                numero=numero, cliente=cliente, serie=serie, empresa=empresa,
+                fecha=hoy, total=Decimal('100.00')
+            )
+        SalesFactService.rebuild(empresa.id)
+
+        response = authenticated_client.get('/api/reportes/facturacion_mensual/')
+
+        assert response.status_code == status.HTTP_200_OK
+        (mes,) = response.data['facturacion_mensual']
+        assert mes['total_facturas'] == 2
+        assert mes['total_importe'] == Decimal('200.00')
+
+    def test_ventas_tpv_por_metodo_de_pago(self, empresa, usuario, django_capture_on_commit_callbacks):
+        """Las ventas del TPV se agregan por método de pago, con la parte en efectivo"""
+        from django.utils import timezone
+        from pos.models import CajaSession, MovimientoCaja
+        from reporting.services import periodo
+        from tenants.utils import set_current_empresa_id
+
+        caja = CajaSession._base_manager.create(
+            empresa=empresa, usuario=usuario, nombre="Caja 1", saldo_inicial=Decimal('0')
+        )
+        with django_capture_on_commit_callbacks(execute=True):
+            MovimientoCaja._base_manager.create(
+                empresa=empresa, caja_session=caja, tipo='venta',
+                importe=Decimal('30.00'), metodo_pago='efectivo'
+            )
+            MovimientoCaja._base_manager.create(
+                empresa=empresa, caja_session=caja, tipo='venta', importe=Decimal('50.00'),
+                metodo_pago='mixto', importe_efectivo=Decimal('20.00'), importe_tarjeta=Decimal('30.00')
+            )
+            MovimientoCaja._base_manager.create(
+                empresa=empresa, caja_session=caja, tipo='entrada',
+                importe=Decimal('100.00'), metodo_pago='efectivo'
+            )
+
+        set_current_empresa_id(empresa.id)
+        hoy = timezone.localdate()
+        resumen = SalesFactService.resumen_tpv(hoy=periodo(hoy, hoy))['hoy']
+        metodos = {m['metodo_pago']: m for m in SalesFactService.metodos_pago_tpv(hoy, hoy)}
+
+        assert resumen == {'total': Decimal('80.00'), 'cantidad': 2, 'promedio': Decimal('40.00')}
+        assert metodos['efectivo']['efectivo'] == Decimal('30.00')
+        assert metodos['mixto']['efectivo'] == Decimal('20.00')
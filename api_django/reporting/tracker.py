@@ -0,0 +1,78 @@
+"""
+Mantenimiento incremental de VentaDiaria.
+
+Las señales de documentos, líneas y movimientos de caja marcan los
+documentos afectados (tipo, id). Dentro de una transacción las marcas se
+acumulan en un lote y su diferencia se aplica una sola vez con
+transaction.on_commit; si la transacción hace rollback el lote se descarta.
+Sin transacción el documento se aplica al momento.
+
+Las operaciones en bloque (queryset.update/delete, bulk_create) no envían
+señales: para esas está el comando rebuild_ventas_diarias.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    """Documentos pendientes de aplicar al hacer commit"""
+
+    def __init__(self):
+        self.keys = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        refresh_documents(self.keys)
+
+
+class SalesFactTracker:
+    """Acumula los documentos afectados por transacción (y por hilo)"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def mark(self, tipo, documento_id, using=None):
+        """Marca un documento como pendiente de aplicar"""
+        if not documento_id:
+            return
+
+        connection = transaction.get_connection(using)
+        if not connection.in_atomic_block:
+            refresh_documents({(tipo, documento_id)})
+            return
+
+        batch = getattr(self._local, 'batch', None)
+        if batch is None or batch.done or not self._is_pending(connection, batch):
+            # Primer cambio de la transacción (o el lote anterior ya se ejecutó o se descartó)
+            batch = self._local.batch = _Batch()
+            transaction.on_commit(batch, using=using)
+        batch.keys.add((tipo, documento_id))
+
+    @staticmethod
+    def _is_pending(connection, batch):
+        return any(callback is batch for _, callback, *_ in connection.run_on_commit)
+
+
+def refresh_documents(keys):
+    """Utility function para aplicar un conjunto de documentos (tipo, id)"""
+    from .services import SalesFactService
+
+    grouped = defaultdict(set)
+    for tipo, documento_id in keys:
+        grouped[tipo].add(documento_id)
+
+    for tipo, ids in grouped.items():
+        try:
+            SalesFactService.apply(tipo, ids)
+        except Exception as e:
+            logger.error(f"Error actualizando ventas diarias ({tipo}, documentos {sorted(ids)}): {e}")
+
+
+# Instancia única por proceso
+sales_fact_tracker = SalesFactTracker()
@@ -9,3 +9,10 @@ class SalesConfig(AppConfig):
     def ready(self):
         # Importar señales cuando la app esté lista
         import sales.signals
+        
+        # Modelos auditados
+        from audit.registry import audit_registry
+        for model_name in ('Ticket', 'Factura'):
+            audit_registry.register(self.get_model(model_name), level='HIGH')
+        for model_name in ('Presupuesto', 'Pedido', 'Albaran'):
+            audit_registry.register(self.get_model(model_name))
@@ -1,6 +1,7 @@
 from django.db import models
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from core.documentos import item_totals_deferred
 from core.models import AbstractBaseDocument, AbstractBaseItem
 
 
@@ -115,27 +116,38 @@ class FacturaItem(AbstractBaseItem):
     factura = models.ForeignKey(Factura, on_delete=models.CASCADE)
 
 
-# Señales para recalcular totales automáticamente
+# Señales para recalcular totales automáticamente (salvo en escrituras en
+# bloque, que calculan los totales una sola vez: ver core.documentos)
 @receiver([post_save, post_delete], sender=PresupuestoItem)
 def update_presupuesto_totals(sender, instance, **kwargs):
+    if item_totals_deferred():
+        return
     instance.presupuesto.calculate_totals()
 
 
 @receiver([post_save, post_delete], sender=PedidoItem)
 def update_pedido_totals(sender, instance, **kwargs):
+    if item_totals_deferred():
+        return
     instance.pedido.calculate_totals()
 
 
 @receiver([post_save, post_delete], sender=AlbaranItem)
 def update_albaran_totals(sender, instance, **kwargs):
+    if item_totals_deferred():
+        return
     instance.albaran.calculate_totals()
 
 
 @receiver([post_save, post_delete], sender=TicketItem)
 def update_ticket_totals(sender, instance, **kwargs):
+    if item_totals_deferred():
+        return
     instance.ticket.calculate_totals()
 
 
 @receiver([post_save, post_delete], sender=FacturaItem)
 def update_factura_totals(sender, instance, **kwargs):
+    if item_totals_deferred():
+        return
     instance.factura.calculate_totals()
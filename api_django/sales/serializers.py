@@ -1,4 +1,6 @@
+from django.db import transaction
 from rest_framework import serializers
+from core.documentos import DocumentWriteService
 from core.serializers import BaseDocumentSerializer, BaseItemSerializer
 from .models import (
     Presupuesto, PresupuestoItem,
@@ -7,7 +9,6 @@ from .models import (
     Ticket, TicketItem,
     Factura
 )
-from inventory.models import MovimientoStock, ArticuloStock
 
 # Serializers para Items
 class PresupuestoItemSerializer(BaseItemSerializer):
@@ -69,57 +70,11 @@ class AlbaranSerializer(BaseDocumentSerializer):
     def create(self, validated_data):
         """Crear albarán con sus items"""
         items_data = validated_data.pop('items', [])
-        albaran = Albaran.objects.create(**validated_data)
-        
-        # Crear items
-        for item_data in items_data:
-            AlbaranItem.objects.create(albaran=albaran, **item_data)
-        
-        # Calcular totales
-        albaran.calculate_totals()
-        
-        # DESCONTAR STOCK MANUALMENTE después de crear los items
-        if albaran.serie and albaran.serie.almacen:
-            almacen = albaran.serie.almacen
-            for item in albaran.albaranitem_set.all():
-                # Obtener stock actual antes del movimiento
-                try:
-                    stock_record = ArticuloStock.objects.get(
-                        empresa=albaran.empresa,
-                        articulo=item.articulo,
-                        almacen=almacen
-                    )
-                    stock_anterior = stock_record.stock_actual
-                    stock_posterior = max(0, stock_anterior - item.cantidad)
-                    
-                    # Crear movimiento de stock (salida)
-                    MovimientoStock.objects.create(
-                        empresa=albaran.empresa,
-                        articulo=item.articulo,
-                        almacen=almacen,
-                        tipo='salida',
-                        motivo='venta',
-                        cantidad=-item.cantidad,  # Negativo para salidas
-                        stock_anterior=stock_anterior,
-                        stock_posterior=stock_posterior,
-                        precio_unitario=item.precio_unitario,
-                        observaciones=f"Venta automática - Albarán {albaran.numero}",
-                        documento_origen=albaran
-                    )
-                    
-                    # Actualizar stock del artículo en el almacén
-                    stock_record.stock_actual = stock_posterior
-                    stock_record.save()
-                    
-                except ArticuloStock.DoesNotExist:
-                    # Crear registro de stock con valor 0
-                    ArticuloStock.objects.create(
-                        empresa=albaran.empresa,
-                        articulo=item.articulo,
-                        almacen=almacen,
-                        stock_actual=0,
-                        stock_minimo=0
-                    )
+        # Crear items (en bloque) y calcular totales una sola vez.
+        # El stock se descuenta en sales.signals.descontar_stock_en_venta
+        with transaction.atomic():
+            albaran = Albaran.objects.create(**validated_data)
+            DocumentWriteService.set_items(albaran, AlbaranItem, 'albaran', items_data)
         
         return albaran
     
@@ -146,57 +101,11 @@ class TicketSerializer(BaseDocumentSerializer):
     def create(self, validated_data):
         """Crear ticket con sus items"""
         items_data = validated_data.pop('items', [])
-        ticket = Ticket.objects.create(**validated_data)
-        
-        # Crear items
-        for item_data in items_data:
-            TicketItem.objects.create(ticket=ticket, **item_data)
-        
-        # Calcular totales
-        ticket.calculate_totals()
-        
-        # DESCONTAR STOCK MANUALMENTE después de crear los items
-        if ticket.serie and ticket.serie.almacen:
-            almacen = ticket.serie.almacen
-            for item in ticket.ticketitem_set.all():
-                # Obtener stock actual antes del movimiento
-                try:
-                    stock_record = ArticuloStock.objects.get(
-                        empresa=ticket.empresa,
-                        articulo=item.articulo,
-                        almacen=almacen
-                    )
-                    stock_anterior = stock_record.stock_actual
-                    stock_posterior = max(0, stock_anterior - item.cantidad)
-                    
-                    # Crear movimiento de stock (salida)
-                    MovimientoStock.objects.create(
-                        empresa=ticket.empresa,
-                        articulo=item.articulo,
-                        almacen=almacen,
-                        tipo='salida',
-                        motivo='venta',
-                        cantidad=-item.cantidad,  # Negativo para salidas
-                        stock_anterior=stock_anterior,
-                        stock_posterior=stock_posterior,
-                        precio_unitario=item.precio_unitario,
-                        observaciones=f"Venta automática - Ticket {ticket.numero}",
-                        documento_origen=ticket
-                    )
-                    
-                    # Actualizar stock del artículo en el almacén
-                    stock_record.stock_actual = stock_posterior
-                    stock_record.save()
-                    
-                except ArticuloStock.DoesNotExist:
-                    # Crear registro de stock con valor 0
-                    ArticuloStock.objects.create(
-                        empresa=ticket.empresa,
-                        articulo=item.articulo,
-                        almacen=almacen,
-                        stock_actual=0,
-                        stock_minimo=0
-                    )
+        # Crear items (en bloque) y calcular totales una sola vez.
+        # El stock se descuenta en sales.signals.descontar_stock_en_venta
+        with transaction.atomic():
+            ticket = Ticket.objects.create(**validated_data)
+            DocumentWriteService.set_items(ticket, TicketItem, 'ticket', items_data)
         
         return ticket
     
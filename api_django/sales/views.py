@@ -3,22 +3,34 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from core.mixins import ReadOnlyIfInvoicedMixin, DocumentConversionMixin
+from core.mixins import (
+    BulkDocumentCreateMixin, DocumentConversionMixin, ReadOnlyIfInvoicedMixin, StreamingExportMixin
+)
 from core.pdf_utils import generate_document_pdf
 from .models import (
-    Presupuesto, Pedido, Albaran, Ticket, Factura
+    Presupuesto, PresupuestoItem, Pedido, PedidoItem, Albaran, AlbaranItem,
+    Ticket, TicketItem, Factura, FacturaItem
 )
 from .serializers import (
     PresupuestoSerializer, PedidoSerializer, AlbaranSerializer, 
     TicketSerializer, FacturaSerializer
 )
 
+# Columnas de ?format=csv / ndjson comunes a los documentos de venta
+EXPORT_FIELDS = (
+    'id', 'numero', 'fecha', 'serie__nombre', 'cliente__nombre', 'cliente__cif',
+    'subtotal', 'iva', 'total',
+)
+
 
-class PresupuestoViewSet(ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.ModelViewSet):
+class PresupuestoViewSet(BulkDocumentCreateMixin, StreamingExportMixin, ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de presupuestos"""
     queryset = Presupuesto.objects.all()  # Para el router
     serializer_class = PresupuestoSerializer
     permission_classes = [IsAuthenticated]
+    export_fields = EXPORT_FIELDS
+    bulk_item_model = PresupuestoItem
+    bulk_document_field = 'presupuesto'
     
     def get_queryset(self):
         """Retorna el queryset filtrado por tenant"""
@@ -37,11 +49,14 @@ class PresupuestoViewSet(ReadOnlyIfInvoicedMixin, DocumentConversionMixin, views
         return generate_document_pdf(presupuesto, download=False)
 
 
-class PedidoViewSet(ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.ModelViewSet):
+class PedidoViewSet(BulkDocumentCreateMixin, StreamingExportMixin, ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de pedidos"""
     queryset = Pedido.objects.all()  # Para el router
     serializer_class = PedidoSerializer
     permission_classes = [IsAuthenticated]
+    export_fields = EXPORT_FIELDS + ('entregado',)
+    bulk_item_model = PedidoItem
+    bulk_document_field = 'pedido'
     
     def get_queryset(self):
         """Retorna el queryset filtrado por tenant"""
@@ -60,11 +75,14 @@ class PedidoViewSet(ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.M
         return generate_document_pdf(pedido, download=False)
 
 
-class AlbaranViewSet(ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.ModelViewSet):
+class AlbaranViewSet(BulkDocumentCreateMixin, StreamingExportMixin, ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de albaranes"""
     queryset = Albaran.objects.all()  # Para el router
     serializer_class = AlbaranSerializer
     permission_classes = [IsAuthenticated]
+    export_fields = EXPORT_FIELDS
+    bulk_item_model = AlbaranItem
+    bulk_document_field = 'albaran'
     
     def get_queryset(self):
         """Retorna el queryset filtrado por tenant"""
@@ -83,11 +101,14 @@ class AlbaranViewSet(ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.
         return generate_document_pdf(albaran, download=False)
 
 
-class TicketViewSet(ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.ModelViewSet):
+class TicketViewSet(BulkDocumentCreateMixin, StreamingExportMixin, ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de tickets"""
     queryset = Ticket.objects.all()  # Para el router
     serializer_class = TicketSerializer
     permission_classes = [IsAuthenticated]
+    export_fields = EXPORT_FIELDS
+    bulk_item_model = TicketItem
+    bulk_document_field = 'ticket'
     
     def get_queryset(self):
         """Retorna el queryset filtrado por tenant"""
@@ -106,11 +127,14 @@ class TicketViewSet(ReadOnlyIfInvoicedMixin, DocumentConversionMixin, viewsets.M
         return generate_document_pdf(ticket, download=False)
 
 
-class FacturaViewSet(viewsets.ModelViewSet):
+class FacturaViewSet(BulkDocumentCreateMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de facturas"""
     queryset = Factura.objects.all()  # Para el router
     serializer_class = FacturaSerializer
     permission_classes = [IsAuthenticated]
+    export_fields = EXPORT_FIELDS + ('documento_origen',)
+    bulk_item_model = FacturaItem
+    bulk_document_field = 'factura'
     
     def get_queryset(self):
         """Retorna el queryset filtrado por tenant"""
@@ -0,0 +1,36 @@
+from django.db.models import OuterRef, Subquery
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+from .registry import search_registry
+from .services import SearchIndexService
+
+
+class IndexedSearchFilter(SearchFilter):
+    """
+    SearchFilter sobre el índice de búsqueda.
+
+    Si el modelo del ViewSet está registrado en search_registry, ?search=
+    filtra por los ids del índice (prefijo, sin acentos) y, salvo que se pida
+    ?ordering=, ordena por relevancia. Si no, se comporta como SearchFilter.
+
+    Debe ir después de OrderingFilter en filter_backends para que la
+    relevancia prevalezca sobre la ordenación por defecto.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        model = queryset.model
+        if not search_registry.is_registered(model):
+            return super().filter_queryset(request, queryset, view)
+
+        ranked = SearchIndexService.ranked(model, request.query_params.get(self.search_param, ''))
+        if ranked is None:
+            return queryset
+
+        queryset = queryset.filter(pk__in=ranked.values('object_id')).annotate(
+            search_rank=Subquery(ranked.filter(object_id=OuterRef('pk')).values('search_rank')[:1])
+        )
+        if request.query_params.get(OrderingFilter.ordering_param):
+            return queryset
+
+        ordering = queryset.query.order_by or model._meta.ordering
+        return queryset.order_by('-search_rank', *ordering, 'pk')
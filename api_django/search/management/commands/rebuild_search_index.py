@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from search.registry import search_registry
+from search.services import SearchIndexService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de los modelos registrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID de empresa. Por defecto todas')
+        parser.add_argument('--modelo', action='append', help='app_label.model (repetible). Por defecto todos')
+
+    def handle(self, *args, **options):
+        modelos = options['modelo']
+        for model in search_registry.models():
+            label = model._meta.label_lower
+            if modelos and label not in modelos:
+                continue
+            count = SearchIndexService.reindex(model, empresa_id=options['empresa'])
+            self.stdout.write(f'{label}: {count} registros indexados')
+
+        self.stdout.write(self.style.SUCCESS('Índice de búsqueda reconstruido'))
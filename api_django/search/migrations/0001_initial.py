@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0002_userinvitation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(help_text='app_label.model del registro indexado', max_length=50)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('token', models.CharField(max_length=64)),
+                ('peso', models.PositiveSmallIntegerField(default=1, help_text='Peso del campo más relevante con este token')),
+                ('empresa', models.ForeignKey(help_text='Empresa a la que pertenece este registro', on_delete=django.db.models.deletion.CASCADE, to='accounts.empresa', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'Token de búsqueda',
+                'verbose_name_plural': 'Tokens de búsqueda',
+                'indexes': [models.Index(fields=['empresa', 'modelo', 'token'], name='search_sear_empresa_228ffd_idx')],
+                'constraints': [models.UniqueConstraint(fields=('modelo', 'object_id', 'token'), name='unique_search_token')],
+            },
+        ),
+    ]
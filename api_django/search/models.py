@@ -0,0 +1,32 @@
+from django.db import models
+from tenants.models import TenantModelMixin
+
+
+class SearchToken(TenantModelMixin, models.Model):
+    """
+    Índice invertido de búsqueda: un token normalizado por registro indexado.
+
+    Las búsquedas por prefijo (token LIKE 'abc%') se resuelven con el índice
+    (empresa, modelo, token) en lugar de recorrer las tablas con LIKE '%abc%'.
+    """
+
+    modelo = models.CharField(max_length=50, help_text="app_label.model del registro indexado")
+    object_id = models.PositiveBigIntegerField()
+    token = models.CharField(max_length=64)
+    peso = models.PositiveSmallIntegerField(default=1, help_text="Peso del campo más relevante con este token")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['modelo', 'object_id', 'token'],
+                name='unique_search_token'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['empresa', 'modelo', 'token']),
+        ]
+        verbose_name = "Token de búsqueda"
+        verbose_name_plural = "Tokens de búsqueda"
+
+    def __str__(self):
+        return f"{self.modelo}#{self.object_id}: {self.token}"
@@ -0,0 +1,81 @@
+"""
+Registro de modelos indexados para búsqueda.
+
+Cada app declara en su AppConfig.ready() qué campos se indexan y con qué
+peso (mayor peso = más relevante en el ranking):
+
+    from search.registry import search_registry
+    search_registry.register(
+        self.get_model('Cliente'),
+        fields={'nombre': 3, 'email': 1, 'telefono': 1},
+        compact=('telefono',),
+    )
+
+Los campos de `compact` se indexan además sin separadores, para encontrar
+teléfonos o CIF/NIF escritos con o sin espacios y guiones. El índice se
+mantiene con post_save / post_delete de cada modelo registrado.
+"""
+from django.db.models.signals import post_delete, post_save
+
+
+class SearchOptions:
+    """Campos indexados de un modelo registrado"""
+
+    __slots__ = ('label', 'fields', 'compact')
+
+    def __init__(self, label, fields, compact):
+        self.label = label
+        self.fields = fields
+        self.compact = compact
+
+
+class SearchRegistry:
+    """Modelos indexados y sus campos"""
+
+    def __init__(self):
+        self._registry = {}
+
+    def register(self, model, fields, compact=()):
+        """Registra un modelo: fields es {campo: peso}"""
+        self._registry[model] = SearchOptions(model._meta.label_lower, dict(fields), frozenset(compact))
+        uid = model._meta.label_lower
+        post_save.connect(index_on_save, sender=model, dispatch_uid=f'search_index_{uid}')
+        post_delete.connect(remove_on_delete, sender=model, dispatch_uid=f'search_remove_{uid}')
+        return model
+
+    def unregister(self, model):
+        self._registry.pop(model, None)
+        uid = model._meta.label_lower
+        post_save.disconnect(sender=model, dispatch_uid=f'search_index_{uid}')
+        post_delete.disconnect(sender=model, dispatch_uid=f'search_remove_{uid}')
+
+    def get_options(self, model):
+        """Opciones del modelo o None si no está registrado"""
+        return self._registry.get(model)
+
+    def is_registered(self, model):
+        return model in self._registry
+
+    def models(self):
+        return list(self._registry)
+
+
+search_registry = SearchRegistry()
+
+
+def index_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Reindexa el registro salvo que el save no toque campos indexados"""
+    options = search_registry.get_options(sender)
+    if options is None or raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(options.fields):
+        return
+    from .services import SearchIndexService
+    SearchIndexService.index_instance(instance, options)
+
+
+def remove_on_delete(sender, instance, **kwargs):
+    options = search_registry.get_options(sender)
+    if options is not None:
+        from .services import SearchIndexService
+        SearchIndexService.remove_instance(instance, options)
@@ -0,0 +1,108 @@
+"""
+Servicios del índice de búsqueda (SearchToken).
+
+Cada término de la búsqueda se compara como prefijo (token LIKE 'term%'),
+lo que el índice (empresa, modelo, token) resuelve por rango. Un registro
+casa si casan todos los términos; su relevancia es la suma, por término,
+del mayor peso de los campos que casan (doble si el token es exacto).
+"""
+from django.db.models import Case, ExpressionWrapper, F, IntegerField, Max, Q, Value, When
+
+from .models import SearchToken
+from .registry import search_registry
+from .text import query_terms, tokenize
+
+
+class SearchIndexService:
+    """Mantenimiento y consulta del índice de búsqueda"""
+
+    @staticmethod
+    def tokens_for(instance, options):
+        """Tokens del registro con su peso: {token: peso}"""
+        tokens = {}
+        for field, peso in options.fields.items():
+            for token in tokenize(getattr(instance, field, None), compact=field in options.compact):
+                tokens[token] = max(peso, tokens.get(token, 0))
+        return tokens
+
+    @staticmethod
+    def index_instance(instance, options=None):
+        """Sustituye los tokens de un registro"""
+        options = options or search_registry.get_options(type(instance))
+        manager = SearchToken._base_manager
+        manager.filter(modelo=options.label, object_id=instance.pk).delete()
+        manager.bulk_create([
+            SearchToken(
+                empresa_id=instance.empresa_id, modelo=options.label,
+                object_id=instance.pk, token=token, peso=peso
+            )
+            for token, peso in SearchIndexService.tokens_for(instance, options).items()
+        ])
+
+    @staticmethod
+    def remove_instance(instance, options=None):
+        options = options or search_registry.get_options(type(instance))
+        SearchToken._base_manager.filter(modelo=options.label, object_id=instance.pk).delete()
+
+    @staticmethod
+    def reindex(model, empresa_id=None, batch_size=500):
+        """Reconstruye el índice de un modelo (opcionalmente de una empresa). Retorna registros indexados"""
+        options = search_registry.get_options(model)
+        tokens = SearchToken._base_manager.filter(modelo=options.label)
+        objects = model._base_manager.order_by('pk')
+        if empresa_id:
+            tokens = tokens.filter(empresa_id=empresa_id)
+            objects = objects.filter(empresa_id=empresa_id)
+        tokens.delete()
+
+        count = 0
+        pending = []
+        for instance in objects.iterator(chunk_size=batch_size):
+            count += 1
+            pending.extend(
+                SearchToken(
+                    empresa_id=instance.empresa_id, modelo=options.label,
+                    object_id=instance.pk, token=token, peso=peso
+                )
+                for token, peso in SearchIndexService.tokens_for(instance, options).items()
+            )
+            if len(pending) >= batch_size:
+                SearchToken._base_manager.bulk_create(pending)
+                pending = []
+        SearchToken._base_manager.bulk_create(pending)
+        return count
+
+    @staticmethod
+    def ranked(model, query):
+        """
+        Ids que casan con la búsqueda y su relevancia (tenant actual):
+        filas {'object_id', 'search_rank'}. None si la búsqueda no tiene términos.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return None
+        options = search_registry.get_options(model)
+
+        any_term = Q()
+        per_term = {}
+        for index, term in enumerate(terms):
+            any_term |= Q(token__istartswith=term)
+            per_term[f'term_{index}'] = Max(Case(
+                When(token=term, then=F('peso') * 2),
+                When(token__istartswith=term, then=F('peso')),
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+
+        score = ExpressionWrapper(sum((F(name) for name in per_term), Value(0)), output_field=IntegerField())
+        return SearchToken.objects.filter(
+            any_term, modelo=options.label
+        ).values('object_id').annotate(**per_term).filter(
+            **{f'{name}__gt': 0 for name in per_term}
+        ).annotate(search_rank=score).values('object_id', 'search_rank')
+
+    @staticmethod
+    def matching_ids(model, query):
+        """Subquery con los ids que casan con la búsqueda (None si no hay términos)"""
+        ranked = SearchIndexService.ranked(model, query)
+        return ranked.values('object_id') if ranked is not None else None
@@ -0,0 +1,112 @@
+"""
+Tests para la app search - Índice de búsqueda
+"""
+import pytest
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from core.models import Cliente, Proveedor
+from products.models import Articulo
+from search.models import SearchToken
+from search.text import query_terms, tokenize
+
+
+class TestTokenizacion:
+    """Normalización de texto del índice"""
+
+    def test_tokens_sin_acentos_y_compactos(self):
+        """Se quitan acentos y los campos compactos se indexan sin separadores"""
+        assert tokenize("José Márquez") == {"jose", "marquez"}
+        assert tokenize("612 34-56 78", compact=True) == {"612", "34", "56", "78", "612345678"}
+        assert tokenize(None) == set()
+
+    def test_terminos_de_busqueda(self):
+        """Los términos se normalizan igual que los tokens y sin duplicados"""
+        assert query_terms("  Ñandú ñandu, Pérez ") == ["nandu", "perez"]
+
+
+@pytest.mark.django_db
+class TestSearchIndexSync:
+    """El índice se mantiene con señales"""
+
+    def test_alta_edicion_y_borrado(self, empresa):
+        """Crear, editar y borrar un cliente actualiza sus tokens"""
+        cliente = Cliente.objects.create(nombre="Ferretería Núñez", cif="B-12345678", empresa=empresa)
+        tokens = set(SearchToken._base_manager.filter(object_id=cliente.pk, modelo='core.cliente')
+                     .values_list('token', flat=True))
+        assert {"ferreteria", "nunez", "b12345678"} <= tokens
+
+        cliente.nombre = "Ferretería Pérez"
+        cliente.save()
+        tokens = set(SearchToken._base_manager.filter(object_id=cliente.pk, modelo='core.cliente')
+                     .values_list('token', flat=True))
+        assert "perez" in tokens and "nunez" not in tokens
+
+        cliente.delete()
+        assert not SearchToken._base_manager.filter(modelo='core.cliente').exists()
+
+    def test_save_sin_campos_indexados_no_reindexa(self, empresa):
+        """Un save(update_fields=...) que no toca campos indexados no escribe en el índice"""
+        cliente = Cliente.objects.create(nombre="Cliente Quieto", empresa=empresa)
+
+        with CaptureQueriesContext(connection) as queries:
+            cliente.save(update_fields=['activo'])
+
+        assert not any('search_searchtoken' in q['sql'] for q in queries)
+
+    def test_rebuild_search_index(self, empresa):
+        """El comando reconstruye el índice (p.ej. tras cargas en bloque)"""
+        Cliente._base_manager.bulk_create([Cliente(nombre="Masivo Uno", empresa=empresa)])
+        assert not SearchToken._base_manager.filter(token="masivo").exists()
+
+        call_command('rebuild_search_index', '--modelo', 'core.cliente', stdout=None)
+
+        assert SearchToken._base_manager.filter(token="masivo").exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestIndexedSearchAPI:
+    """Búsqueda indexada en los ViewSets"""
+
+    def test_busqueda_por_prefijo_sin_acentos(self, authenticated_client, empresa):
+        """Prefijos y acentos: 'marq' encuentra 'Márquez'"""
+        Cliente.objects.create(nombre="Talleres Márquez", empresa=empresa)
+        Cliente.objects.create(nombre="Talleres Gómez", empresa=empresa)
+
+        response = authenticated_client.get('/api/core/clientes/', {'search': 'marq'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [c['nombre'] for c in response.data['results']] == ["Talleres Márquez"]
+
+    def test_todos_los_terminos_y_telefono(self, authenticated_client, empresa):
+        """Deben casar todos los términos; el teléfono se encuentra sin espacios"""
+        Proveedor.objects.create(nombre="Distribuciones Sur", telefono="612 34 56 78", empresa=empresa)
+        Proveedor.objects.create(nombre="Distribuciones Norte", empresa=empresa)
+
+        response = authenticated_client.get('/api/core/proveedores/', {'search': 'distrib 6123456'})
+
+        assert [p['nombre'] for p in response.data['results']] == ["Distribuciones Sur"]
+
+    def test_ranking_por_relevancia(self, authenticated_client, empresa):
+        """Un acierto en el nombre pesa más que en la descripción"""
+        Articulo.objects.create(nombre="Cable genérico", descripcion="Tornillo incluido", precio=Decimal('1'), empresa=empresa)
+        Articulo.objects.create(nombre="Tornillo M6", precio=Decimal('1'), empresa=empresa)
+
+        response = authenticated_client.get('/api/products/articulos/', {'search': 'tornillo'})
+
+        assert [a['nombre'] for a in response.data['results']] == ["Tornillo M6", "Cable genérico"]
+
+    def test_busqueda_aislada_por_empresa(self, authenticated_client, empresa):
+        """El índice de otra empresa no aparece en los resultados"""
+        from accounts.models import Empresa
+        otra = Empresa.objects.create(nombre="Otra", cif="B87654321")
+        Cliente._base_manager.create(nombre="Compartido Ajeno", empresa=otra)
+        Cliente.objects.create(nombre="Compartido Propio", empresa=empresa)
+
+        response = authenticated_client.get('/api/core/clientes/', {'search': 'compartido'})
+
+        assert [c['nombre'] for c in response.data['results']] == ["Compartido Propio"]
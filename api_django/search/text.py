@@ -0,0 +1,42 @@
+"""
+Normalización y tokenización de texto para el índice de búsqueda.
+
+Se pasa a minúsculas y se quitan los acentos (NFKD sin marcas
+combinantes), de modo que "Márquez" y "marquez" generan el mismo token.
+"""
+import re
+import unicodedata
+
+TOKEN_MAX_LENGTH = 64
+
+_SPLIT_RE = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(value):
+    """Minúsculas y sin acentos"""
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(value, compact=False):
+    """
+    Tokens de un valor. Con compact=True se añade además el valor entero sin
+    separadores (p.ej. "612 34 56 78" -> "612345678", "B-1234" -> "b1234").
+    """
+    if value is None or value == '':
+        return set()
+    parts = [p for p in _SPLIT_RE.split(normalize(value)) if p]
+    tokens = {p[:TOKEN_MAX_LENGTH] for p in parts}
+    if compact and len(parts) > 1:
+        tokens.add(''.join(parts)[:TOKEN_MAX_LENGTH])
+    return tokens
+
+
+def query_terms(query):
+    """Términos de una búsqueda (cada uno se busca como prefijo)"""
+    terms = []
+    for part in _SPLIT_RE.split(normalize(query or '')):
+        part = part[:TOKEN_MAX_LENGTH]
+        if part and part not in terms:
+            terms.append(part)
+    return terms
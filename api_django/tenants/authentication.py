@@ -0,0 +1,69 @@
+"""
+Autenticación JWT compartida entre TenantMiddleware y DRF.
+
+El middleware autentica el token una sola vez (cargando la empresa del
+usuario en la misma consulta) y deja el resultado en el request; DRF lo
+reutiliza en lugar de decodificar el token y consultar el usuario de nuevo.
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Atributo del HttpRequest donde el middleware deja (user, token)
+REQUEST_AUTH_ATTR = '_tenant_jwt_auth'
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication que carga la empresa con el usuario y reutiliza la del middleware"""
+
+    def authenticate(self, request):
+        http_request = getattr(request, '_request', request)
+        cached = getattr(http_request, REQUEST_AUTH_ATTR, None)
+        if cached is not None:
+            return cached
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        """Igual que simplejwt pero con select_related('empresa')"""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = self.user_model.objects.select_related('empresa').get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+def authenticate_request(request):
+    """
+    Utility function para autenticar el JWT de un HttpRequest una sola vez.
+    Retorna (user, token) o None si no hay token o no es válido.
+    """
+    try:
+        result = TenantJWTAuthentication().authenticate(request)
+    except Exception:
+        # Token inválido: DRF volverá a autenticar y responderá 401
+        result = None
+
+    if result is not None:
+        setattr(request, REQUEST_AUTH_ATTR, result)
+    return result
@@ -1,127 +1,79 @@
-from django.utils.deprecation import MiddlewareMixin
-from django.db import connection
-from django.utils import timezone
-
-
-class TenantMiddleware(MiddlewareMixin):
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from accounts.last_access import record_access
+from .authentication import authenticate_request
+from .utils import build_context, set_context, reset_context
+# Re-exportadas por compatibilidad con el código que las importaba desde aquí
+from .utils import (  # noqa: F401
+    get_current_request, get_current_user, get_current_empresa,
+    get_current_empresa_id, is_superadmin, set_current_tenant, tenant_context,
+)
+
+
+class TenantMiddleware:
     """
     Middleware para gestionar el contexto de la empresa (tenant) actual.
-    Automáticamente filtra todas las consultas por la empresa del usuario autenticado.
-    """
-    
-    def process_request(self, request):
-        """Establece el contexto del tenant basándose en el usuario autenticado"""
-        # Inicializar tenant como None
-        request.tenant = None
-        request.empresa_id = None
-        
-        # Si el usuario está autenticado y tiene empresa
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            # Los superadmins no tienen empresa asignada (pueden ver todo)
-            if request.user.role == 'superadmin':
-                request.tenant = None
-                request.empresa_id = None
-            elif hasattr(request.user, 'empresa') and request.user.empresa:
-                request.tenant = request.user.empresa
-                request.empresa_id = request.user.empresa.id
-                
-                # Actualizar último acceso
-                request.user.ultimo_acceso = timezone.now()
-                request.user.save(update_fields=['ultimo_acceso'])
-        
-        return None
-    
-    def process_response(self, request, response):
-        """Limpiar el contexto del tenant después de la respuesta"""
-        if hasattr(request, 'tenant'):
-            delattr(request, 'tenant')
-        if hasattr(request, 'empresa_id'):
-            delattr(request, 'empresa_id')
-        
-        return response
-
-
-class TenantQuerySetMixin:
-    """
-    Mixin para QuerySets que automáticamente filtra por empresa.
-    Debe ser usado en los managers de los modelos que tienen campo empresa.
-    """
-    
-    def get_queryset(self):
-        # Obtener el request actual desde el contexto local de thread
-        request = getattr(self._get_request(), 'request', None)
-        queryset = super().get_queryset()
-        
-        if request and hasattr(request, 'empresa_id') and request.empresa_id:
-            # Filtrar por empresa solo si no es superadmin
-            queryset = queryset.filter(empresa_id=request.empresa_id)
-        
-        return queryset
-    
-    def _get_request(self):
-        """Obtiene el request actual desde el contexto local de thread"""
-        # Esto requiere un middleware adicional para almacenar el request
-        # Por ahora retornamos un objeto dummy
-        import threading
-        local = getattr(threading.current_thread(), 'request', None)
-        return local
 
+    Autentica el JWT una sola vez por request (usuario y empresa en una
+    consulta), publica request, usuario y empresa en el contexto de
+    tenants.utils y lo restaura al terminar. Sustituye a los antiguos
+    DRFTenantMiddleware, ThreadLocalMiddleware y AuditContextMiddleware.
 
-class ThreadLocalMiddleware(MiddlewareMixin):
+    Funciona tanto en WSGI como en ASGI: el contexto se publica en el mismo
+    contexto (hilo o tarea) que atiende la request, por lo que no se filtra
+    entre requests aunque un pool reutilice hilos.
     """
-    Middleware para almacenar el request en el contexto local del thread.
-    Esto permite acceder al request desde cualquier parte del código.
-    """
-    
-    def process_request(self, request):
-        import threading
-        threading.current_thread().request = request
-        return None
-    
-    def process_response(self, request, response):
-        import threading
-        if hasattr(threading.current_thread(), 'request'):
-            delattr(threading.current_thread(), 'request')
-        return response
-
-
-def get_current_request():
-    """Utility function para obtener el request actual"""
-    import threading
-    return getattr(threading.current_thread(), 'request', None)
-
-
-def get_current_empresa():
-    """Utility function para obtener la empresa actual"""
-    request = get_current_request()
-    if request and hasattr(request, 'tenant'):
-        return request.tenant
-    return None
 
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        token = set_context(self.resolve_context(request))
+        try:
+            return self.get_response(request)
+        finally:
+            reset_context(token)
+
+    async def __acall__(self, request):
+        # La autenticación consulta la BD: se resuelve en un hilo, pero el
+        # contexto se publica en la tarea actual para que lo hereden las
+        # vistas async y las sync (sync_to_async copia el contexto)
+        context = await sync_to_async(self.resolve_context, thread_sensitive=True)(request)
+        token = set_context(context)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_context(token)
+
+    def resolve_context(self, request):
+        """Establece el contexto del tenant basándose en el usuario autenticado"""
+        user = None
 
-def get_current_empresa_id():
-    """Utility function para obtener el ID de la empresa actual"""
-    request = get_current_request()
-    if request and hasattr(request, 'empresa_id'):
-        return request.empresa_id
-    return None
+        # Requests API: autenticar JWT aquí; DRF reutiliza el resultado
+        if request.path.startswith('/api/'):
+            user_auth_tuple = authenticate_request(request)
+            if user_auth_tuple:
+                request.user, request.auth = user_auth_tuple
+                user = request.user
 
+        # Resto (admin, sesión): usuario de AuthenticationMiddleware
+        if user is None:
+            user = getattr(request, 'user', None)
 
-def is_superadmin():
-    """Utility function para verificar si el usuario actual es superadmin"""
-    request = get_current_request()
-    if not request or not hasattr(request, 'user') or not request.user.is_authenticated:
-        return False
-    
-    return getattr(request.user, 'role', None) == 'superadmin'
+        context = build_context(request, user)
+        request.tenant = context.empresa
+        request.empresa_id = context.empresa_id
 
+        if context.empresa_id:
+            # Registrar último acceso (se escribe en bloque, no por request)
+            record_access(user)
 
-def set_current_tenant(empresa):
-    """
-    Establece manualmente el tenant actual para operaciones que requieren contexto específico.
-    Usado principalmente en scripts de inicialización.
-    """
-    request = get_current_request()
-    if request:
-        request.tenant = empresa
-        request.empresa_id = empresa.id if empresa else None
+        return context
@@ -2,6 +2,7 @@
 Tests para la app tenants - Sistema Multi-Tenancy
 """
 import pytest
+from django.http import HttpResponse
 from django.test import TestCase, RequestFactory
 from django.contrib.auth import get_user_model
 from tenants.middleware import TenantMiddleware
@@ -34,6 +35,31 @@ class TestTenantMiddleware:
         current_empresa = get_current_empresa_id()
         
         assert current_empresa == empresa.id
+    
+    def test_middleware_publica_y_limpia_contexto(self, empresa, usuario):
+        """Test que el middleware publica usuario y empresa y los limpia al terminar"""
+        from tenants.utils import get_current_user, get_current_empresa
+        
+        factory = RequestFactory()
+        request = factory.get('/admin/')
+        request.user = usuario
+        captured = {}
+        
+        def get_response(req):
+            captured['user'] = get_current_user()
+            captured['empresa'] = get_current_empresa()
+            captured['empresa_id'] = get_current_empresa_id()
+            return HttpResponse()
+        
+        TenantMiddleware(get_response)(request)
+        
+        assert captured['user'] == usuario
+        assert captured['empresa'] == empresa
+        assert captured['empresa_id'] == empresa.id
+        assert request.empresa_id == empresa.id
+        # Fuera del request no queda contexto
+        assert get_current_user() is None
+        assert get_current_empresa_id() is None
 
 
 @pytest.mark.django_db
@@ -68,7 +94,8 @@ class TestTenantModels:
             empresa=empresa
         )
         
-        # Verificar que el manager funciona
+        # Verificar que el manager funciona dentro del contexto de la empresa
+        set_current_empresa_id(empresa.id)
         clientes = Cliente.objects.all()
         assert cliente in clientes
         
@@ -156,3 +183,116 @@ class TestTenantSecurity:
             # (esto dependería de la implementación específica del manager)
             otras_empresas = Empresa.objects.exclude(id=empresa_actual.id)
             assert empresa_actual not in otras_empresas
+
+
+@pytest.mark.django_db
+@pytest.mark.performance
+class TestTenantRequestQueries:
+    """Benchmark de queries por request de la cadena de middleware"""
+    
+    def test_request_api_autentica_una_sola_vez(self, authenticated_client, cliente):
+        """
+        Un GET autenticado a la API solo consulta usuario+empresa una vez.
+        
+        Antes de unificar los middleware eran 7 queries (usuario x2, empresa,
+        último acceso x2, count y listado); ahora son 4 con el volcado de
+        último acceso inmediato de los tests y 3 en producción, más la
+        carga de etiquetas del listado (prefetch).
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = authenticated_client.get("/api/clientes/")
+        
+        assert response.status_code == 200
+        sqls = [q['sql'] for q in ctx.captured_queries]
+        user_selects = [sql for sql in sqls if 'FROM "accounts_customuser"' in sql and sql.startswith('SELECT')]
+        assert len(user_selects) == 1
+        assert 'JOIN "accounts_empresa"' in user_selects[0]
+        # usuario+empresa, último acceso, count, listado de clientes y sus etiquetas
+        assert len(sqls) == 5
+
+
+@pytest.mark.django_db
+class TestTenantContextIsolation:
+    """Tests del contexto de tenant basado en contextvars (WSGI/ASGI)"""
+    
+    def test_tenant_context_restaura_contexto(self, empresa):
+        """Test que tenant_context establece la empresa y restaura el contexto al salir"""
+        from core.models import Cliente
+        from tenants.utils import tenant_context
+        
+        with tenant_context(empresa):
+            assert get_current_empresa_id() == empresa.id
+            cliente = Cliente(nombre="Cliente Script")
+            cliente.save()
+            assert Cliente.objects.filter(pk=cliente.pk).exists()
+        
+        assert cliente.empresa_id == empresa.id
+        assert get_current_empresa_id() is None
+        assert not Cliente.objects.filter(pk=cliente.pk).exists()
+    
+    def test_tenant_context_restaura_con_excepcion(self, empresa):
+        """Test que el contexto se restaura aunque el bloque lance una excepción"""
+        from tenants.utils import tenant_context
+        
+        with pytest.raises(RuntimeError):
+            with tenant_context(empresa):
+                raise RuntimeError("fallo en el job")
+        
+        assert get_current_empresa_id() is None
+    
+    def test_contexto_no_se_filtra_entre_hilos(self, empresa):
+        """Test que un hilo reutilizado por el pool no hereda el tenant de otra tarea"""
+        from concurrent.futures import ThreadPoolExecutor
+        from tenants.utils import tenant_context
+        
+        def job_con_tenant():
+            with tenant_context(empresa):
+                return get_current_empresa_id()
+        
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            assert pool.submit(job_con_tenant).result() == empresa.id
+            # Mismo hilo del pool, sin contexto
+            assert pool.submit(get_current_empresa_id).result() is None
+        
+        assert get_current_empresa_id() is None
+    
+    def test_contexto_aislado_entre_tareas_async(self, empresa):
+        """Test que cada tarea asyncio ve solo su propio tenant"""
+        import asyncio
+        from tenants.utils import set_current_empresa_id
+        
+        async def tarea(empresa_id):
+            set_current_empresa_id(empresa_id)
+            await asyncio.sleep(0)
+            return get_current_empresa_id()
+        
+        async def main():
+            return await asyncio.gather(tarea(empresa.id), tarea(empresa.id + 1000))
+        
+        assert asyncio.run(main()) == [empresa.id, empresa.id + 1000]
+        assert get_current_empresa_id() is None
+    
+    def test_middleware_async(self, empresa, usuario, settings):
+        """Test que el middleware en modo ASGI publica el contexto y lo limpia"""
+        import asyncio
+        
+        settings.LAST_ACCESS_FLUSH_INTERVAL = 3600
+        captured = {}
+        
+        async def get_response(req):
+            await asyncio.sleep(0)
+            captured['empresa_id'] = get_current_empresa_id()
+            return HttpResponse()
+        
+        middleware = TenantMiddleware(get_response)
+        request = RequestFactory().get('/admin/')
+        request.user = usuario
+        
+        response = asyncio.run(middleware(request))
+        
+        assert response.status_code == 200
+        assert captured['empresa_id'] == empresa.id
+        assert get_current_empresa_id() is None
@@ -0,0 +1,137 @@
+"""
+Contexto del tenant actual.
+
+Un único almacén (basado en contextvars) con el request, el usuario y la
+empresa activos. Lo publica TenantMiddleware una vez por request y lo leen
+los managers multi-tenant, las señales de auditoría y cualquier otro código
+que necesite saber para qué empresa se está trabajando.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class TenantContext:
+    """Contexto inmutable del tenant para el request o tarea actual"""
+
+    __slots__ = ('request', 'user', 'empresa', 'empresa_id', 'is_superadmin')
+
+    def __init__(self, request=None, user=None, empresa=None, empresa_id=None, is_superadmin=False):
+        if empresa is not None and empresa_id is None:
+            empresa_id = empresa.pk
+        object.__setattr__(self, 'request', request)
+        object.__setattr__(self, 'user', user)
+        object.__setattr__(self, 'empresa', empresa)
+        object.__setattr__(self, 'empresa_id', empresa_id)
+        object.__setattr__(self, 'is_superadmin', is_superadmin)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TenantContext es inmutable")
+
+    def replace(self, **changes):
+        """Retorna una copia del contexto con los cambios indicados"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        if 'empresa' in changes and 'empresa_id' not in changes:
+            empresa = changes['empresa']
+            changes['empresa_id'] = empresa.pk if empresa is not None else None
+        values.update(changes)
+        return TenantContext(**values)
+
+
+EMPTY_CONTEXT = TenantContext()
+
+_tenant_context = ContextVar('tenant_context', default=EMPTY_CONTEXT)
+
+
+def build_context(request=None, user=None):
+    """Construye el contexto del tenant a partir del request y su usuario"""
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return TenantContext(request=request)
+
+    if getattr(user, 'role', None) == 'superadmin':
+        # Los superadmins no tienen empresa asignada (pueden ver todo)
+        return TenantContext(request=request, user=user, is_superadmin=True)
+
+    empresa = getattr(user, 'empresa', None)
+    return TenantContext(request=request, user=user, empresa=empresa)
+
+
+def get_context():
+    """Utility function para obtener el contexto del tenant actual"""
+    return _tenant_context.get()
+
+
+def set_context(context):
+    """Publica un contexto de tenant. Retorna el token para restaurarlo"""
+    return _tenant_context.set(context)
+
+
+def reset_context(token):
+    """Restaura el contexto de tenant anterior a set_context"""
+    _tenant_context.reset(token)
+
+
+def clear_context():
+    """Elimina cualquier contexto de tenant (p.ej. entre tests)"""
+    _tenant_context.set(EMPTY_CONTEXT)
+
+
+def get_current_request():
+    """Utility function para obtener el request actual"""
+    return _tenant_context.get().request
+
+
+def get_current_user():
+    """Utility function para obtener el usuario autenticado actual"""
+    return _tenant_context.get().user
+
+
+def get_current_empresa():
+    """Utility function para obtener la empresa actual"""
+    return _tenant_context.get().empresa
+
+
+def get_current_empresa_id():
+    """Utility function para obtener el ID de la empresa actual"""
+    return _tenant_context.get().empresa_id
+
+
+def is_superadmin():
+    """Utility function para verificar si el usuario actual es superadmin"""
+    return _tenant_context.get().is_superadmin
+
+
+@contextmanager
+def tenant_context(empresa, user=None):
+    """
+    Context manager para ejecutar código en nombre de una empresa.
+    Pensado para scripts, comandos de gestión y tareas en segundo plano:
+
+        with tenant_context(empresa):
+            Cliente.objects.create(nombre='...')
+
+    Conserva el request y el usuario actuales salvo que se indique otro
+    usuario. Al salir se restaura el contexto anterior, también si hay excepciones.
+    """
+    current = _tenant_context.get()
+    token = _tenant_context.set(TenantContext(
+        request=current.request,
+        user=user if user is not None else current.user,
+        empresa=empresa,
+    ))
+    try:
+        yield _tenant_context.get()
+    finally:
+        _tenant_context.reset(token)
+
+
+def set_current_tenant(empresa):
+    """
+    Establece manualmente el tenant actual para operaciones que requieren contexto específico.
+    Retorna el token del contexto anterior; preferir tenant_context() siempre que sea posible.
+    """
+    return _tenant_context.set(_tenant_context.get().replace(empresa=empresa))
+
+
+def set_current_empresa_id(empresa_id):
+    """Establece manualmente el ID de la empresa actual. Retorna el token del contexto anterior"""
+    return _tenant_context.set(_tenant_context.get().replace(empresa=None, empresa_id=empresa_id))